@@ -0,0 +1,131 @@
+import shutil
+import numpy as np
+import shapely
+from django.contrib.gis.geos import Polygon
+from django.db import connection, transaction
+from django.utils import timezone
+from geodjango.utils import read_geospatial_file, copy_rows
+from job.queue import register_job
+from .lookup import subdivide_batas_wilayah
+from .models import BatasWilayah, BatasWilayahMetadata
+from .resolution import simplify_batas_wilayah
+
+# Number of features sent per COPY, polygons are much larger than road lines
+COPY_CHUNK_SIZE = 1000
+# Skipped features listed in the job result, the count covers all of them
+MAX_SKIPPED_REPORT = 100
+
+POLYGON_TYPE_ID = 3
+MULTIPOLYGON_TYPE_ID = 6
+
+
+@register_job("batas_wilayah_upload")
+def batas_wilayah_upload(context, metadata_id, file_path, file_format):
+    """
+    Process the uploaded file and load data into the BatasWilayah model.
+    """
+    metadata = BatasWilayahMetadata.objects.get(id=metadata_id)
+    gdf, temp_dir = read_geospatial_file(file_path, file_format)
+
+    try:
+        geometry_name = gdf.geometry.name
+        geoms = gdf.geometry.values.to_numpy()
+
+        # Only Polygon and MultiPolygon features are loaded, the others are reported
+        type_ids = shapely.get_type_id(geoms)
+        kept = np.isin(type_ids, [POLYGON_TYPE_ID, MULTIPOLYGON_TYPE_ID])
+        kept[kept] = ~shapely.is_empty(geoms[kept])
+        skipped = np.flatnonzero(~kept)
+        skipped_features = [
+            {
+                "row": int(row),
+                "geom_type": None if geoms[row] is None else geoms[row].geom_type,
+            }
+            for row in skipped[:MAX_SKIPPED_REPORT]
+        ]
+
+        geoms = geoms[kept]
+        gdf = gdf[kept]
+
+        # Promote Polygons to MultiPolygons and force 2D for the whole file at once
+        polygons = shapely.get_type_id(geoms) == POLYGON_TYPE_ID
+        geoms[polygons] = shapely.multipolygons(geoms[polygons][:, np.newaxis])
+        geoms = shapely.set_srid(shapely.force_2d(geoms), 4326)
+
+        if len(geoms) > 0:
+            metadata.bbox = Polygon.from_bbox(tuple(shapely.total_bounds(geoms)))
+            metadata.save()
+
+        copy_sql = """
+            COPY tb_batas_wilayah (
+                mpoly, properties, file_metadata_id, created_at, updated_at
+            )
+            FROM STDIN WITH (FORMAT csv)
+        """
+        # COPY bypasses auto_now_add and auto_now
+        now = timezone.now().isoformat()
+
+        # Rows are serialized before the transaction, progress can't be reported
+        # inside it: the job row would stay locked until the commit
+        chunks = []
+        for start in range(0, len(geoms), COPY_CHUNK_SIZE):
+            chunk = gdf.iloc[start : start + COPY_CHUNK_SIZE]
+            list_wkb = shapely.to_wkb(
+                geoms[start : start + COPY_CHUNK_SIZE], hex=True, include_srid=True
+            )
+            attributes = chunk.drop(columns=geometry_name)
+            if len(attributes.columns) > 0:
+                # pandas handles NaN and Timestamp values when serializing to JSON
+                list_properties = attributes.to_json(
+                    orient="records",
+                    lines=True,
+                    date_format="iso",
+                    default_handler=str,
+                ).splitlines()
+            else:
+                # Without columns pandas writes a single empty line for all rows
+                list_properties = ["{}"] * len(chunk)
+
+            if len(list_properties) != len(list_wkb):
+                raise ValueError(
+                    f"{len(list_properties)} properties for "
+                    f"{len(list_wkb)} geometries at feature {start}"
+                )
+            chunks.append((list_wkb, list_properties))
+
+            prepared = start + len(chunk)
+            context.progress(
+                30 * prepared / len(geoms), f"{prepared} batas wilayah prepared"
+            )
+
+        context.progress(30, f"Saving {len(geoms)} batas wilayah")
+
+        # An interrupted run leaves nothing behind
+        with transaction.atomic():
+            BatasWilayah.objects.filter(file_metadata=metadata).delete()
+
+            with connection.cursor() as cursor:
+                for list_wkb, list_properties in chunks:
+                    copy_rows(
+                        cursor,
+                        copy_sql,
+                        (
+                            (wkb, properties, metadata.id, now, now)
+                            for wkb, properties in zip(list_wkb, list_properties)
+                        ),
+                    )
+
+            # Geometries of the lower resolutions and parts of the point lookups
+            simplify_batas_wilayah(metadata.id)
+            part_count = subdivide_batas_wilayah(metadata.id)
+
+        return {
+            "count": len(geoms),
+            "skipped": len(skipped),
+            "skipped_features": skipped_features,
+            "part_count": part_count,
+        }
+
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
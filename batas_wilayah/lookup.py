@@ -0,0 +1,70 @@
+from django.db import connection
+from .models import BatasWilayah
+
+# Vertices of a subdivided part, the PostGIS default of ST_Subdivide
+SUBDIVIDE_MAX_VERTICES = 256
+# Points of a single lookup request
+LOOKUP_MAX_POINTS = 50000
+
+
+def subdivide_batas_wilayah(metadata_id):
+    """
+    Cut every batas wilayah of a metadata into parts of at most
+    SUBDIVIDE_MAX_VERTICES vertices, replacing the previous parts
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM tb_batas_wilayah_part WHERE file_metadata_id = %s;",
+            [str(metadata_id)],
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO tb_batas_wilayah_part (batas_wilayah_id, file_metadata_id, geom)
+            SELECT b.id, b.file_metadata_id, part.geom
+            FROM tb_batas_wilayah AS b
+            CROSS JOIN LATERAL ST_Subdivide(b.mpoly, {SUBDIVIDE_MAX_VERTICES}) AS part(geom)
+            WHERE b.file_metadata_id = %s AND GeometryType(part.geom) = 'POLYGON';
+        """,
+            [str(metadata_id)],
+        )
+        part_count = cursor.rowcount
+        cursor.execute("ANALYZE tb_batas_wilayah_part;")
+    return part_count
+
+
+def locate_points(metadata_id, lons, lats):
+    """
+    Find the batas wilayah of a metadata containing every point with a single join
+    on the subdivided parts, a point on a shared border gets the lowest id.
+
+    Returns the batas wilayah id of every point (None when outside) and the
+    properties of every matched batas wilayah.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT p.idx, match.batas_wilayah_id
+            FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS p(lon, lat, idx)
+            LEFT JOIN LATERAL (
+                SELECT s.batas_wilayah_id
+                FROM tb_batas_wilayah_part AS s
+                WHERE s.file_metadata_id = %s
+                    AND ST_Intersects(s.geom, ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326))
+                ORDER BY s.batas_wilayah_id
+                LIMIT 1
+            ) AS match ON true;
+        """,
+            [list(lons), list(lats), str(metadata_id)],
+        )
+        rows = cursor.fetchall()
+
+    # ORDINALITY starts at 1
+    list_id = [None] * len(rows)
+    for idx, batas_wilayah_id in rows:
+        list_id[idx - 1] = batas_wilayah_id
+
+    matched = {batas_wilayah_id for batas_wilayah_id in list_id if batas_wilayah_id}
+    properties = dict(
+        BatasWilayah.objects.filter(id__in=matched).values_list("id", "properties")
+    )
+    return list_id, properties
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.3 on 2026-10-17 15:04
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batas_wilayah", "0002_bataswilayahmetadata_bbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatasWilayahPart",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "geom",
+                    django.contrib.gis.db.models.fields.PolygonField(srid=4326),
+                ),
+                (
+                    "batas_wilayah",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="parts",
+                        to="batas_wilayah.bataswilayah",
+                    ),
+                ),
+                (
+                    "file_metadata",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="batas_wilayah_parts",
+                        to="batas_wilayah.bataswilayahmetadata",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "tb_batas_wilayah_part",
+            },
+        ),
+        # Subdivide the batas wilayah uploaded before the parts existed
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO tb_batas_wilayah_part (batas_wilayah_id, file_metadata_id, geom)
+                SELECT b.id, b.file_metadata_id, part.geom
+                FROM tb_batas_wilayah AS b
+                CROSS JOIN LATERAL ST_Subdivide(b.mpoly, 256) AS part(geom)
+                WHERE GeometryType(part.geom) = 'POLYGON';
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-17 15:41
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batas_wilayah", "0003_bataswilayahpart"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bataswilayah",
+            name="mpoly_high",
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="bataswilayah",
+            name="mpoly_low",
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="bataswilayah",
+            name="mpoly_medium",
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        # Simplify the batas wilayah uploaded before the resolutions existed
+        migrations.RunSQL(
+            sql="""
+                UPDATE tb_batas_wilayah
+                SET mpoly_low = ST_Multi(ST_SimplifyPreserveTopology(mpoly, 0.01)),
+                    mpoly_medium = ST_Multi(ST_SimplifyPreserveTopology(mpoly, 0.001)),
+                    mpoly_high = ST_Multi(ST_SimplifyPreserveTopology(mpoly, 0.0001));
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
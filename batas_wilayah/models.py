@@ -27,6 +27,10 @@ class BatasWilayah(models.Model):
     properties = models.JSONField()
     # GeoDjango-specific: a geometry field (MultiPolygonField)
     mpoly = models.MultiPolygonField()
+    # Simplified geometries of the lower resolutions (see resolution.RESOLUTIONS)
+    mpoly_low = models.MultiPolygonField(null=True, blank=True)
+    mpoly_medium = models.MultiPolygonField(null=True, blank=True)
+    mpoly_high = models.MultiPolygonField(null=True, blank=True)
 
     # Timestamp fields
     created_at = models.DateTimeField(auto_now_add=True)
@@ -38,3 +42,26 @@ class BatasWilayah(models.Model):
 
     class Meta:
         db_table = "tb_batas_wilayah"
+
+
+class BatasWilayahPart(models.Model):
+    """
+    Piece of a batas wilayah polygon cut by ST_Subdivide, point lookups test a few
+    small polygons with a tight bbox instead of a whole kecamatan
+    """
+
+    batas_wilayah = models.ForeignKey(
+        BatasWilayah, related_name="parts", on_delete=models.CASCADE
+    )
+    file_metadata = models.ForeignKey(
+        BatasWilayahMetadata,
+        related_name="batas_wilayah_parts",
+        on_delete=models.CASCADE,
+    )
+    geom = models.PolygonField()
+
+    def __str__(self):
+        return f"{self.batas_wilayah_id} - {self.id}"
+
+    class Meta:
+        db_table = "tb_batas_wilayah_part"
@@ -0,0 +1,77 @@
+from django.db import connection
+
+# Geometry column and simplification tolerance (degree) of every resolution,
+# "full" is the uploaded geometry
+RESOLUTIONS = {
+    "low": ("mpoly_low", 0.01),  # ~1 km, province outlines
+    "medium": ("mpoly_medium", 0.001),  # ~100 m
+    "high": ("mpoly_high", 0.0001),  # ~10 m
+    "full": ("mpoly", None),
+}
+# Highest zoom level served by every simplified resolution, the tolerance stays
+# below the size of a pixel at the equator
+ZOOM_RESOLUTIONS = ((7, "low"), (10, "medium"), (13, "high"))
+
+
+def get_resolution(request):
+    """
+    Resolution from the 'resolution' query parameter, or derived from the 'zoom'
+    query parameter, default to the full resolution
+    """
+    resolution = request.query_params.get("resolution")
+    zoom = request.query_params.get("zoom")
+
+    if resolution is not None:
+        if resolution not in RESOLUTIONS:
+            raise ValueError(
+                f"Invalid resolution '{resolution}'. Supported resolutions: {', '.join(RESOLUTIONS)}"
+            )
+        return resolution
+
+    if zoom is not None:
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            raise ValueError("'zoom' must be an integer.")
+        for max_zoom, zoom_resolution in ZOOM_RESOLUTIONS:
+            if zoom <= max_zoom:
+                return zoom_resolution
+
+    return "full"
+
+
+def geometry_column(resolution: str):
+    return RESOLUTIONS[resolution][0]
+
+
+def other_geometry_columns(resolution: str):
+    """
+    Geometry columns not needed by a resolution, deferred in the querysets
+    """
+    return [
+        column
+        for other, (column, _) in RESOLUTIONS.items()
+        if other != resolution and column != geometry_column(resolution)
+    ]
+
+
+def simplify_batas_wilayah(metadata_id):
+    """
+    Compute the simplified geometry of every resolution of a metadata in a
+    single UPDATE, every polygon stays valid (ST_SimplifyPreserveTopology)
+    """
+    assignments = ", ".join(
+        f"{column} = ST_Multi(ST_SimplifyPreserveTopology(mpoly, {tolerance}))"
+        for column, tolerance in RESOLUTIONS.values()
+        if tolerance is not None
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE tb_batas_wilayah
+            SET {assignments}
+            WHERE file_metadata_id = %s;
+        """,
+            [str(metadata_id)],
+        )
+        return cursor.rowcount
@@ -1,4 +1,5 @@
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
+from rest_framework_gis.fields import GeometryField
 from rest_framework import serializers
 from .models import BatasWilayah, BatasWilayahMetadata
 
@@ -33,6 +34,13 @@ class BatasWilayahDetailSerializer(serializers.ModelSerializer):
         )
         geo_field = "mpoly"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Simplified geometry of the requested resolution instead of mpoly
+        geometry_column = self.context.get("geometry_column", "mpoly")
+        if geometry_column != "mpoly":
+            self.fields["mpoly"] = GeometryField(source=geometry_column)
+
     def to_representation(self, instance):
         # Get the default representation
         representation = super().to_representation(instance)
@@ -2,6 +2,8 @@ from django.urls import path
 from .views import (
     BatasWilayahDetail,
     BatasWilayahListByMetadataId,
+    BatasWilayahGeoJSON,
+    BatasWilayahLocate,
     BatasWilayahMetadataList,
     BatasWilayahMetadataDetail,
     BatasWilayahUpload,
@@ -32,6 +34,16 @@ urlpatterns = [
         BatasWilayahListByMetadataId.as_view(),
         name="batas-wilayah-list-by-metadata-id",
     ),
+    path(
+        "batas-wilayah/geojson/<str:metadata_id>/",
+        BatasWilayahGeoJSON.as_view(),
+        name="batas-wilayah-geojson",
+    ),
+    path(
+        "batas-wilayah/locate/<str:metadata_id>/",
+        BatasWilayahLocate.as_view(),
+        name="batas-wilayah-locate",
+    ),
     path(
         "batas-wilayah/detail/<int:pk>/",
         BatasWilayahDetail.as_view(),
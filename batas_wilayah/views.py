@@ -1,17 +1,17 @@
-import geopandas as gpd
 from rest_framework import generics, status
 from rest_framework.response import Response
-from django.contrib.gis.geos import MultiPolygon, Polygon
-from django.contrib.gis.geos import GEOSGeometry
-from shapely.geometry import MultiPolygon
+from .lookup import LOOKUP_MAX_POINTS, locate_points
 from .models import BatasWilayah, BatasWilayahMetadata
+from .resolution import get_resolution, geometry_column, other_geometry_columns
 from .serializers import BatasWilayahDetailSerializer, BatasWilayahMetadataSerializer
 from geodjango.utils import (
     is_valid_geospatial_file,
-    find_shapefile_path,
-    extract_zip_to_temp,
+    stream_feature_collection,
+    filter_by_area,
+    KeysetPagination,
 )
-from shapely.wkb import dumps, loads
+from job.queue import enqueue_job
+from tiles.mvt import invalidate_tiles
 
 
 class BatasWilayahMetadataList(generics.ListAPIView):
@@ -23,25 +23,154 @@ class BatasWilayahMetadataDelete(generics.DestroyAPIView):
     queryset = BatasWilayahMetadata.objects.all()
     serializer_class = BatasWilayahMetadataSerializer
 
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_tiles("batas_wilayah", instance.id)
+
 
 class BatasWilayahMetadataDetail(generics.RetrieveAPIView):
     queryset = BatasWilayahMetadata.objects.all()
     serializer_class = BatasWilayahMetadataSerializer
 
 
-class BatasWilayahListByMetadataId(generics.ListAPIView):
+class ResolutionMixin:
+    """
+    Serve the geometry of the 'resolution' (or 'zoom') query parameter, the
+    geometry columns of the other resolutions are not read
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["geometry_column"] = geometry_column(get_resolution(self.request))
+        return context
+
+    def defer_geometries(self, queryset):
+        return queryset.defer(*other_geometry_columns(get_resolution(self.request)))
+
+
+class BatasWilayahListByMetadataId(ResolutionMixin, generics.ListAPIView):
     serializer_class = BatasWilayahDetailSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         # Filter BatasWilayah by file_id from the URL
         metadata_id = self.kwargs.get("metadata_id")
-        return BatasWilayah.objects.filter(file_metadata__id=metadata_id)
+        queryset = BatasWilayah.objects.filter(
+            file_metadata__id=metadata_id
+        ).select_related("file_metadata")
+        queryset = self.defer_geometries(queryset)
+        return filter_by_area(queryset, "mpoly", self.request)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BatasWilayahGeoJSON(generics.RetrieveAPIView):
+    """
+    API view to stream the batas wilayah of a metadata as a GeoJSON FeatureCollection
+    """
+
+    queryset = BatasWilayahMetadata.objects.all()
+    serializer_class = BatasWilayahMetadataSerializer
+    lookup_url_kwarg = "metadata_id"
+
+    def retrieve(self, request, *args, **kwargs):
+        metadata_instance = self.get_object()
+
+        try:
+            resolution = get_resolution(request)
+            batas_wilayah_queryset = filter_by_area(
+                BatasWilayah.objects.filter(file_metadata=metadata_instance),
+                "mpoly",
+                request,
+            )
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return stream_feature_collection(
+            self.get_serializer(metadata_instance).data,
+            batas_wilayah_queryset.order_by("id"),
+            geometry_column(resolution),
+            "properties",
+        )
+
+
+class BatasWilayahLocate(generics.CreateAPIView):
+    """
+    API view to find the batas wilayah (e.g. kelurahan) containing every point
+    of a batch, points are [lon, lat] pairs
+    """
+
+    def post(self, request, *args, **kwargs):
+        metadata_id = kwargs.get("metadata_id")
+        points = request.data.get("points")
+
+        if not isinstance(points, list) or not points:
+            return Response(
+                {"error": "'points' must be a non-empty list of [lon, lat]."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(points) > LOOKUP_MAX_POINTS:
+            return Response(
+                {"error": f"At most {LOOKUP_MAX_POINTS} points per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            lons = [float(point[0]) for point in points]
+            lats = [float(point[1]) for point in points]
+        except (TypeError, ValueError, IndexError, KeyError):
+            return Response(
+                {"error": "Every point must be a [lon, lat] pair of numbers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            metadata = BatasWilayahMetadata.objects.get(id=metadata_id)
+        except BatasWilayahMetadata.DoesNotExist:
+            return Response(
+                {"error": "Metadata not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            list_id, properties = locate_points(metadata.id, lons, lats)
+
+            return Response(
+                {
+                    "metadata": BatasWilayahMetadataSerializer(metadata).data,
+                    "count": len(list_id),
+                    "matched": sum(
+                        batas_wilayah_id is not None for batas_wilayah_id in list_id
+                    ),
+                    # Batas wilayah id of every point, in the order of the request
+                    "ids": list_id,
+                    "batas_wilayah": properties,
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
 
-class BatasWilayahDetail(generics.RetrieveAPIView):
-    queryset = BatasWilayah.objects.all()
+class BatasWilayahDetail(ResolutionMixin, generics.RetrieveAPIView):
     serializer_class = BatasWilayahDetailSerializer
 
+    def get_queryset(self):
+        return self.defer_geometries(BatasWilayah.objects.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
 
 class BatasWilayahUpload(generics.CreateAPIView):
     """
@@ -76,31 +205,25 @@ class BatasWilayahUpload(generics.CreateAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Process the file based on its format
         try:
             # Save metadata (name, description) to the BatasWilayahMetadata model
             metadata = BatasWilayahMetadata.objects.create(
                 name=name, description=description
             )
 
-            if file_format == "zip":
-                # Handle shapefile in zip format
-                temp_dir = extract_zip_to_temp(file)
-                shapefile_path = find_shapefile_path(temp_dir)
-
-                # Process the shapefile (e.g., load into GeoDjango models)
-                self.process_file(shapefile_path, metadata)
-
-            elif file_format == "kml":
-                # Process KML file (e.g., parse and load into GeoDjango)
-                self.process_file(file, metadata)
-
-            elif file_format == "geojson":
-                # Process GeoJSON file (e.g., parse and load into GeoDjango)
-                self.process_file(file, metadata)
+            # The features are loaded by the job worker
+            job = enqueue_job(
+                "batas_wilayah_upload",
+                {"metadata_id": str(metadata.id), "file_format": file_format},
+                file=file,
+            )
 
             return Response(
-                {"message": "File uploaded successfully", "metadata_id": metadata.id},
+                {
+                    "message": "File uploaded successfully",
+                    "metadata_id": metadata.id,
+                    "job_id": job.id,
+                },
                 status=status.HTTP_201_CREATED,
             )
 
@@ -108,35 +231,3 @@ class BatasWilayahUpload(generics.CreateAPIView):
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-
-    def process_file(self, file_path, metadata: BatasWilayahMetadata):
-        """
-        Process the extracted file and load data into the BatasWilayah model.
-        """
-        gdf = gpd.read_file(file_path)
-
-        if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
-            gdf = gdf.to_crs(epsg=4326)
-
-        total_bbox = gdf.total_bounds
-        metadata.bbox = Polygon.from_bbox(total_bbox)
-        metadata.save()
-
-        for _, row in gdf.iterrows():
-
-            geom = row["geometry"]
-            if geom.geom_type == "Polygon":
-                geom = MultiPolygon([geom])
-            elif geom.geom_type != "MultiPolygon":
-                # Skip non-Polygon and non-MultiPolygon geometries
-                return
-
-            geom_2d = loads(dumps(geom, output_dimension=2))
-            geos_geom = GEOSGeometry(geom_2d.wkt)
-            # Extract the properties (attribute data)
-            properties = row.drop("geometry").to_dict()
-
-            # Save each feature to the BatasWilayah model
-            BatasWilayah.objects.create(
-                file_metadata=metadata, properties=properties, mpoly=geos_geom
-            )
@@ -0,0 +1,133 @@
+"""
+Benchmark of the concave hull engines of the isochrones.
+
+Builds a synthetic isochrone buffer (road grid around Jakarta buffered like
+isochrone_buffer_geojson) and compares the latency and the area of every engine
+with the original alphashape hull computed from every point.
+
+Usage: python benchmarks/concave_hull.py [--streets 60] [--repeat 3] [--postgis]
+"""
+
+import argparse
+import json
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+import shapely
+from shapely.geometry import mapping, shape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "geodjango.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from geodjango.utils import (  # noqa: E402
+    create_concave_hull,
+    concave_hull_sql,
+    transform_geometry,
+)
+
+
+def synthetic_isochrone(streets: int, seed: int = 0):
+    """
+    Buffered road grid clipped to a 3 km radius, with a few streets missing
+    """
+    rng = np.random.default_rng(seed)
+    center_lon, center_lat = 106.8272, -6.1754
+    extent = 0.03
+    offsets = np.linspace(-extent, extent, streets)
+
+    lines = []
+    for offset in offsets:
+        if rng.random() > 0.2:
+            lines.append(
+                [
+                    (center_lon - extent, center_lat + offset),
+                    (center_lon + extent, center_lat + offset),
+                ]
+            )
+        if rng.random() > 0.2:
+            lines.append(
+                [
+                    (center_lon + offset, center_lat - extent),
+                    (center_lon + offset, center_lat + extent),
+                ]
+            )
+
+    network = shapely.union_all(shapely.linestrings(lines))
+    # Segment the lines so the buffer keeps the road network detail
+    network = shapely.segmentize(network, 0.0005)
+    reach = shapely.Point(center_lon, center_lat).buffer(0.027)
+    return mapping(network.intersection(reach).buffer(0.0002))
+
+
+def postgis_hull(geojson_buffer: dict):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {concave_hull_sql("geom", 20)}
+            FROM (SELECT ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326) AS geom) AS buffered;
+        """,
+            [json.dumps(geojson_buffer)],
+        )
+        return cursor.fetchone()[0]
+
+
+def area_3857(geojson: str):
+    return transform_geometry(shape(json.loads(geojson)), 4326, 3857)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streets", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--postgis", action="store_true", help="also run ST_ConcaveHull"
+    )
+    args = parser.parse_args()
+
+    geojson_buffer = synthetic_isochrone(args.streets)
+    n_points = len(shapely.get_coordinates(shape(geojson_buffer)))
+    print(f"Isochrone buffer with {n_points} points")
+
+    engines = {
+        # Original behaviour: every point handed to alphashape
+        "alphashape (all points)": lambda: create_concave_hull(
+            geojson_buffer, 0.003, 20, grid_size=1e-6
+        ),
+        "alphashape": lambda: create_concave_hull(geojson_buffer, 0.003, 20),
+        "shapely": lambda: create_concave_hull(
+            geojson_buffer, 0.003, 20, engine="shapely"
+        ),
+    }
+    if args.postgis:
+        engines["postgis"] = lambda: postgis_hull(geojson_buffer)
+
+    reference = None
+    print(
+        f"{'engine':<26}{'latency (ms)':>14}{'area (km2)':>12}{'area ratio':>12}{'IoU':>8}"
+    )
+    for name, run in engines.items():
+        timings = []
+        for _ in range(args.repeat):
+            started_at = perf_counter()
+            hull = run()
+            timings.append(perf_counter() - started_at)
+
+        polygon = area_3857(hull)
+        if reference is None:
+            reference = polygon
+        iou = polygon.intersection(reference).area / polygon.union(reference).area
+        print(
+            f"{name:<26}{1000 * min(timings):>14.1f}{polygon.area / 1e6:>12.3f}"
+            f"{polygon.area / reference.area:>12.3f}{iou:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark of the contraction hierarchy routes against plain Dijkstra.
+
+Builds the contraction hierarchy of a road table (or of a synthetic road grid)
+and compares the latency of random routes answered by the bidirectional search
+with the scipy Dijkstra of the road graph and, for a road table, pgr_dijkstra.
+
+Usage: python benchmarks/contraction.py [--metadata <jalan id>] [--profile walking]
+       [--grid 150] [--routes 50]
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "geodjango.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from jalan.contraction import ContractionHierarchy  # noqa: E402
+from jalan.models import JalanMetadata  # noqa: E402
+from jalan.profiles import edges_sql, is_directed  # noqa: E402
+from jalan.routing import RoadGraph  # noqa: E402
+
+
+def synthetic_graph(size: int, seed: int = 0):
+    """
+    Road grid of size x size vertices, 10% of the streets missing and 20% one way
+    """
+    rng = np.random.default_rng(seed)
+    vertex_ids = np.arange(size * size).reshape(size, size) + 1
+    sources = np.concatenate([vertex_ids[:, :-1].ravel(), vertex_ids[:-1, :].ravel()])
+    targets = np.concatenate([vertex_ids[:, 1:].ravel(), vertex_ids[1:, :].ravel()])
+    kept = rng.random(len(sources)) > 0.1
+    sources, targets = sources[kept], targets[kept]
+
+    costs = rng.uniform(0.1, 2, len(sources))
+    reverse_costs = np.where(rng.random(len(sources)) < 0.2, -1, costs)
+    return RoadGraph(
+        np.arange(len(sources)) + 1, sources, targets, costs, reverse_costs
+    )
+
+
+def pgrouting_route(road_table: str, profile: str, start_vid: int, end_vid: int):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT SUM(cost)
+            FROM pgr_dijkstra(
+                '{edges_sql(road_table, profile)}',
+                %s::bigint,
+                %s::bigint,
+                directed := true
+            );
+        """,
+            [int(start_vid), int(end_vid)],
+        )
+        return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--metadata", help="JalanMetadata id with a created topology")
+    parser.add_argument("--profile", default="walking")
+    parser.add_argument("--grid", type=int, default=150)
+    parser.add_argument("--routes", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.metadata:
+        metadata = JalanMetadata.objects.get(id=args.metadata)
+        graph = RoadGraph.from_table(metadata.road_table, args.profile)
+    else:
+        metadata = None
+        graph = synthetic_graph(args.grid)
+    print(f"Road graph with {len(graph.node_ids)} nodes, {graph.matrix.nnz} arcs")
+
+    started_at = perf_counter()
+    hierarchy = ContractionHierarchy.build(graph)
+    print(
+        f"Contraction: {perf_counter() - started_at:.1f} s, "
+        f"{hierarchy.shortcut_count} shortcuts"
+    )
+
+    # The hierarchy is directed, walking costs are the same both ways
+    directed = is_directed(args.profile) or metadata is None
+    engines = {
+        "ch": lambda start, end: hierarchy.shortest_path(graph, start, end),
+        "dijkstra": lambda start, end: graph.shortest_path(
+            start, end, directed=directed
+        ),
+    }
+    if metadata is not None:
+        engines["pgr_dijkstra"] = lambda start, end: pgrouting_route(
+            metadata.road_table, args.profile, start, end
+        )
+
+    rng = np.random.default_rng(1)
+    pairs = rng.choice(graph.node_ids, size=(args.routes, 2))
+
+    reference = None
+    print(f"{'engine':<14}{'mean (ms)':>12}{'p95 (ms)':>12}{'mismatch':>10}")
+    for name, run in engines.items():
+        timings = []
+        costs = []
+        for start, end in pairs:
+            started_at = perf_counter()
+            result = run(int(start), int(end))
+            timings.append(perf_counter() - started_at)
+            if isinstance(result, tuple):
+                result = result[1]
+            costs.append(np.nan if result is None else float(result))
+
+        costs = np.array(costs)
+        if reference is None:
+            reference = costs
+        mismatch = np.sum(~np.isclose(costs, reference, equal_nan=True))
+        timings = 1000 * np.array(timings)
+        print(
+            f"{name:<14}{timings.mean():>12.2f}"
+            f"{np.percentile(timings, 95):>12.2f}{mismatch:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
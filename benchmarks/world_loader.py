@@ -0,0 +1,104 @@
+"""
+Benchmark of the world borders loaders.
+
+Loads a world borders shapefile with LayerMapping (world.load.run), with the
+previous upload (one save per country after a WKT round trip) and with the
+pyogrio + COPY bulk loader. Every run is rolled back, the table is left as is.
+
+Usage: python benchmarks/world_loader.py [path] [--repeat 3] [--skip-slow]
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "geodjango.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import geopandas as gpd  # noqa: E402
+from django.contrib.gis.geos import GEOSGeometry  # noqa: E402
+from django.contrib.gis.utils import LayerMapping  # noqa: E402
+from django.db import transaction  # noqa: E402
+from shapely.geometry import MultiPolygon  # noqa: E402
+from world.load import bulk_load, world_mapping, world_shp  # noqa: E402
+from world.models import WorldBorder  # noqa: E402
+
+
+def layer_mapping(path):
+    LayerMapping(WorldBorder, path, world_mapping, transform=False).save(
+        strict=True, verbose=False
+    )
+
+
+def row_by_row(path):
+    """
+    Previous WorldBorderUpload: geopandas, WKT round trip and one save per country
+    """
+    gdf = gpd.read_file(path)
+    for _, row in gdf.iterrows():
+        geom = row["geometry"]
+        if geom.geom_type == "Polygon":
+            geom = MultiPolygon([geom])
+        WorldBorder(
+            name=row["NAME"],
+            area=row["AREA"],
+            pop2005=row["POP2005"],
+            fips=row["FIPS"],
+            iso2=row["ISO2"],
+            iso3=row["ISO3"],
+            un=row["UN"],
+            region=row["REGION"],
+            subregion=row["SUBREGION"],
+            lon=geom.centroid.x,
+            lat=geom.centroid.y,
+            mpoly=GEOSGeometry(geom.wkt),
+        ).save()
+
+
+def timed_rollback(run, path):
+    """
+    Seconds taken by a loader, its rows are rolled back
+    """
+    with transaction.atomic():
+        started_at = perf_counter()
+        run(path)
+        elapsed = perf_counter() - started_at
+        count = WorldBorder.objects.count()
+        transaction.set_rollback(True)
+    return elapsed, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default=str(world_shp))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--skip-slow", action="store_true", help="only run the bulk loader"
+    )
+    args = parser.parse_args()
+
+    loaders = {"bulk (pyogrio + COPY)": bulk_load}
+    if not args.skip_slow:
+        loaders = {
+            "LayerMapping": layer_mapping,
+            "row by row": row_by_row,
+            **loaders,
+        }
+
+    existing = WorldBorder.objects.count()
+    print(f"{'loader':<24}{'best (s)':>10}{'countries':>11}")
+    for name, run in loaders.items():
+        timings = []
+        for _ in range(args.repeat):
+            elapsed, count = timed_rollback(run, args.path)
+            timings.append(elapsed)
+        print(f"{name:<24}{min(timings):>10.3f}{count - existing:>11}")
+
+
+if __name__ == "__main__":
+    main()
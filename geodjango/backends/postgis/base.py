@@ -0,0 +1,43 @@
+import threading
+from time import perf_counter
+from django.contrib.gis.db.backends.postgis.base import (
+    DatabaseWrapper as PostGISDatabaseWrapper,
+)
+
+_stats_lock = threading.Lock()
+_connect_stats = {}
+
+
+class DatabaseWrapper(PostGISDatabaseWrapper):
+    """
+    PostGIS backend recording the time spent getting every new connection, which
+    is the wait for a free connection when the psycopg pool is enabled
+    """
+
+    def get_new_connection(self, conn_params):
+        started_at = perf_counter()
+        connection = super().get_new_connection(conn_params)
+        record_connect(self.alias, perf_counter() - started_at)
+        return connection
+
+
+def record_connect(alias: str, seconds: float):
+    with _stats_lock:
+        stats = _connect_stats.setdefault(
+            alias, {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        stats["count"] += 1
+        stats["total_ms"] += seconds * 1000
+        stats["max_ms"] = max(stats["max_ms"], seconds * 1000)
+
+
+def connect_stats(alias: str):
+    """
+    Connections opened (or taken from the pool) by this process and the time
+    spent waiting for them
+    """
+    with _stats_lock:
+        stats = dict(_connect_stats.get(alias, {"count": 0, "total_ms": 0.0}))
+    stats.setdefault("max_ms", 0.0)
+    stats["avg_ms"] = stats["total_ms"] / stats["count"] if stats["count"] else 0.0
+    return {key: round(value, 3) for key, value in stats.items()}
@@ -54,6 +54,8 @@ INSTALLED_APPS = [
     "sekolah",
     "peserta_didik",
     "project",
+    "job",
+    "tiles",
 ]
 
 MIDDLEWARE = [
@@ -87,7 +89,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "geodjango.wsgi.application"
 
+import importlib.util
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # Initialize environment variables
 env = environ.Env()
@@ -97,14 +101,45 @@ environ.Env.read_env()
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connections are kept by every worker for CONN_MAX_AGE seconds (0 closes them
+# after every request) and checked before being reused. DATABASE_POOL replaces
+# them with a psycopg pool per worker process of DATABASE_POOL_MIN_SIZE to
+# DATABASE_POOL_MAX_SIZE connections, a request waits at most DATABASE_POOL_TIMEOUT
+# seconds for a free one. The pool needs psycopg[binary,pool] 3, which is not in the
+# Pipfile (psycopg2 is): the settings refuse to load without it.
+DATABASE_POOL = env.bool("DATABASE_POOL", default=False)
+if DATABASE_POOL and not (
+    importlib.util.find_spec("psycopg") and importlib.util.find_spec("psycopg_pool")
+):
+    # psycopg2 would only fail on the first connection, with an obscure error
+    raise ImproperlyConfigured(
+        "DATABASE_POOL needs psycopg 3 with its pool, "
+        "install it with: pip install 'psycopg[binary,pool]'"
+    )
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        # PostGIS backend timing every connection, see api/db/stats/
+        "ENGINE": "geodjango.backends.postgis",
         "NAME": env("DATABASE_NAME", default="db_name"),
         "USER": env("DATABASE_USER", default="root"),
         "PASSWORD": env("DATABASE_PASSWORD", default="password123"),
         "HOST": env("DATABASE_HOST", default="localhost"),
         "PORT": env("DATABASE_PORT", default="5432"),
+        # Persistent connections cannot be combined with the pool
+        "CONN_MAX_AGE": 0 if DATABASE_POOL else env.int("CONN_MAX_AGE", default=600),
+        "CONN_HEALTH_CHECKS": env.bool("CONN_HEALTH_CHECKS", default=True),
+        "OPTIONS": (
+            {
+                "pool": {
+                    "min_size": env.int("DATABASE_POOL_MIN_SIZE", default=2),
+                    "max_size": env.int("DATABASE_POOL_MAX_SIZE", default=8),
+                    "timeout": env.float("DATABASE_POOL_TIMEOUT", default=10),
+                }
+            }
+            if DATABASE_POOL
+            else {}
+        ),
     }
 }
 
@@ -152,3 +187,81 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # GDAL library path
 GDAL_LIBRARY_PATH = env("GDAL_LIBRARY_PATH_RAW", default=None)
+
+# Routing engine for route and isochrone queries: "pgrouting" runs the query in
+# PostGIS, "graph" answers it from a road graph cached in the worker memory and
+# "ch" answers routes from the contraction hierarchy built after the topology
+# (isochrones fall back to the road graph)
+ROUTING_ENGINE = env("ROUTING_ENGINE", default="pgrouting")
+
+# The pgRouting queries only load the roads of a window around the route or the
+# isochrone reach, the "jalan.routing" logger records every window at INFO level and
+# the number of edges it loaded at DEBUG level (one extra count query per search)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "jalan.routing": {
+            "handlers": ["console"],
+            "level": env("ROUTING_LOG_LEVEL", default="WARNING"),
+        },
+        # Failed jobs with their traceback, in the log of the run_jobs worker
+        "job": {
+            "handlers": ["console"],
+            "level": "INFO",
+        },
+    },
+}
+
+# Concave hull engine of the isochrones: "alphashape", "shapely" (GEOS concave hull)
+# or "postgis" (ST_ConcaveHull computed in the isochrone buffer query)
+CONCAVE_HULL_ENGINE = env("CONCAVE_HULL_ENGINE", default="alphashape")
+
+# Isochrone results are cached per worker process (LRU capped in bytes) and, when
+# ISOCHRONE_CACHE_SHARED is set, in the "isochrone" cache shared by every worker
+# (file based by default, e.g. django.core.cache.backends.redis.RedisCache for Redis)
+ISOCHRONE_CACHE_MAX_BYTES = env.int(
+    "ISOCHRONE_CACHE_MAX_BYTES", default=64 * 1024 * 1024
+)
+ISOCHRONE_CACHE_SHARED = env.bool("ISOCHRONE_CACHE_SHARED", default=False)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "isochrone": {
+        "BACKEND": env(
+            "ISOCHRONE_CACHE_BACKEND",
+            default="django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": env(
+            "ISOCHRONE_CACHE_LOCATION", default=str(BASE_DIR / "cache" / "isochrone")
+        ),
+        "TIMEOUT": env.int("ISOCHRONE_CACHE_TIMEOUT", default=24 * 60 * 60),
+    },
+}
+
+# Background jobs (uploads, topology, zonasi batch), run with `python manage.py run_jobs`
+JOB_CONCURRENCY = env.int("JOB_CONCURRENCY", default=2)  # jobs running per node
+JOB_UPLOAD_DIR = env("JOB_UPLOAD_DIR", default=str(BASE_DIR / "uploads"))
+JOB_STALE_SECONDS = env.int("JOB_STALE_SECONDS", default=120)  # heartbeat timeout
+JOB_MAX_ATTEMPTS = env.int("JOB_MAX_ATTEMPTS", default=3)
+
+# Travel time arrays of the published projects (ProjectFindZonasi mode=precomputed),
+# memory-mapped by every worker so the directory has to be shared between them
+ZONASI_PRECOMPUTE_DIR = env(
+    "ZONASI_PRECOMPUTE_DIR", default=str(BASE_DIR / "precompute")
+)
+
+# Contraction hierarchies of the road tables (routing engine "ch"), one npz file
+# per road table and speed profile
+CONTRACTION_DIR = env(
+    "CONTRACTION_DIR", default=str(BASE_DIR / "precompute" / "contraction")
+)
+
+# Mapbox Vector Tiles cached on disk, one directory per layer version
+TILE_CACHE_DIR = env("TILE_CACHE_DIR", default=str(BASE_DIR / "cache" / "tiles"))
+
+# Speed profile of the routes and isochrones: "walking", "bicycle", "motorbike" or "car"
+SPEED_PROFILE = env("SPEED_PROFILE", default="walking")
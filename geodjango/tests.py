@@ -0,0 +1,164 @@
+import codecs
+import io
+from types import SimpleNamespace
+from unittest import mock
+from django.db.models import CharField, FloatField
+from django.test import SimpleTestCase
+from .utils import (
+    ChunkStream,
+    bulk_create_csv_rows,
+    detect_csv_encoding,
+    iter_csv_rows,
+    parse_lat_lon,
+)
+
+
+def split_chunks(data: bytes, size: int):
+    return [data[start : start + size] for start in range(0, len(data), size)]
+
+
+class ChunkStreamTests(SimpleTestCase):
+    def test_read_matches_the_chunks(self):
+        data = bytes(range(256)) * 40
+        for chunk_size in (1, 7, 64, 4096, len(data)):
+            chunks = [b"", *split_chunks(data, chunk_size), b""]
+            for read_size in (1, 5, 100, -1):
+                stream = io.BufferedReader(ChunkStream(chunks), buffer_size=32)
+                read = b"".join(iter(lambda: stream.read(read_size), b""))
+                self.assertEqual(read, data)
+
+    def test_empty_stream(self):
+        self.assertEqual(io.BufferedReader(ChunkStream([])).read(), b"")
+
+
+class DetectCsvEncodingTests(SimpleTestCase):
+    def test_utf8_bom(self):
+        self.assertEqual(detect_csv_encoding(codecs.BOM_UTF8 + b"nama\n"), "utf-8-sig")
+
+    def test_utf8(self):
+        self.assertEqual(detect_csv_encoding("nama\nSekolah Ö\n".encode()), "utf-8")
+
+    def test_utf8_character_split_at_the_end(self):
+        sample = "nama\nSekolah é".encode()[:-1]
+        self.assertEqual(detect_csv_encoding(sample), "utf-8")
+
+    def test_cp1252(self):
+        sample = "nama\nSekolah é\n".encode("cp1252")
+        self.assertEqual(detect_csv_encoding(sample), "cp1252")
+
+
+class IterCsvRowsTests(SimpleTestCase):
+    def read_rows(self, data: bytes, chunk_size: int):
+        return [
+            (line, dict(row))
+            for line, row in iter_csv_rows(io.BytesIO(data), chunk_size=chunk_size)
+        ]
+
+    def test_rows_do_not_depend_on_the_chunk_size(self):
+        text = 'nama,alamat\nSDN 1,"Jl. Merdeka\nNo. 5"\n,\nSMP Ü,Jl. Ö\n'
+        expected = [
+            (3, {"nama": "SDN 1", "alamat": "Jl. Merdeka\nNo. 5"}),
+            (5, {"nama": "SMP Ü", "alamat": "Jl. Ö"}),
+        ]
+        for encoding in ("utf-8", "utf-8-sig", "cp1252"):
+            data = text.encode(encoding)
+            for chunk_size in (3, 16, 1024):
+                self.assertEqual(self.read_rows(data, chunk_size), expected)
+
+    def test_cp1252_characters_after_the_first_chunk(self):
+        data = "nama\nSekolah é\n".encode() + "Sekolah è\n".encode("cp1252")
+        # The first chunk is UTF-8, the cp1252 byte later on is decoded as cp1252
+        rows = self.read_rows(data, chunk_size=16)
+        self.assertEqual([row["nama"] for _, row in rows], ["Sekolah é", "Sekolah è"])
+
+
+def csv_model():
+    """
+    Stand-in model with the text and coordinate columns of Sekolah
+    """
+    fields = [
+        CharField(name="npsn", max_length=50, blank=True, default=""),
+        CharField(name="nama", max_length=255, blank=True, default=""),
+        FloatField(name="lat", null=True),
+        FloatField(name="lon", null=True),
+    ]
+    for field in fields:
+        field.set_attributes_from_name(field.name)
+    return SimpleNamespace(
+        _meta=SimpleNamespace(concrete_fields=fields),
+        objects=SimpleNamespace(bulk_create=mock.Mock()),
+    )
+
+
+def build_row(row):
+    lat, lon = parse_lat_lon(row)
+    return SimpleNamespace(npsn=row.get("npsn"), nama=row["nama"], lat=lat, lon=lon)
+
+
+class BulkCreateCsvRowsTests(SimpleTestCase):
+    def create_rows(self, text: str):
+        model = csv_model()
+        inserted = []
+        # The batch list is cleared after every insert, keep its instances
+        bulk_create = model.objects.bulk_create
+        bulk_create.side_effect = lambda batch, **_: inserted.extend(batch)
+        result = bulk_create_csv_rows(
+            iter_csv_rows(io.BytesIO(text.encode())), model, build_row
+        )
+        return result, inserted
+
+    def test_text_longer_than_the_column_is_reported(self):
+        text = (
+            "npsn,nama,lat,lon\n"
+            "1,SDN 1,-6.2,106.8\n"
+            f"{'9' * 51},SDN 2,-6.2,106.8\n"
+            f"3,{'S' * 256},-6.2,106.8\n"
+            "4,SDN 4,-6.3,106.9\n"
+        )
+        result, inserted = self.create_rows(text)
+
+        self.assertEqual(result["count"], 2)
+        self.assertEqual([instance.npsn for instance in inserted], ["1", "4"])
+        self.assertEqual([error["row"] for error in result["errors"]], [3, 4])
+        self.assertIn("'npsn'", result["errors"][0]["error"])
+        self.assertIn("'nama'", result["errors"][1]["error"])
+
+    def test_missing_required_text_is_reported(self):
+        result, inserted = self.create_rows("nama,lat,lon\nSDN 1,-6.2,106.8\n")
+        self.assertEqual(result["count"], 0)
+        self.assertEqual(inserted, [])
+        self.assertIn("'npsn' is required", result["errors"][0]["error"])
+
+    def test_invalid_coordinates_are_reported(self):
+        text = (
+            "npsn,nama,lat,lon\n"
+            "1,SDN 1,nan,106.8\n"
+            "2,SDN 2,-6.2,inf\n"
+            "3,SDN 3,-91,106.8\n"
+            "4,SDN 4,-6.2,181\n"
+            "5,SDN 5,-6.2,106.8\n"
+        )
+        result, inserted = self.create_rows(text)
+
+        self.assertEqual(result["count"], 1)
+        self.assertEqual(result["skipped"], 4)
+        self.assertEqual([error["row"] for error in result["errors"]], [2, 3, 4, 5])
+        # The bbox only covers the inserted rows
+        self.assertEqual(result["bbox"].extent, (106.8, -6.2, 106.8, -6.2))
+
+
+class ParseLatLonTests(SimpleTestCase):
+    def test_rounded_coordinates(self):
+        row = {"lat": "-6.12345678", "lon": "106.87654321"}
+        self.assertEqual(parse_lat_lon(row), (-6.123457, 106.876543))
+
+    def test_invalid_coordinates(self):
+        for lat, lon in [
+            ("nan", "106.8"),
+            ("-6.2", "-inf"),
+            ("90.5", "106.8"),
+            ("-6.2", "-180.1"),
+            ("", "106.8"),
+        ]:
+            with self.assertRaises(ValueError):
+                parse_lat_lon({"lat": lat, "lon": lon})
@@ -17,13 +17,17 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from .views import DatabaseStats
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/db/stats/", DatabaseStats.as_view(), name="db-stats"),
     path("api/", include("world.urls")),
     path("api/", include("batas_wilayah.urls")),
     path("api/", include("sekolah.urls")),
     path("api/", include("peserta_didik.urls")),
     path("api/", include("jalan.urls")),
     path("api/", include("project.urls")),
+    path("api/", include("job.urls")),
+    path("api/", include("tiles.urls")),
 ]
@@ -3,20 +3,49 @@ import tempfile
 import zipfile
 import csv
 import io
-from django.contrib.gis.geos import Polygon
+import codecs
+import itertools
+import math
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import Polygon, GEOSGeometry, GEOSException
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import CharField, TextField
+from django.db.models.functions import Cast
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
 from datetime import datetime
 import requests
 from requests.auth import HTTPBasicAuth
 import environ
 import json
 import alphashape
-from shapely.geometry import shape, mapping, Point
+from shapely.geometry import shape, mapping
+import shapely
+from pyproj import Geod, Transformer
+from django.conf import settings
+from functools import lru_cache
 import geopandas as gpd
+import numpy as np
 
 # Initialize environment variables
 env = environ.Env()
 environ.Env.read_env()
 
+# Maximum number of invalid rows reported back for a CSV upload
+MAX_CSV_ERRORS = 1000
+
+# Rows fetched per round trip of the server-side cursor of a streamed layer
+STREAM_CHUNK_SIZE = 2000
+# Features are sent in pieces of about this size (characters)
+STREAM_BUFFER_SIZE = 64 * 1024
+
+CONCAVE_HULL_ENGINES = ("alphashape", "shapely", "postgis")
+# Hull points are downsampled to one point per grid cell (meter, EPSG:3857)
+CONCAVE_HULL_GRID_SIZE = 25
+# Maximum edge length ratio of the shapely and postgis concave hull
+CONCAVE_HULL_RATIO = 0.5
+
 
 def is_valid_geospatial_file(file):
     """Return the geospatial file format based on its extension (zip, kml, geojson)."""
@@ -72,6 +101,112 @@ def find_shapefile_path(temp_dir):
     raise FileNotFoundError("No shapefile (.shp) found in the directory.")
 
 
+class ChunkStream(io.RawIOBase):
+    """
+    Read-only binary stream over an iterable of byte chunks (e.g. UploadedFile.chunks()).
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0  # EOF
+            self._buffer = memoryview(chunk)
+
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def decode_as_cp1252(error):
+    """
+    Codec error handler decoding the bytes which are not valid UTF-8 as cp1252,
+    for files detected as UTF-8 that still contain a few cp1252 characters.
+    """
+    if not isinstance(error, UnicodeDecodeError):
+        raise error
+    invalid = error.object[error.start : error.end]
+    return invalid.decode("cp1252", errors="replace"), error.end
+
+
+codecs.register_error("cp1252_fallback", decode_as_cp1252)
+
+
+def detect_csv_encoding(sample: bytes):
+    """
+    Detect the encoding of a CSV file from its first bytes (UTF-8 with or without BOM, cp1252).
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    try:
+        # Incremental decoder so a character split at the end of the sample is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def iter_csv_rows(file, chunk_size=64 * 1024):
+    """
+    Read a CSV file (uploaded file object) row by row with constant memory,
+    skipping empty rows. The file is decoded incrementally from its chunks.
+
+    :param file: An uploaded file (with chunks()) or a binary file-like object
+    :param chunk_size: Size of the chunks read from the file
+    :return: Generator of (line number, row dictionary)
+    """
+    if hasattr(file, "chunks"):
+        chunks = iter(file.chunks(chunk_size))
+    else:
+        chunks = iter(lambda: file.read(chunk_size), b"")
+
+    first_chunk = next(chunks, b"")
+    encoding = detect_csv_encoding(first_chunk)
+
+    stream = io.TextIOWrapper(
+        io.BufferedReader(ChunkStream(itertools.chain([first_chunk], chunks))),
+        encoding=encoding,
+        # cp1252 has a few undefined bytes, do not fail the whole upload on them
+        errors="replace" if encoding == "cp1252" else "cp1252_fallback",
+        newline="",
+    )
+    reader = csv.DictReader(stream)
+
+    for row in reader:
+        # Filter out rows that are empty (i.e., where all values are empty or None)
+        if any(isinstance(value, str) and value.strip() for value in row.values()):
+            yield reader.line_num, row
+
+
+def read_geospatial_file(file_path, file_format):
+    """
+    Read a geospatial file (zip shapefile, kml, geojson) as a GeoDataFrame in EPSG:4326.
+
+    :return: Tuple of the GeoDataFrame and the temporary directory of an extracted zip (or None)
+    """
+    temp_dir = None
+    if file_format == "zip":
+        # Handle shapefile in zip format
+        temp_dir = extract_zip_to_temp(file_path)
+        file_path = find_shapefile_path(temp_dir)
+
+    gdf = gpd.read_file(file_path)
+
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+
+    return gdf, temp_dir
+
+
 def csv_to_dict(file):
     """
     This function reads a CSV file (file object), removes empty rows, and returns its contents as a list of dictionaries.
@@ -80,39 +215,111 @@ def csv_to_dict(file):
     :param file: A file-like object (such as an uploaded file)
     :return: List of dictionaries (with empty rows removed)
     """
-    file_content = file.read().decode("utf-8")  # Decode the byte content to a string
-    file_io = io.StringIO(file_content)
-    # Create a CSV DictReader object to read rows as dictionaries
-    reader = csv.DictReader(file_io)
+    return [row for _, row in iter_csv_rows(file)]
+
+
+def bulk_create_csv_rows(csv_rows, model, build_instance, batch_size=5000):
+    """
+    Build model instances from CSV rows and insert them with bulk_create in batches.
+    The bounding box is computed from the lat/lon columns of every inserted batch,
+    so the rows are read in a single pass with constant memory.
+
+    :param csv_rows: Iterable of (line number, row dictionary), see iter_csv_rows
+    :param model: Django model class of the instances
+    :param build_instance: Function building an instance with lat/lon from a row,
+        rows raising KeyError, TypeError or ValueError are skipped and reported, as
+        the rows with a text value the database would reject (too long or missing)
+    :param batch_size: Number of instances per INSERT
+    :return: Dictionary with the inserted count, the bbox and the per-row errors
+    """
+    count = 0
+    skipped = 0
+    errors = []
+    bounds = [np.inf, np.inf, -np.inf, -np.inf]  # min_lon, min_lat, max_lon, max_lat
+    batch = []
+
+    def flush():
+        lons = np.fromiter((instance.lon for instance in batch), dtype=float)
+        lats = np.fromiter((instance.lat for instance in batch), dtype=float)
+        bounds[0] = min(bounds[0], lons.min())
+        bounds[1] = min(bounds[1], lats.min())
+        bounds[2] = max(bounds[2], lons.max())
+        bounds[3] = max(bounds[3], lats.max())
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        batch.clear()
+
+    # Checked row by row, a value rejected by the database fails its whole batch
+    char_fields = [
+        field for field in model._meta.concrete_fields if isinstance(field, CharField)
+    ]
+
+    def check_char_fields(instance):
+        for field in char_fields:
+            value = getattr(instance, field.attname)
+            if value is None:
+                if not field.null:
+                    raise ValueError(f"'{field.name}' is required.")
+            elif len(str(value)) > field.max_length:
+                raise ValueError(
+                    f"'{field.name}' is longer than {field.max_length} characters."
+                )
+        return instance
+
+    for line_number, row in csv_rows:
+        try:
+            batch.append(check_char_fields(build_instance(row)))
+        except (KeyError, TypeError, ValueError) as e:
+            skipped += 1
+            # Keep the report small for files full of invalid rows
+            if len(errors) < MAX_CSV_ERRORS:
+                errors.append({"row": line_number, "error": str(e)})
+            continue
 
-    # Filter out rows that are empty (i.e., where all values are empty or None)
-    data = [row for row in reader if any(value.strip() for value in row.values())]
-    return data
+        count += 1
+        if len(batch) >= batch_size:
+            flush()
 
+    if batch:
+        flush()
 
-def calculate_bbox_from_csv_points(csv_data):
-    # Initialize variables to track min and max lat, lon
-    min_lat = float("inf")
-    max_lat = float("-inf")
-    min_lon = float("inf")
-    max_lon = float("-inf")
+    bbox = Polygon.from_bbox(tuple(float(b) for b in bounds)) if count else None
+    return {"count": count, "skipped": skipped, "errors": errors, "bbox": bbox}
 
-    # Loop through the CSV data
-    for row in csv_data:
-        lat = round(
-            float(row["lat"]), 6
-        )  # Assuming 'lat' is a string and needs to be converted to float
-        lon = round(float(row["lon"]), 6)  # Same for 'lon'
 
-        # Update the min/max lat, lon
-        min_lat = min(min_lat, lat)
-        max_lat = max(max_lat, lat)
-        min_lon = min(min_lon, lon)
-        max_lon = max(max_lon, lon)
+def parse_lat_lon(row):
+    """
+    Parse the lat and lon columns of a CSV row, rounded to 6 decimals.
+
+    Raise a ValueError when they are not finite or out of the EPSG:4326 range.
+    """
+    lat = float(row["lat"])
+    lon = float(row["lon"])
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        raise ValueError("'lat' and 'lon' must be finite numbers.")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(
+            "'lat' must be between -90 and 90, 'lon' between -180 and 180."
+        )
+    return round(lat, 6), round(lon, 6)
+
+
+def copy_rows(cursor, copy_sql, rows):
+    """
+    Stream rows into PostgreSQL with COPY ... FROM STDIN WITH (FORMAT csv).
+
+    :param cursor: Django cursor (psycopg2 or psycopg 3)
+    :param copy_sql: COPY statement reading csv from STDIN
+    :param rows: Iterable of row values, None is written as NULL
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
 
-    # Calculate the bounding box using the min/max lat, lon values
-    bbox = Polygon.from_bbox((min_lon, min_lat, max_lon, max_lat))
-    return bbox
+    if hasattr(cursor, "copy_expert"):  # psycopg2
+        cursor.copy_expert(copy_sql, buffer)
+    else:  # psycopg 3
+        with cursor.copy(copy_sql) as copy:
+            copy.write(buffer.getvalue())
 
 
 def parse_date(date_str):
@@ -194,54 +401,135 @@ def delete_geoserver_layer(layer_name):
         }
 
 
-def create_concave_hull(input_polygon, alpha=0.003, buffer=0):
+def get_hull_engine(request):
     """
-    Process concave hull from geojson polygon
+    Concave hull engine from the 'hull' query parameter, default to settings.CONCAVE_HULL_ENGINE
     """
-    geojson_polygon = input_polygon
+    engine = request.query_params.get("hull", settings.CONCAVE_HULL_ENGINE)
+    if engine not in CONCAVE_HULL_ENGINES:
+        raise ValueError(
+            f"Invalid hull '{engine}'. Supported hulls: {', '.join(CONCAVE_HULL_ENGINES)}"
+        )
+    return engine
 
-    # Convert GeoJSON to a Shapely geometry
-    polygon = shape(geojson_polygon)
-    gdf = gpd.GeoDataFrame(geometry=[polygon], crs="EPSG:4326")  # EPSG:4326 is lat/lon
 
-    # Step 2: Reproject to UTM 3857
-    gdf_utm = gdf.to_crs(epsg=3857)
+@lru_cache(maxsize=None)
+def get_transformer(from_epsg: int, to_epsg: int):
+    """
+    Return the cached pyproj Transformer between two EPSG codes (x/y = lon/lat order)
+    """
+    return Transformer.from_crs(from_epsg, to_epsg, always_xy=True)
+
+
+def transform_geometry(geometry, from_epsg: int, to_epsg: int):
+    """
+    Reproject a shapely geometry with every coordinate transformed in one call
+    """
+    transformer = get_transformer(from_epsg, to_epsg)
+    return shapely.transform(
+        geometry, lambda coords: np.column_stack(transformer.transform(*coords.T))
+    )
+
+
+def downsample_points(points, grid_size=CONCAVE_HULL_GRID_SIZE):
+    """
+    Keep the first point of every grid cell, points is an array of shape (n, 2)
+    """
+    _, first = np.unique(np.floor(points / grid_size), axis=0, return_index=True)
+    return points[np.sort(first)]
+
+
+def create_concave_hull(
+    input_polygon,
+    alpha=0.003,
+    buffer=0,
+    engine="alphashape",
+    ratio=CONCAVE_HULL_RATIO,
+    grid_size=CONCAVE_HULL_GRID_SIZE,
+):
+    """
+    Process concave hull from geojson polygon.
+
+    The polygon points are projected to EPSG:3857 and downsampled, then the hull is
+    the alpha shape of the points ("alphashape") or the GEOS concave hull with the
+    given edge length ratio ("shapely").
+    """
+    polygon = shape(input_polygon)
+    points = downsample_points(
+        shapely.get_coordinates(transform_geometry(polygon, 4326, 3857)), grid_size
+    )
 
-    polygon_utm = gdf_utm.geometry[0]
-    points = list(polygon_utm.exterior.coords)  # Extract points in UTM coordinates
-    for interior in polygon_utm.interiors:
-        points.extend(list(interior.coords))
+    if engine == "shapely":
+        concave_hull = shapely.concave_hull(shapely.multipoints(points), ratio=ratio)
+    else:
+        # Generate the alpha shape (concave hull)
+        concave_hull = alphashape.alphashape(points, alpha)
 
-    # Generate the alpha shape (concave hull)
-    concave_hull = alphashape.alphashape(points, alpha)
     buffered = concave_hull
     if buffer > 0:
         buffered = concave_hull.buffer(buffer)
 
-    # Step 5: Convert concave hull back to GeoDataFrame
-    concave_hull_gdf = gpd.GeoDataFrame(geometry=[buffered], crs=gdf_utm.crs)
+    # Convert the concave hull back to WGS84 GeoJSON
+    concave_hull_geojson = mapping(transform_geometry(buffered, 3857, 4326))
+    return json.dumps(concave_hull_geojson)
 
-    concave_hull_gdf_4326 = concave_hull_gdf.to_crs(epsg=4326)  # Convert back to WGS84
-    # Step 7: Convert the concave hull back to GeoJSON
-    concave_hull_geojson = mapping(concave_hull_gdf_4326.geometry[0])
 
-    return json.dumps(concave_hull_geojson)
+def concave_hull_sql(
+    geometry_sql: str,
+    buffer=0,
+    ratio=CONCAVE_HULL_RATIO,
+    grid_size=CONCAVE_HULL_GRID_SIZE,
+):
+    """
+    SQL expression of the concave hull GeoJSON of an EPSG:4326 geometry expression,
+    same steps as create_concave_hull with the "postgis" engine
+    """
+    return f"""
+        ST_AsGeoJSON(ST_Transform(ST_Buffer(ST_ConcaveHull(
+            ST_RemoveRepeatedPoints(ST_SnapToGrid(
+                ST_Points(ST_Transform({geometry_sql}, 3857)), {float(grid_size)}
+            )),
+            {float(ratio)}
+        ), {float(buffer)}), 4326))
+    """
+
 
+@lru_cache(maxsize=None)
+def get_geod(ellps: str = "WGS84"):
+    """
+    Return the cached pyproj Geod of an ellipsoid
+    """
+    return Geod(ellps=ellps)
 
-def geojson_line_length(geometry):
 
-    # Convert GeoJSON to a GeoSeries
-    gdf = gpd.GeoSeries(
-        [shape(geometry)], crs="EPSG:4326"
-    )  # GeoJSON is usually EPSG:4326
+def geojson_line_lengths(geometries: list):
+    """
+    Geodesic length (km) of many GeoJSON (Multi)LineString geometries.
 
-    # Reproject to a suitable projected CRS for length calculation (e.g., UTM)
-    gdf_projected = gdf.to_crs("EPSG:3857")  # Adjust the UTM zone as needed
+    Every segment of every line is measured with one Geod.inv call.
+    """
+    if len(geometries) == 0:
+        return np.empty(0)
+
+    geoms = shapely.from_geojson([json.dumps(geometry) for geometry in geometries])
+    parts, part_geom = shapely.get_parts(geoms, return_index=True)
+    coords, coord_part = shapely.get_coordinates(parts, return_index=True)
+
+    # Segments between two consecutive coordinates of the same part
+    segment = coord_part[1:] == coord_part[:-1]
+    _, _, distances = get_geod().inv(
+        coords[:-1, 0][segment],
+        coords[:-1, 1][segment],
+        coords[1:, 0][segment],
+        coords[1:, 1][segment],
+    )
 
-    # Calculate length in meters
-    length_meters = gdf_projected.length[0]
-    length_km = round(length_meters / 1000, 3)
-    return length_km
+    length_meters = np.bincount(
+        part_geom[coord_part[1:][segment]],
+        weights=distances,
+        minlength=len(geometries),
+    )
+    return np.round(length_meters / 1000, 3)
 
 
 def add_unique_items(target_list: list, new_items: list):
@@ -258,27 +546,134 @@ def add_unique_items(target_list: list, new_items: list):
             target_list.append(item)
 
 
-def calculate_distance(start_lat, start_lon, end_lat, end_lon):
+def geodesic_distance(start_lat, start_lon, end_lats, end_lons):
     """
-    Calculate the distance between two points using GeoPandas.
+    Geodesic distance (meters) on the WGS84 ellipsoid from one point to many points.
 
     Parameters:
         start_lat, start_lon: Latitude and longitude of the first point in decimal degrees.
-        end_lat, end_lon: Latitude and longitude of the second point in decimal degrees.
+        end_lats, end_lons: Arrays of latitude and longitude of the other points.
 
     Returns:
-        Distance in meters.
+        Array of distances in meters.
+    """
+    end_lats = np.asarray(end_lats, dtype=np.float64)
+    end_lons = np.asarray(end_lons, dtype=np.float64)
+    _, _, distances = get_geod().inv(
+        np.full(end_lons.shape, float(start_lon)),
+        np.full(end_lats.shape, float(start_lat)),
+        end_lons,
+        end_lats,
+    )
+    return distances
+
+
+def iter_feature_collection(metadata: dict, rows):
+    """
+    Yield a GeoJSON FeatureCollection piece by piece, the metadata is written once
+    before the features.
+
+    Rows are (id, properties JSON text, geometry GeoJSON text) tuples.
+    """
+    buffer = [
+        '{"type": "FeatureCollection", "metadata": ',
+        json.dumps(metadata, cls=DjangoJSONEncoder),
+        ', "features": [',
+    ]
+    size = 0
+    separator = ""
+    for feature_id, properties, geometry in rows:
+        feature = (
+            f'{separator}{{"type": "Feature", "id": {feature_id}, '
+            f'"properties": {properties or "{}"}, "geometry": {geometry or "null"}}}'
+        )
+        buffer.append(feature)
+        size += len(feature)
+        separator = ", "
+        if size >= STREAM_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+
+    buffer.append("]}")
+    yield "".join(buffer)
+
+
+def stream_feature_collection(metadata: dict, queryset, geometry_field, properties):
+    """
+    Stream a queryset as a GeoJSON FeatureCollection.
+
+    PostGIS writes the geometry (ST_AsGeoJSON) and the properties (properties is
+    a JSON expression, e.g. a JSONField or JSONObject) as text, rows are read with
+    a server-side cursor so memory stays flat whatever the size of the layer.
+    """
+    rows = (
+        queryset.annotate(
+            feature_properties=Cast(properties, output_field=TextField()),
+            feature_geometry=AsGeoJSON(geometry_field),
+        )
+        .values_list("id", "feature_properties", "feature_geometry")
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    return StreamingHttpResponse(
+        iter_feature_collection(metadata, rows), content_type="application/geo+json"
+    )
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination ordered by id, a page is read from the primary key
+    index whatever its position. Only used when the request has the 'cursor' or
+    'page_size' query parameter, the full list is returned otherwise.
     """
-    # Create points for the two locations
-    point1 = Point(start_lon, start_lat)
-    point2 = Point(end_lon, end_lat)
 
-    # Create a GeoDataFrame
-    gdf = gpd.GeoDataFrame(geometry=[point1, point2], crs="EPSG:4326")
+    ordering = "id"
+    page_size = 1000
+    page_size_query_param = "page_size"
+    max_page_size = 10000
 
-    # Convert the GeoDataFrame to a projected CRS (e.g., UTM for accurate distance in meters)
-    gdf = gdf.to_crs(epsg=3857)  # Web Mercator (meters)
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            "cursor" not in request.query_params
+            and "page_size" not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+def filter_by_area(queryset, geometry_field: str, request):
+    """
+    Filter a queryset with the 'bbox' (min_lon,min_lat,max_lon,max_lat) and 'within'
+    (GeoJSON or WKT geometry) query parameters, both in EPSG:4326.
+
+    Both filters are answered with the GiST index of the geometry field.
+    """
+    bbox = request.query_params.get("bbox")
+    within = request.query_params.get("within")
+
+    if bbox:
+        try:
+            min_lon, min_lat, max_lon, max_lat = [
+                float(value) for value in bbox.split(",")
+            ]
+        except ValueError:
+            raise ValueError("'bbox' must be min_lon,min_lat,max_lon,max_lat.")
+        if not all(
+            math.isfinite(value) for value in (min_lon, min_lat, max_lon, max_lat)
+        ):
+            raise ValueError("'bbox' values must be finite numbers.")
+        if min_lon > max_lon or min_lat > max_lat:
+            raise ValueError("'bbox' must be min_lon,min_lat,max_lon,max_lat.")
+
+        bbox_polygon = Polygon.from_bbox((min_lon, min_lat, max_lon, max_lat))
+        bbox_polygon.srid = 4326
+        queryset = queryset.filter(**{f"{geometry_field}__intersects": bbox_polygon})
+
+    if within:
+        try:
+            within_geometry = GEOSGeometry(within, srid=4326)
+        except (ValueError, GEOSException, GDALException):
+            raise ValueError("'within' must be a GeoJSON or WKT geometry.")
+        queryset = queryset.filter(**{f"{geometry_field}__within": within_geometry})
 
-    # Calculate distance in meters
-    distance = gdf.geometry[0].distance(gdf.geometry[1])
-    return distance
+    return queryset
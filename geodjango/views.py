@@ -0,0 +1,36 @@
+import os
+from django.conf import settings
+from django.db import connection
+from rest_framework import generics, status
+from rest_framework.response import Response
+from .backends.postgis.base import connect_stats
+
+
+class DatabaseStats(generics.RetrieveAPIView):
+    """
+    API view to get the database connection settings and statistics of the
+    worker process answering the request
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            database = settings.DATABASES[connection.alias]
+            pool = getattr(connection, "pool", None)
+
+            return Response(
+                {
+                    "pid": os.getpid(),
+                    "conn_max_age": database.get("CONN_MAX_AGE"),
+                    "conn_health_checks": database.get("CONN_HEALTH_CHECKS"),
+                    # Connections opened, or taken from the pool, and their wait time
+                    "connections": connect_stats(connection.alias),
+                    # psycopg pool counters (size, waiting requests, wait time...)
+                    "pool": pool.get_stats() if pool is not None else None,
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
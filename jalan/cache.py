@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from geodjango.utils import CONCAVE_HULL_GRID_SIZE, CONCAVE_HULL_RATIO
+from .models import JalanMetadata
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache capped by the size (bytes) of its values
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()  # key -> (value, size)
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            self.items.move_to_end(key)
+            return item[0]
+
+    def set(self, key: str, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.items[key] = (value, size)
+            self.size += size
+
+            # Evict the least recently used values until the cache fits again
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.items.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+isochrone_cache = LRUCache(settings.ISOCHRONE_CACHE_MAX_BYTES)
+
+
+def isochrone_cache_key(
+    kind: str,
+    metadata: JalanMetadata,
+    start_vid: int,
+    time,
+    hull_engine: str,
+    list_sekolah_metadata: list = (),
+):
+    """
+    Cache key of an isochrone result.
+
+    The key holds the updated_at of the jalan metadata (saved again when its topology
+    is generated) and of every sekolah layer (saved again when a sekolah changes),
+    so outdated results are never read again and are evicted by the LRU.
+    """
+    versions = [f"{metadata.road_table}@{metadata.updated_at.isoformat()}"]
+    versions.extend(
+        f"{sekolah_metadata.id}@{sekolah_metadata.updated_at.isoformat()}"
+        for sekolah_metadata in list_sekolah_metadata
+    )
+    hull = f"{hull_engine}:{CONCAVE_HULL_GRID_SIZE}:{CONCAVE_HULL_RATIO}"
+    raw_key = f"{kind}|{'|'.join(versions)}|{start_vid}|{float(time)}|{hull}"
+    return f"isochrone:{hashlib.sha1(raw_key.encode()).hexdigest()}"
+
+
+def get_cached_isochrone(key: str):
+    """
+    Return a cached isochrone result from the process cache, then from the shared cache
+    """
+    value = isochrone_cache.get(key)
+    if value is None and settings.ISOCHRONE_CACHE_SHARED:
+        value = caches["isochrone"].get(key)
+        if value is not None:
+            isochrone_cache.set(key, value, len(json.dumps(value)))
+    return value
+
+
+def set_cached_isochrone(key: str, value):
+    """
+    Save an isochrone result (JSON serializable) in the process and shared cache
+    """
+    isochrone_cache.set(key, value, len(json.dumps(value)))
+    if settings.ISOCHRONE_CACHE_SHARED:
+        caches["isochrone"].set(key, value)
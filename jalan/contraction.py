@@ -0,0 +1,409 @@
+import glob
+import heapq
+import os
+import numpy as np
+from django.conf import settings
+from .models import JalanMetadata
+from .profiles import DEFAULT_PROFILE, SPEED_PROFILES
+from .routing import RoadGraph, get_cached, get_road_graph
+
+# Nodes settled by a witness search before giving up, a missed witness only
+# adds an unneeded shortcut, the hierarchy stays exact
+WITNESS_SETTLE_LIMIT = 64
+
+CONTRACTION_ARRAYS = (
+    "fingerprint",
+    "rank",
+    "up_indptr",
+    "up_indices",
+    "up_weights",
+    "down_indptr",
+    "down_indices",
+    "down_weights",
+    "shortcut_keys",
+    "shortcut_middles",
+)
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy of a RoadGraph, answering point to point queries with a
+    bidirectional search that only goes up the node ranks.
+
+    Nodes are contracted from the least important one, a shortcut u -> x replaces
+    the path u -> v -> x when no shorter witness path avoids v. The upward arcs
+    (u -> x with rank[x] > rank[u]) are searched from the start, the downward arcs
+    backward from the end. Both are CSR arrays over the RoadGraph node indices,
+    every shortcut keeps its middle node so a path can be unpacked to road edges.
+    """
+
+    def __init__(
+        self,
+        fingerprint,
+        rank,
+        up_indptr,
+        up_indices,
+        up_weights,
+        down_indptr,
+        down_indices,
+        down_weights,
+        shortcut_keys,
+        shortcut_middles,
+    ):
+        self.fingerprint = str(fingerprint)
+        self.rank = rank
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.up_weights = up_weights
+        self.down_indptr = down_indptr
+        self.down_indices = down_indices
+        self.down_weights = down_weights
+        self.shortcut_keys = shortcut_keys
+        self.shortcut_middles = shortcut_middles
+        self.version = None
+
+        # The searches walk a few hundred nodes, plain lists are faster than numpy there
+        self._up = (up_indptr.tolist(), up_indices.tolist(), up_weights.tolist())
+        self._down = (
+            down_indptr.tolist(),
+            down_indices.tolist(),
+            down_weights.tolist(),
+        )
+        self._middles = dict(zip(shortcut_keys.tolist(), shortcut_middles.tolist()))
+
+    @property
+    def node_count(self):
+        return len(self.rank)
+
+    @property
+    def shortcut_count(self):
+        return len(self.shortcut_keys)
+
+    @classmethod
+    def build(cls, graph: RoadGraph, progress=None):
+        """
+        Contract every node of a road graph, ordered by edge difference (shortcuts
+        added minus arcs removed) plus the number of contracted neighbours, with
+        lazy updates of the priority queue
+        """
+        n_nodes = len(graph.node_ids)
+        matrix = graph.matrix
+        indptr = matrix.indptr.tolist()
+        indices = matrix.indices.tolist()
+        weights = matrix.data.tolist()
+
+        out_arcs = [{} for _ in range(n_nodes)]
+        in_arcs = [{} for _ in range(n_nodes)]
+        for u in range(n_nodes):
+            for pos in range(indptr[u], indptr[u + 1]):
+                x = indices[pos]
+                if x != u:
+                    out_arcs[u][x] = weights[pos]
+                    in_arcs[x][u] = weights[pos]
+
+        inf = float("inf")
+        middles = {}
+        contracted_neighbours = [0] * n_nodes
+
+        def witness_costs(u, skipped, targets, max_cost):
+            """
+            Limited Dijkstra from u in the remaining graph without the skipped node,
+            stopped once every target is settled
+            """
+            costs = {u: 0.0}
+            queue = [(0.0, u)]
+            remaining = len(targets)
+            settled = 0
+            while queue and settled < WITNESS_SETTLE_LIMIT:
+                cost, node = heapq.heappop(queue)
+                if cost > costs[node]:
+                    continue
+                if cost > max_cost:
+                    break
+                if node in targets:
+                    remaining -= 1
+                    if remaining == 0:
+                        break
+                settled += 1
+                for x, weight in out_arcs[node].items():
+                    new_cost = cost + weight
+                    if x != skipped and new_cost < costs.get(x, inf):
+                        costs[x] = new_cost
+                        heapq.heappush(queue, (new_cost, x))
+            return costs
+
+        def shortcuts(v):
+            """
+            Shortcuts needed to contract v, as (u, x, weight)
+            """
+            needed = []
+            for u, in_weight in in_arcs[v].items():
+                targets = {
+                    x: in_weight + out_weight
+                    for x, out_weight in out_arcs[v].items()
+                    if x != u
+                }
+                if not targets:
+                    continue
+                costs = witness_costs(u, v, targets, max(targets.values()))
+                needed.extend(
+                    (u, x, weight)
+                    for x, weight in targets.items()
+                    if costs.get(x, inf) > weight
+                )
+            return needed
+
+        def priority(v, needed):
+            removed = len(in_arcs[v]) + len(out_arcs[v])
+            return len(needed) - removed + contracted_neighbours[v]
+
+        queue = [(priority(v, shortcuts(v)), v) for v in range(n_nodes)]
+        heapq.heapify(queue)
+
+        rank = np.zeros(n_nodes, dtype=np.int64)
+        up_arcs = [None] * n_nodes
+        down_arcs = [None] * n_nodes
+        contracted = 0
+        step = max(n_nodes // 100, 1)
+
+        while queue:
+            _, v = heapq.heappop(queue)
+            needed = shortcuts(v)
+            # Priorities only grow stale, check v is still the least important node
+            new_priority = priority(v, needed)
+            if queue and new_priority > queue[0][0]:
+                heapq.heappush(queue, (new_priority, v))
+                continue
+
+            for u, x, weight in needed:
+                if weight < out_arcs[u].get(x, inf):
+                    out_arcs[u][x] = weight
+                    in_arcs[x][u] = weight
+                    middles[(u, x)] = v
+
+            # The remaining arcs of v all lead to more important nodes
+            up_arcs[v] = out_arcs[v]
+            down_arcs[v] = in_arcs[v]
+            for x in out_arcs[v]:
+                del in_arcs[x][v]
+                contracted_neighbours[x] += 1
+            for u in in_arcs[v]:
+                del out_arcs[u][v]
+                contracted_neighbours[u] += 1
+            out_arcs[v] = {}
+            in_arcs[v] = {}
+
+            rank[v] = contracted
+            contracted += 1
+            if progress is not None and contracted % step == 0:
+                progress(contracted)
+
+        def to_csr(arcs):
+            counts = [len(node_arcs) for node_arcs in arcs]
+            csr_indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            csr_indices = np.fromiter(
+                (x for node_arcs in arcs for x in node_arcs),
+                dtype=np.int64,
+                count=csr_indptr[-1],
+            )
+            csr_weights = np.fromiter(
+                (weight for node_arcs in arcs for weight in node_arcs.values()),
+                dtype=np.float64,
+                count=csr_indptr[-1],
+            )
+            return csr_indptr, csr_indices, csr_weights
+
+        up_indptr, up_indices, up_weights = to_csr(up_arcs)
+        down_indptr, down_indices, down_weights = to_csr(down_arcs)
+
+        shortcut_keys = np.array(
+            [u * n_nodes + x for u, x in middles], dtype=np.int64
+        ).reshape(-1)
+        shortcut_middles = np.array(list(middles.values()), dtype=np.int64).reshape(-1)
+
+        return cls(
+            fingerprint=graph.fingerprint,
+            rank=rank,
+            up_indptr=up_indptr,
+            up_indices=up_indices,
+            up_weights=up_weights,
+            down_indptr=down_indptr,
+            down_indices=down_indices,
+            down_weights=down_weights,
+            shortcut_keys=shortcut_keys,
+            shortcut_middles=shortcut_middles,
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as arrays:
+            return cls(**{name: arrays[name] for name in CONTRACTION_ARRAYS})
+
+    def save(self, path: str):
+        """
+        Save the arrays in a single npz file, replaced at once when it already exists
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temp_path,
+            fingerprint=np.array(self.fingerprint),
+            **{name: getattr(self, name) for name in CONTRACTION_ARRAYS[1:]},
+        )
+        os.replace(temp_path, path)
+
+    def search(self, start: int, end: int):
+        """
+        Bidirectional search between two node indices, the upward search from the
+        start and the backward search from the end meet at the most important node
+        of the shortest path.
+
+        Returns the cost and the node indices of the path, or None when unreachable.
+        """
+        if start == end:
+            return 0.0, [start]
+
+        costs = ({start: 0.0}, {end: 0.0})
+        parents = ({start: -1}, {end: -1})
+        queues = ([(0.0, start)], [(0.0, end)])
+        arcs = (self._up, self._down)
+        best_cost = np.inf
+        meeting = -1
+
+        while queues[0] or queues[1]:
+            # Expand the side with the smallest tentative cost
+            if not queues[1] or (queues[0] and queues[0][0][0] <= queues[1][0][0]):
+                side = 0
+            else:
+                side = 1
+            cost, node = heapq.heappop(queues[side])
+            if cost > costs[side][node]:
+                continue
+            if cost >= best_cost:
+                # Nothing left on this side can improve the path
+                queues[side].clear()
+                continue
+
+            other_cost = costs[1 - side].get(node)
+            if other_cost is not None and cost + other_cost < best_cost:
+                best_cost = cost + other_cost
+                meeting = node
+
+            indptr, indices, weights = arcs[side]
+            side_costs = costs[side]
+            for pos in range(indptr[node], indptr[node + 1]):
+                x = indices[pos]
+                new_cost = cost + weights[pos]
+                if new_cost < side_costs.get(x, np.inf):
+                    side_costs[x] = new_cost
+                    parents[side][x] = node
+                    heapq.heappush(queues[side], (new_cost, x))
+
+        if meeting < 0:
+            return None
+
+        forward = [meeting]
+        while parents[0][forward[-1]] >= 0:
+            forward.append(parents[0][forward[-1]])
+        forward.reverse()
+
+        backward = []
+        node = meeting
+        while parents[1][node] >= 0:
+            node = parents[1][node]
+            backward.append(node)
+
+        return best_cost, self.unpack(forward + backward)
+
+    def unpack(self, path: list):
+        """
+        Replace every shortcut of a node path by the nodes it skipped
+        """
+        n_nodes = self.node_count
+        nodes = [path[0]]
+        for u, x in zip(path[:-1], path[1:]):
+            stack = [(u, x)]
+            while stack:
+                a, b = stack.pop()
+                middle = self._middles.get(a * n_nodes + b)
+                if middle is None:
+                    nodes.append(b)
+                else:
+                    stack.append((middle, b))
+                    stack.append((a, middle))
+        return nodes
+
+    def shortest_path(self, graph: RoadGraph, start_vid: int, end_vid: int):
+        """
+        Same as RoadGraph.shortest_path with directed=True.
+
+        Returns the ordered edge ids and the aggregate cost, or None when unreachable.
+        """
+        result = self.search(graph.node_index(start_vid), graph.node_index(end_vid))
+        if result is None:
+            return None
+
+        cost, path = result
+        edge_ids = graph.arc_edge_ids(path[:-1], path[1:], directed=True)
+        return edge_ids.tolist(), float(cost)
+
+    def shortest_paths(self, graph: RoadGraph, start_vid: int, end_vids):
+        """
+        Same as RoadGraph.shortest_paths with directed=True, one bidirectional
+        search per end vertex.
+
+        Returns a dictionary end vertex id -> (ordered edge ids, aggregate cost)
+        for every reachable end vertex other than the start vertex.
+        """
+        start = graph.node_index(start_vid)
+        paths = {}
+        for end_vid, end in zip(end_vids, graph.node_indices(end_vids)):
+            if end < 0 or end == start:
+                continue
+            result = self.search(start, int(end))
+            if result is None:
+                continue
+            cost, path = result
+            edge_ids = graph.arc_edge_ids(path[:-1], path[1:], directed=True)
+            paths[int(end_vid)] = (edge_ids.tolist(), float(cost))
+        return paths
+
+
+def contraction_path(metadata_id, profile: str = DEFAULT_PROFILE):
+    return os.path.join(settings.CONTRACTION_DIR, f"{metadata_id}-{profile}.npz")
+
+
+def remove_contractions(metadata_id):
+    """
+    Remove the contraction hierarchies of a JalanMetadata, for every speed profile
+    """
+    for profile in SPEED_PROFILES:
+        path = contraction_path(metadata_id, profile)
+        for file_path in [path, *glob.glob(f"{glob.escape(path)}.*.tmp.npz")]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+def get_contraction(metadata: JalanMetadata, profile: str = DEFAULT_PROFILE):
+    """
+    Return the cached contraction hierarchy of a JalanMetadata for a speed profile.
+
+    Raise a ValueError when it was not built or was built from another topology.
+    """
+
+    def load():
+        path = contraction_path(metadata.id, profile)
+        if not os.path.exists(path):
+            raise ValueError(
+                f"Contraction hierarchy of {metadata.name} ({profile}) is not built, "
+                "generate the topology with 'contract' first."
+            )
+        hierarchy = ContractionHierarchy.load(path)
+        if hierarchy.fingerprint != get_road_graph(metadata, profile).fingerprint:
+            raise ValueError(
+                f"Contraction hierarchy of {metadata.name} ({profile}) is outdated, "
+                "generate the topology with 'contract' again."
+            )
+        return hierarchy
+
+    return get_cached(metadata, f"contraction:{profile}", load)
@@ -0,0 +1,366 @@
+import shutil
+from time import perf_counter
+import shapely
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+from geodjango.utils import (
+    read_geospatial_file,
+    create_geoserver_layer,
+    copy_rows,
+)
+from job.queue import enqueue_job, register_job
+from .contraction import ContractionHierarchy, contraction_path
+from .models import JalanMetadata
+from .profiles import SPEED_PROFILES, add_profile_columns_sql, update_costs_sql
+from .routing import RoadGraph, invalidate_road_graph
+
+# Number of road rows sent per COPY
+COPY_CHUNK_SIZE = 10000
+
+
+@register_job("jalan_ingest")
+def ingest_jalan(context, metadata_id, file_path, file_format):
+    """
+    Load an uploaded road file into the road table of its metadata.
+    Supported formats: GeoJSON, KML, or Shapefile (in zip format).
+    """
+    metadata = JalanMetadata.objects.get(id=metadata_id)
+    temp_dir = None
+
+    try:
+        gdf, temp_dir = read_geospatial_file(file_path, file_format)
+
+        total_bbox = gdf.total_bounds
+        metadata.bbox = Polygon.from_bbox(total_bbox)
+        metadata.save()
+
+        table_name = metadata.road_table
+        duplicate_tb_jalan_structure(table_name)
+        iterate_and_save(context, gdf, table_name, metadata)
+
+        geo_layer = create_geoserver_layer(table_name, table_name)
+        if geo_layer["success"]:
+            metadata.geoserver_status = "DEPLOYED"
+        else:
+            metadata.geoserver_status = "FAILED"
+        metadata.save()
+
+        return {"data_count": metadata.data_count, "ingest_rate": metadata.ingest_rate}
+
+    except Exception:
+        metadata.data_status = "FAILED"
+        metadata.save()
+        raise
+
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def iterate_and_save(context, gdf, table_name, metadata: JalanMetadata):
+    """
+    Stream road in new created table with COPY, chunk by chunk
+    """
+    metadata.data_status = "DEPLOYING"
+    metadata.save()
+
+    geometry_name = gdf.geometry.name
+
+    # Keep only lines and break every MultiLineString into LineStrings
+    gdf = gdf[gdf.geom_type.isin(["LineString", "MultiLineString"])]
+    gdf = gdf.explode(index_parts=False, ignore_index=True)
+
+    # Rows saved by an interrupted run of this job are kept, continue after them
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {table_name}")
+        resumed_rows = cursor.fetchone()[0]
+
+    copy_sql = f"""
+        COPY {table_name} (mline, properties, file_metadata_id)
+        FROM STDIN WITH (FORMAT csv)
+    """
+    started_at = perf_counter()
+    total_rows = resumed_rows
+
+    for start in range(resumed_rows, len(gdf), COPY_CHUNK_SIZE):
+        chunk = gdf.iloc[start : start + COPY_CHUNK_SIZE]
+
+        # Force 2D and encode as EWKB in one go for the whole chunk
+        geoms = shapely.set_srid(
+            shapely.force_2d(chunk.geometry.values.to_numpy()), 4326
+        )
+        list_wkb = shapely.to_wkb(geoms, hex=True, include_srid=True)
+
+        # pandas handles NaN and Timestamp values when serializing to JSON
+        list_properties = (
+            chunk.drop(columns=geometry_name)
+            .to_json(
+                orient="records",
+                lines=True,
+                date_format="iso",
+                default_handler=str,
+            )
+            .splitlines()
+        )
+
+        with connection.cursor() as cursor:
+            copy_rows(
+                cursor,
+                copy_sql,
+                (
+                    (wkb, properties, metadata.id)
+                    for wkb, properties in zip(list_wkb, list_properties)
+                ),
+            )
+
+        total_rows += len(chunk)
+        elapsed = perf_counter() - started_at
+        metadata.data_count = total_rows
+        metadata.ingest_rate = (
+            round((total_rows - resumed_rows) / elapsed, 1) if elapsed else None
+        )
+        metadata.save()
+        context.progress(100 * total_rows / len(gdf), f"{total_rows} rows saved")
+
+    metadata.data_count = total_rows
+    metadata.data_status = "DEPLOYED"
+    metadata.save()
+
+
+def duplicate_tb_jalan_structure(table_name):
+    with connection.cursor() as cursor:
+        # Copy the structure of tb_jalan without data, kept when the job runs again
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table_name} (LIKE tb_jalan INCLUDING ALL);
+        """
+        )
+        # Create indexes on the new table
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_source_{table_name} ON {table_name}(source);
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_target_{table_name} ON {table_name}(target);
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_cost_{table_name} ON {table_name}(cost);
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_reverse_cost_{table_name} ON {table_name}(reverse_cost);
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_mline_{table_name} ON {table_name} USING GIST(mline);
+            """
+        )
+
+    add_dirty_tracking(table_name)
+
+
+def add_dirty_tracking(table_name):
+    """
+    Track the roads to process again in the next incremental topology.
+
+    New rows are dirty, an edited geometry also loses its source and target
+    so pgr_createTopology connects it again, edited properties only need new costs.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            ALTER TABLE {table_name}
+            ADD COLUMN IF NOT EXISTS dirty boolean NOT NULL DEFAULT true;
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_dirty_{table_name} ON {table_name}(id) WHERE dirty;
+            """
+        )
+        cursor.execute(
+            """
+            CREATE OR REPLACE FUNCTION jalan_mark_dirty() RETURNS trigger AS $$
+            BEGIN
+                NEW.dirty := true;
+                IF NEW.mline IS DISTINCT FROM OLD.mline THEN
+                    NEW.source := NULL;
+                    NEW.target := NULL;
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            """
+        )
+        cursor.execute(
+            f"""
+            DROP TRIGGER IF EXISTS trg_dirty_{table_name} ON {table_name};
+            CREATE TRIGGER trg_dirty_{table_name}
+                BEFORE UPDATE OF mline, properties ON {table_name}
+                FOR EACH ROW
+                WHEN (
+                    OLD.mline IS DISTINCT FROM NEW.mline
+                    OR OLD.properties IS DISTINCT FROM NEW.properties
+                )
+                EXECUTE FUNCTION jalan_mark_dirty();
+            """
+        )
+
+
+@register_job("jalan_topology")
+def generate_topology(context, metadata_id, mode="full", contract=None):
+    """
+    Generate the pgRouting topology and the cost of every speed profile of a road table,
+    then queue the contraction hierarchy of the profiles listed in contract
+    """
+    metadata = JalanMetadata.objects.get(id=metadata_id)
+    metadata.topology_status = "CREATING"
+    metadata.save()
+
+    try:
+        road_table = metadata.road_table
+        add_dirty_tracking(road_table)
+        if mode == "incremental":
+            result = update_topology(context, road_table)
+        else:
+            result = create_topology(context, road_table)
+
+        # Vertex ids and costs changed, drop the road graph loaded before
+        invalidate_road_graph(metadata.id)
+
+        metadata.topology_status = "CREATED"
+        metadata.profiles = list(SPEED_PROFILES)
+        metadata.save()
+
+        if contract:
+            job = enqueue_job(
+                "jalan_contraction",
+                {"metadata_id": str(metadata.id), "profiles": contract},
+            )
+            result["contraction_job_id"] = str(job.id)
+        return result
+
+    except Exception:
+        invalidate_road_graph(metadata.id)
+        metadata.topology_status = "FAILED"
+        metadata.save()
+        raise
+
+
+@register_job("jalan_contraction")
+def generate_contraction(context, metadata_id, profiles):
+    """
+    Build the contraction hierarchy of a road table for every given speed profile
+    """
+    metadata = JalanMetadata.objects.get(id=metadata_id)
+    result = {"layer": metadata.road_table, "profiles": {}}
+
+    for position, profile in enumerate(profiles):
+        started = perf_counter()
+        # Loaded again, the graph cached by this worker may predate the topology
+        graph = RoadGraph.from_table(metadata.road_table, profile)
+        n_nodes = len(graph.node_ids)
+
+        def progress(contracted):
+            done = (position + contracted / n_nodes) / len(profiles)
+            context.progress(
+                round(done * 100), f"{profile}: {contracted}/{n_nodes} nodes contracted"
+            )
+
+        hierarchy = ContractionHierarchy.build(graph, progress)
+        hierarchy.save(contraction_path(metadata.id, profile))
+        result["profiles"][profile] = {
+            "nodes": n_nodes,
+            "arcs": graph.matrix.nnz,
+            "shortcuts": hierarchy.shortcut_count,
+            "seconds": round(perf_counter() - started, 1),
+        }
+
+    return result
+
+
+def create_topology(context, road_table):
+    """
+    Build the topology and the costs of every road again
+    """
+    # Create topology 0.0001 deg = 11.1 m, the vertices table is created again
+    create_topology_query = f"""
+        SELECT pgr_createTopology('{road_table}', 0.00005, 'mline', 'id', clean := true);
+    """
+
+    # Check if source, target, and cost columns are populated
+    check_query = f"""
+        SELECT id, source, target, cost, reverse_cost
+        FROM {road_table}
+        WHERE source IS NOT NULL AND target IS NOT NULL AND cost > 0
+        ORDER BY RANDOM()
+        LIMIT 10;
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(create_topology_query)
+        context.progress(80, "Topology created")
+        # Cost columns of every speed profile, filled in a single UPDATE
+        cursor.execute(add_profile_columns_sql(road_table))
+        cursor.execute(update_costs_sql(road_table))
+        cursor.execute(f"UPDATE {road_table} SET dirty = false WHERE dirty;")
+
+        # Check random rows for validity
+        cursor.execute(check_query)
+        results = cursor.fetchall()
+
+    if len(results) != 10:
+        raise ValueError(
+            f"Failed to create topology, the results validity length only {len(results)}"
+        )
+    return {"layer": road_table, "mode": "full"}
+
+
+def update_topology(context, road_table):
+    """
+    Connect and cost only the dirty roads, reusing the existing vertices table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {road_table} WHERE dirty;")
+        dirty_rows = cursor.fetchone()[0]
+
+        # Roads without source or target are connected to the existing vertices
+        cursor.execute(
+            f"""
+            SELECT pgr_createTopology(
+                '{road_table}', 0.00005, 'mline', 'id',
+                rows_where := 'source IS NULL OR target IS NULL',
+                clean := false
+            );
+        """
+        )
+        if cursor.fetchone()[0] != "OK":
+            raise ValueError(f"Failed to update the topology of {road_table}")
+        context.progress(60, f"Topology of {dirty_rows} roads updated")
+
+        # Vertices left by edited or deleted roads would attract the snapping
+        cursor.execute(
+            f"""
+            DELETE FROM {road_table}_vertices_pgr AS v
+            WHERE NOT EXISTS (SELECT 1 FROM {road_table} WHERE source = v.id)
+                AND NOT EXISTS (SELECT 1 FROM {road_table} WHERE target = v.id);
+        """
+        )
+        removed_vertices = cursor.rowcount
+
+        cursor.execute(add_profile_columns_sql(road_table))
+        cursor.execute(update_costs_sql(road_table, rows_where="dirty"))
+        cursor.execute(f"UPDATE {road_table} SET dirty = false WHERE dirty;")
+
+    return {
+        "layer": road_table,
+        "mode": "incremental",
+        "updated_rows": dirty_rows,
+        "removed_vertices": removed_vertices,
+    }
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jalan", "0009_jalan_reverse_cost"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jalanmetadata",
+            name="data_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="jalanmetadata",
+            name="ingest_rate",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jalan", "0010_jalanmetadata_data_count_jalanmetadata_ingest_rate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jalanmetadata",
+            name="profiles",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
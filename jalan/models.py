@@ -19,6 +19,10 @@ class JalanMetadata(models.Model):
     topology_status = models.CharField(
         max_length=50, null=True, blank=True
     )  # CREATING | CREATED | FAILED
+    data_count = models.IntegerField(null=True, blank=True)  # ingested rows
+    ingest_rate = models.FloatField(null=True, blank=True)  # ingested rows/sec
+    # Speed profiles with computed cost columns, see jalan.profiles
+    profiles = models.JSONField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,250 @@
+from django.conf import settings
+from .models import JalanMetadata
+
+# Profile of the cost and reverse_cost columns, the only one before profiles existed
+DEFAULT_PROFILE = "walking"
+
+# Speed (km/h) of every profile per OSM fclass, None when the road class is closed
+# to the profile. Profiles with "maxspeed" use the maxspeed tag when it is known
+# (capped to "max_speed"), profiles with "oneway" follow the oneway tag.
+SPEED_PROFILES = {
+    "walking": {
+        "default_speed": 4,  # 15 minutes/km
+        "classes": {
+            "motorway": None,
+            "motorway_link": None,
+        },
+        "maxspeed": False,
+        "oneway": False,
+    },
+    "bicycle": {
+        "default_speed": 15,
+        "classes": {
+            "motorway": None,
+            "motorway_link": None,
+            "trunk": 18,
+            "cycleway": 18,
+            "track": 10,
+            "path": 10,
+            "bridleway": 8,
+            "footway": 5,
+            "pedestrian": 5,
+            "steps": 2,
+        },
+        "maxspeed": False,
+        "oneway": True,
+    },
+    "motorbike": {
+        "default_speed": 25,
+        "classes": {
+            # Motorbikes are not allowed on toll roads
+            "motorway": None,
+            "motorway_link": None,
+            "trunk": 50,
+            "trunk_link": 40,
+            "primary": 45,
+            "primary_link": 35,
+            "secondary": 40,
+            "secondary_link": 30,
+            "tertiary": 35,
+            "tertiary_link": 25,
+            "service": 15,
+            "living_street": 10,
+            "track": 15,
+            "path": 10,
+            "footway": None,
+            "pedestrian": None,
+            "cycleway": None,
+            "bridleway": None,
+            "steps": None,
+        },
+        "maxspeed": True,
+        "max_speed": 80,
+        "oneway": True,
+    },
+    "car": {
+        "default_speed": 25,
+        "classes": {
+            "motorway": 90,
+            "motorway_link": 50,
+            "trunk": 60,
+            "trunk_link": 40,
+            "primary": 50,
+            "primary_link": 35,
+            "secondary": 40,
+            "secondary_link": 30,
+            "tertiary": 30,
+            "tertiary_link": 25,
+            "service": 10,
+            "living_street": 10,
+            "track": 10,
+            "path": None,
+            "footway": None,
+            "pedestrian": None,
+            "cycleway": None,
+            "bridleway": None,
+            "steps": None,
+        },
+        "maxspeed": True,
+        "max_speed": 120,
+        "oneway": True,
+    },
+}
+
+# Values of the oneway tag (OSM and Geofabrik shapefile) allowing only one direction
+ONEWAY_FORWARD = ("yes", "true", "1", "f")
+ONEWAY_BACKWARD = ("-1", "reverse", "t")
+
+
+def get_speed_profile(request):
+    """
+    Speed profile from the 'profile' query parameter, default to settings.SPEED_PROFILE
+    """
+    profile = request.query_params.get("profile", settings.SPEED_PROFILE)
+    if profile not in SPEED_PROFILES:
+        raise ValueError(
+            f"Invalid profile '{profile}'. Supported profiles: {', '.join(SPEED_PROFILES)}"
+        )
+    return profile
+
+
+def require_profile(metadata: JalanMetadata, profile: str):
+    """
+    Raise an error when the costs of a profile were not computed for a road table
+    """
+    if profile != DEFAULT_PROFILE and profile not in (metadata.profiles or []):
+        raise ValueError(
+            f"Profile '{profile}' is not computed for {metadata.name}, generate the topology again."
+        )
+
+
+def is_directed(profile: str):
+    """
+    Routes of a profile following oneway roads have to be searched as directed
+    """
+    return SPEED_PROFILES[profile]["oneway"]
+
+
+def max_speed(profile: str):
+    """
+    Highest speed (km/h) a road can have in a profile
+    """
+    config = SPEED_PROFILES[profile]
+    if config["maxspeed"]:
+        return config["max_speed"]
+    speeds = [speed for speed in config["classes"].values() if speed is not None]
+    return max([config["default_speed"], *speeds])
+
+
+def profile_columns(profile: str):
+    """
+    Return the cost and reverse cost column names of a profile
+    """
+    if profile == DEFAULT_PROFILE:
+        return "cost", "reverse_cost"
+    return f"cost_{profile}", f"reverse_cost_{profile}"
+
+
+def edges_sql(road_table: str, profile: str = DEFAULT_PROFILE, bounds=None):
+    """
+    Edges query given to pgRouting with the cost columns of a profile, restricted
+    to the roads crossing bounds (xmin, ymin, xmax, ymax) when given
+    """
+    cost, reverse_cost = profile_columns(profile)
+    query = (
+        f"SELECT id, source, target, {cost} AS cost, {reverse_cost} AS reverse_cost "
+        f"FROM {road_table}"
+    )
+    if bounds is not None:
+        xmin, ymin, xmax, ymax = (float(value) for value in bounds)
+        # Bbox operator answered by the GiST index of mline
+        query += (
+            f" WHERE mline && ST_MakeEnvelope({xmin}, {ymin}, {xmax}, {ymax}, 4326)"
+        )
+    return query
+
+
+def speed_sql(profile: str):
+    """
+    SQL expression of the speed (km/h) of a road for a profile, NULL when closed
+    """
+    config = SPEED_PROFILES[profile]
+    classes = " ".join(
+        f"WHEN '{fclass}' THEN {'NULL' if speed is None else speed}"
+        for fclass, speed in config["classes"].items()
+    )
+    speed = f"CASE r.fclass {classes} ELSE {config['default_speed']} END"
+
+    if config["maxspeed"]:
+        speed = f"""
+            CASE WHEN ({speed}) IS NULL THEN NULL
+            ELSE LEAST(COALESCE(r.maxspeed, {speed}), {config['max_speed']}) END
+        """
+    return speed
+
+
+def update_costs_sql(road_table: str, rows_where: str = "true"):
+    """
+    Single UPDATE filling the cost columns of every profile for the roads matching
+    rows_where. The geography length is computed once per road, cost is in minutes
+    and -1 means no access.
+    """
+    profile_speeds = ",\n".join(
+        f"({speed_sql(profile)})::float8 AS speed_{profile}"
+        for profile in SPEED_PROFILES
+    )
+    forward = ", ".join(f"'{value}'" for value in ONEWAY_FORWARD)
+    backward = ", ".join(f"'{value}'" for value in ONEWAY_BACKWARD)
+
+    assignments = []
+    for profile, config in SPEED_PROFILES.items():
+        cost, reverse_cost = profile_columns(profile)
+        travel_time = f"s.length * 0.06 / s.speed_{profile}"  # meter to minutes
+        closed = f"s.speed_{profile} IS NULL"
+        cost_closed = reverse_closed = closed
+        if config["oneway"]:
+            cost_closed = f"{closed} OR s.oneway IN ({backward})"
+            reverse_closed = f"{closed} OR s.oneway IN ({forward})"
+        assignments.append(
+            f"{cost} = CASE WHEN {cost_closed} THEN -1 ELSE {travel_time} END"
+        )
+        assignments.append(
+            f"{reverse_cost} = CASE WHEN {reverse_closed} THEN -1 ELSE {travel_time} END"
+        )
+
+    return f"""
+        UPDATE {road_table} AS t
+        SET {", ".join(assignments)}
+        FROM (
+            SELECT r.id, r.length, r.oneway, {profile_speeds}
+            FROM (
+                SELECT id,
+                    ST_Length(mline::geography) AS length,
+                    lower(properties->>'fclass') AS fclass,
+                    NULLIF(
+                        substring(properties->>'maxspeed' FROM '^[0-9]+(?:\\.[0-9]+)?')::float8,
+                        0
+                    ) AS maxspeed,
+                    lower(coalesce(properties->>'oneway', '')) AS oneway
+                FROM {road_table}
+                WHERE {rows_where}
+            ) AS r
+        ) AS s
+        WHERE t.id = s.id;
+    """
+
+
+def add_profile_columns_sql(road_table: str):
+    """
+    Add the cost columns of every profile to a road table
+    """
+    columns = [
+        column
+        for profile in SPEED_PROFILES
+        if profile != DEFAULT_PROFILE
+        for column in profile_columns(profile)
+    ]
+    return f"""
+        ALTER TABLE {road_table}
+        {", ".join(f"ADD COLUMN IF NOT EXISTS {column} float8" for column in columns)};
+    """
@@ -0,0 +1,668 @@
+import hashlib
+import logging
+import threading
+from functools import cached_property
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+from scipy.sparse.csgraph import dijkstra
+from django.conf import settings
+from django.db import connection
+from geodjango.utils import concave_hull_sql, geodesic_distance
+from .models import JalanMetadata
+from .profiles import DEFAULT_PROFILE, profile_columns, edges_sql, max_speed
+
+logger = logging.getLogger(__name__)
+
+ROUTING_ENGINES = ("pgrouting", "graph", "ch")
+
+# Search windows of the pgRouting route queries: bbox of the route coordinates with
+# a margin of ROUTE_WINDOW_RATIO times its diagonal (at least ROUTE_WINDOW_MIN_MARGIN
+# meter). A route not found is searched again with the margin doubled, the last
+# attempt loads the whole network.
+ROUTE_WINDOW_MIN_MARGIN = 1000
+ROUTE_WINDOW_RATIO = 0.5
+ROUTE_WINDOW_ATTEMPTS = 3
+# Shortest length (meter) of a degree of latitude, windows are never smaller than asked
+METERS_PER_DEGREE = 110574
+
+# scipy csgraph ignores explicit zero weights, so zero cost edges are clamped
+MIN_WEIGHT = 1e-9
+
+
+class RoadGraph:
+    """
+    Road network of a topology table stored as compressed sparse row (CSR) arrays.
+
+    Node index `i` refers to the vertex `node_ids[i]` of `{road_table}_vertices_pgr`,
+    every arc keeps the id and the length (meter) of the road edge it was built from.
+    """
+
+    def __init__(self, edge_ids, sources, targets, costs, reverse_costs, lengths=None):
+        self.node_ids, inverse = np.unique(
+            np.concatenate([sources, targets]), return_inverse=True
+        )
+        n_nodes = len(self.node_ids)
+        n_edges = len(edge_ids)
+        source_idx = inverse[:n_edges]
+        target_idx = inverse[n_edges:]
+        if lengths is None:
+            lengths = np.zeros(n_edges)
+
+        # Same convention as pgRouting: cost goes source -> target,
+        # reverse_cost goes target -> source and a negative cost means no arc
+        arcs = {
+            "rows": np.concatenate([source_idx, target_idx]),
+            "cols": np.concatenate([target_idx, source_idx]),
+            "weights": np.concatenate([costs, reverse_costs]),
+            "edges": np.concatenate([edge_ids, edge_ids]),
+            "lengths": np.concatenate([lengths, lengths]),
+        }
+        valid = arcs["weights"] >= 0
+        arcs = {key: value[valid] for key, value in arcs.items()}
+
+        # scipy sums parallel arcs, keep only the cheapest one per node pair
+        order = np.lexsort((arcs["weights"], arcs["cols"], arcs["rows"]))
+        arcs = {key: value[order] for key, value in arcs.items()}
+        rows, cols = arcs["rows"], arcs["cols"]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        arcs = {key: value[first] for key, value in arcs.items()}
+
+        indptr = np.searchsorted(arcs["rows"], np.arange(n_nodes + 1))
+        self.matrix = csr_matrix(
+            (np.maximum(arcs["weights"], MIN_WEIGHT), arcs["cols"], indptr),
+            shape=(n_nodes, n_nodes),
+        )
+        self.arc_edges = arcs["edges"]
+        self.arc_lengths = arcs["lengths"]
+        # Arcs are sorted by (row, col), so row * n + col is a sorted search key
+        self.arc_keys = arcs["rows"].astype(np.int64) * n_nodes + arcs["cols"]
+        self.version = None
+
+    @classmethod
+    def from_table(cls, road_table: str, profile: str = DEFAULT_PROFILE):
+        """
+        Load the edges of a road table which already has topology, with the cost
+        columns of a speed profile
+        """
+        cost, reverse_cost = profile_columns(profile)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id, source, target, {cost}::float8, {reverse_cost}::float8,
+                    ST_Length(mline::geography)
+                FROM {road_table}
+                WHERE source IS NOT NULL AND target IS NOT NULL;
+            """
+            )
+            rows = cursor.fetchall()
+
+        if not rows:
+            raise ValueError(f"Road table {road_table} has no topology")
+
+        edges = np.array(rows, dtype=np.float64)
+        return cls(
+            edge_ids=edges[:, 0].astype(np.int64),
+            sources=edges[:, 1].astype(np.int64),
+            targets=edges[:, 2].astype(np.int64),
+            costs=np.nan_to_num(edges[:, 3], nan=-1),
+            reverse_costs=np.nan_to_num(edges[:, 4], nan=-1),
+            lengths=np.nan_to_num(edges[:, 5]),
+        )
+
+    def node_indices(self, vertex_ids):
+        """
+        Return the CSR index of every vertex id, -1 when not part of the graph
+        """
+        vertex_ids = np.asarray(vertex_ids, dtype=np.int64)
+        idx = np.searchsorted(self.node_ids, vertex_ids)
+        idx = np.minimum(idx, len(self.node_ids) - 1)
+        return np.where(self.node_ids[idx] == vertex_ids, idx, -1)
+
+    def node_index(self, vertex_id: int):
+        """
+        Return the CSR index of a vertex id
+        """
+        idx = int(self.node_indices([vertex_id])[0])
+        if idx < 0:
+            raise ValueError(f"Vertex {vertex_id} is not part of the road graph")
+        return idx
+
+    def arc_positions(self, from_idx, to_idx, directed=True):
+        """
+        Return the position of every arc (from_idx[i] -> to_idx[i]) in the arc arrays
+        """
+        from_idx = np.asarray(from_idx, dtype=np.int64)
+        to_idx = np.asarray(to_idx, dtype=np.int64)
+        n_nodes = len(self.node_ids)
+
+        def lookup(rows, cols):
+            keys = rows * n_nodes + cols
+            pos = np.searchsorted(self.arc_keys, keys)
+            pos = np.minimum(pos, len(self.arc_keys) - 1)
+            found = self.arc_keys[pos] == keys
+            return pos, found
+
+        pos, found = lookup(from_idx, to_idx)
+        if directed:
+            return pos
+
+        # Undirected search may have used the arc in the opposite direction
+        back_pos, back_found = lookup(to_idx, from_idx)
+        weights = self.matrix.data
+        forward_weight = np.where(found, weights[pos], np.inf)
+        backward_weight = np.where(back_found, weights[back_pos], np.inf)
+        return np.where(forward_weight <= backward_weight, pos, back_pos)
+
+    def arc_edge_ids(self, from_idx, to_idx, directed=True):
+        """
+        Return the road edge id used by every arc (from_idx[i] -> to_idx[i])
+        """
+        return self.arc_edges[self.arc_positions(from_idx, to_idx, directed)]
+
+    def tree_lengths(self, predecessors, directed=True):
+        """
+        Length (meter) from the root of a shortest path tree to every node.
+
+        Lengths are summed by pointer jumping, every round doubles the number
+        of tree levels covered. The root and unreached nodes are left at 0.
+        """
+        n_nodes = len(self.node_ids)
+        parent = np.where(predecessors >= 0, predecessors, -1).astype(np.int64)
+        nodes = np.flatnonzero(parent >= 0)
+
+        total = np.zeros(n_nodes)
+        total[nodes] = self.arc_lengths[
+            self.arc_positions(parent[nodes], nodes, directed)
+        ]
+
+        active = nodes
+        while len(active) > 0:
+            up = parent[active]
+            total[active] = total[active] + total[up]
+            parent[active] = parent[up]
+            active = active[parent[active] >= 0]
+
+        return total
+
+    def shortest_path(self, start_vid: int, end_vid: int, directed=False):
+        """
+        Dijkstra between two vertices, same as pgr_dijkstra.
+
+        Returns the ordered edge ids and the aggregate cost, or None when unreachable.
+        """
+        start = self.node_index(start_vid)
+        end = self.node_index(end_vid)
+        dist, predecessors = dijkstra(
+            self.matrix,
+            directed=directed,
+            indices=start,
+            return_predecessors=True,
+        )
+        if not np.isfinite(dist[end]):
+            return None
+
+        path = [end]
+        while path[-1] != start:
+            path.append(predecessors[path[-1]])
+        path.reverse()
+
+        edge_ids = self.arc_edge_ids(path[:-1], path[1:], directed=directed)
+        return edge_ids.tolist(), float(dist[end])
+
+    def shortest_paths(self, start_vid: int, end_vids, directed=False):
+        """
+        One-to-many Dijkstra, same as pgr_dijkstra with an array of end vertices.
+
+        Returns a dictionary end vertex id -> (ordered edge ids, aggregate cost)
+        for every reachable end vertex other than the start vertex.
+        """
+        start = self.node_index(start_vid)
+        dist, predecessors = dijkstra(
+            self.matrix,
+            directed=directed,
+            indices=start,
+            return_predecessors=True,
+        )
+
+        paths = {}
+        for end_vid, end in zip(end_vids, self.node_indices(end_vids)):
+            if end < 0 or end == start or not np.isfinite(dist[end]):
+                continue
+            path = [end]
+            while path[-1] != start:
+                path.append(predecessors[path[-1]])
+            path.reverse()
+
+            edge_ids = self.arc_edge_ids(path[:-1], path[1:], directed=directed)
+            paths[int(end_vid)] = (edge_ids.tolist(), float(dist[end]))
+        return paths
+
+    def driving_distance(self, start_vid: int, max_cost: float, directed=True):
+        """
+        Nodes reachable within max_cost, same as pgr_drivingDistance.
+
+        Returns the reached vertex ids, the edge used to reach every vertex
+        (-1 for the start vertex) and their aggregate cost.
+        """
+        start = self.node_index(start_vid)
+        dist, predecessors = dijkstra(
+            self.matrix,
+            directed=directed,
+            indices=start,
+            return_predecessors=True,
+            limit=max_cost,
+        )
+        reached = np.flatnonzero(np.isfinite(dist))
+        reached = reached[np.argsort(dist[reached], kind="stable")]
+
+        edges = np.full(len(reached), -1, dtype=np.int64)
+        has_pred = predecessors[reached] >= 0
+        edges[has_pred] = self.arc_edge_ids(
+            predecessors[reached][has_pred], reached[has_pred], directed=directed
+        )
+        return self.node_ids[reached], edges, dist[reached]
+
+    def travel_matrix(self, source_vids, target_vids, max_cost=np.inf, directed=False):
+        """
+        Many-to-many travel cost and route length (meter) from every source to every target.
+
+        Both matrices have the shape (sources, targets), unreachable pairs are inf.
+        """
+        source_idx = self.node_indices(source_vids)
+        target_idx = self.node_indices(target_vids)
+        valid_target = target_idx >= 0
+
+        costs = np.full((len(source_idx), len(target_idx)), np.inf)
+        lengths = np.full((len(source_idx), len(target_idx)), np.inf)
+
+        for row, start in enumerate(source_idx):
+            if start < 0:
+                continue
+            dist, predecessors = dijkstra(
+                self.matrix,
+                directed=directed,
+                indices=start,
+                return_predecessors=True,
+                limit=max_cost,
+            )
+            tree = self.tree_lengths(predecessors, directed=directed)
+            costs[row, valid_target] = dist[target_idx[valid_target]]
+            lengths[row, valid_target] = tree[target_idx[valid_target]]
+
+        lengths[~np.isfinite(costs)] = np.inf
+        return costs, lengths
+
+    @cached_property
+    def fingerprint(self):
+        """
+        Hash of the nodes and arcs, tells whether a structure derived from the
+        graph (e.g. its contraction hierarchy) still matches it
+        """
+        digest = hashlib.sha1()
+        for array in (
+            self.node_ids,
+            self.matrix.indptr,
+            self.matrix.indices,
+            self.matrix.data,
+        ):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    @cached_property
+    def reverse_matrix(self):
+        """
+        Transposed graph, a search on it follows every arc backward
+        """
+        return self.matrix.T.tocsr()
+
+    def reverse_travel_times(self, target_vids, max_cost=np.inf):
+        """
+        Many-to-one travel cost from every node to each target, with one reverse
+        search per target on the transposed graph.
+
+        The matrix has the shape (targets, nodes), unreachable pairs are inf.
+        """
+        target_idx = self.node_indices(target_vids)
+        valid = target_idx >= 0
+
+        costs = np.full((len(target_idx), len(self.node_ids)), np.inf)
+        if valid.any():
+            costs[valid] = dijkstra(
+                self.reverse_matrix,
+                directed=True,
+                indices=target_idx[valid],
+                limit=max_cost,
+            )
+        return costs
+
+
+class SnapIndex:
+    """
+    KD-tree over the vertices of a topology table, used to snap a coordinate
+    to its nearest vertex without a KNN query.
+
+    Distance is planar in degrees, same as `ORDER BY the_geom <-> point` in PostGIS.
+    """
+
+    def __init__(self, vertex_ids, lons, lats):
+        self.vertex_ids = np.asarray(vertex_ids, dtype=np.int64)
+        self.coords = np.column_stack([lons, lats]).astype(np.float64)
+        self.tree = cKDTree(self.coords)
+        self.version = None
+
+    @classmethod
+    def from_table(cls, vertices_table: str):
+        """
+        Load the vertices of a {road_table}_vertices_pgr table
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id, ST_X(the_geom), ST_Y(the_geom)
+                FROM {vertices_table}
+                WHERE the_geom IS NOT NULL;
+            """
+            )
+            rows = cursor.fetchall()
+
+        if not rows:
+            raise ValueError(f"No vertex found in {vertices_table}")
+
+        vertices = np.array(rows, dtype=np.float64)
+        return cls(vertices[:, 0].astype(np.int64), vertices[:, 1], vertices[:, 2])
+
+    def nearest(self, lons, lats, k=1):
+        """
+        Return the ids and coordinates of the k nearest vertices of every coordinate.
+
+        Ids have the shape (points,) when k is 1, (points, k) otherwise.
+        """
+        points = np.column_stack([lons, lats]).astype(np.float64)
+        _, idx = self.tree.query(points, k=k)
+        return self.vertex_ids[idx], self.coords[idx]
+
+    def nearest_vertex(self, lon, lat):
+        """
+        Return the id of the nearest vertex from a coordinate
+        """
+        vertex_ids, _ = self.nearest([float(lon)], [float(lat)])
+        return int(vertex_ids[0])
+
+
+_routing_cache = {}
+_routing_locks = {}
+_cache_lock = threading.Lock()
+
+
+def get_cached(metadata: JalanMetadata, kind: str, load):
+    """
+    Return a cached routing structure of a JalanMetadata, load it on the first call.
+
+    The cache is per process, a structure is reloaded when the metadata was saved
+    after it was loaded (e.g. topology generated from another worker).
+    """
+    key = (str(metadata.id), kind)
+    with _cache_lock:
+        cached = _routing_cache.get(key)
+        if cached is not None and cached.version == metadata.updated_at:
+            return cached
+        lock = _routing_locks.setdefault(key, threading.Lock())
+
+    # Only one thread loads a given table, the others wait for its result
+    with lock:
+        with _cache_lock:
+            cached = _routing_cache.get(key)
+        if cached is None or cached.version != metadata.updated_at:
+            cached = load()
+            cached.version = metadata.updated_at
+            with _cache_lock:
+                _routing_cache[key] = cached
+    return cached
+
+
+def get_road_graph(metadata: JalanMetadata, profile: str = DEFAULT_PROFILE):
+    """
+    Return the cached road graph of a JalanMetadata for a speed profile
+    """
+    return get_cached(
+        metadata,
+        f"graph:{profile}",
+        lambda: RoadGraph.from_table(metadata.road_table, profile),
+    )
+
+
+def get_snap_index(metadata: JalanMetadata):
+    """
+    Return the cached vertex snapping index of a JalanMetadata
+    """
+    return get_cached(
+        metadata,
+        "snap",
+        lambda: SnapIndex.from_table(f"{metadata.road_table}_vertices_pgr"),
+    )
+
+
+def invalidate_road_graph(metadata_id):
+    """
+    Drop the cached road graphs and snapping index of a JalanMetadata
+    """
+    with _cache_lock:
+        for key in [key for key in _routing_cache if key[0] == str(metadata_id)]:
+            del _routing_cache[key]
+
+
+def get_routing_engine(request):
+    """
+    Routing engine from the 'engine' query parameter, default to settings.ROUTING_ENGINE
+    """
+    engine = request.query_params.get("engine", settings.ROUTING_ENGINE)
+    if engine not in ROUTING_ENGINES:
+        raise ValueError(
+            f"Invalid engine '{engine}'. Supported engines: {', '.join(ROUTING_ENGINES)}"
+        )
+    return engine
+
+
+def window_bounds(lons, lats, margin: float):
+    """
+    Bbox (xmin, ymin, xmax, ymax) of coordinates expanded by a margin in meter
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lat_margin = margin / METERS_PER_DEGREE
+    # A degree of longitude is shortest at the latitude farthest from the equator
+    widest_lat = min(np.abs(lats).max() + lat_margin, 89.0)
+    lon_margin = margin / (METERS_PER_DEGREE * np.cos(np.radians(widest_lat)))
+    return (
+        float(lons.min() - lon_margin),
+        float(max(lats.min() - lat_margin, -90.0)),
+        float(lons.max() + lon_margin),
+        float(min(lats.max() + lat_margin, 90.0)),
+    )
+
+
+def route_windows(lons, lats):
+    """
+    Bounds of the successive search windows of a route through coordinates,
+    None (whole network) last
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    diagonal = geodesic_distance(lats.min(), lons.min(), [lats.max()], [lons.max()])
+    margin = max(ROUTE_WINDOW_MIN_MARGIN, ROUTE_WINDOW_RATIO * float(diagonal[0]))
+    windows = [
+        window_bounds(lons, lats, margin * 2**attempt)
+        for attempt in range(ROUTE_WINDOW_ATTEMPTS - 1)
+    ]
+    return windows + [None]
+
+
+def reach_window(lon, lat, max_time: float, profile: str = DEFAULT_PROFILE):
+    """
+    Bounds of every road reachable within max_time (minute) at the highest speed
+    of a profile, a driving distance search over them is exact
+    """
+    radius = max_time / 60 * max_speed(profile) * 1000
+    return window_bounds([lon], [lat], radius)
+
+
+def record_window(road_table: str, kind: str, bounds, attempt: int, found: bool):
+    """
+    Log the window of a bounded pgRouting query, with the number of edges it loaded
+    at DEBUG level only since counting them costs a query
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    edge_count = "all" if bounds is None else "uncounted"
+    if bounds is not None and logger.isEnabledFor(logging.DEBUG):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT count(*) FROM {road_table}
+                WHERE mline && ST_MakeEnvelope(%s, %s, %s, %s, 4326);
+            """,
+                list(bounds),
+            )
+            edge_count = cursor.fetchone()[0]
+
+    logger.info(
+        "%s on %s: attempt %s, window %s, %s edges loaded, %s",
+        kind,
+        road_table,
+        attempt,
+        bounds,
+        edge_count,
+        "found" if found else "not found",
+    )
+
+
+def search_route_windows(road_table: str, kind: str, lons, lats, search, found=bool):
+    """
+    Run search(bounds) on growing windows around the route coordinates until
+    found(result) is true, the last window is the whole network
+    """
+    for attempt, bounds in enumerate(route_windows(lons, lats), start=1):
+        result = search(bounds)
+        record_window(road_table, kind, bounds, attempt, found(result))
+        if found(result):
+            break
+    return result
+
+
+def route_geojson(road_table: str, edge_ids: list):
+    """
+    Merge the route edges into a single GeoJSON geometry string
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT ST_AsGeoJSON(ST_LineMerge(ST_Union(mline))) AS geojson
+            FROM {road_table}
+            WHERE id = ANY(%s);
+        """,
+            [[int(edge_id) for edge_id in edge_ids]],
+        )
+        result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def routes_geojson(road_table: str, paths: dict):
+    """
+    Merge the edges of many routes at once, paths is a dictionary key -> edge ids.
+
+    Returns a dictionary key -> GeoJSON geometry string.
+    """
+    keys = []
+    edge_ids = []
+    for key, path_edge_ids in paths.items():
+        keys.extend([int(key)] * len(path_edge_ids))
+        edge_ids.extend(int(edge_id) for edge_id in path_edge_ids)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT r.key, ST_AsGeoJSON(ST_LineMerge(ST_Union(e.mline))) AS geojson
+            FROM unnest(%s::bigint[], %s::bigint[]) AS r(key, edge)
+            JOIN {road_table} AS e ON e.id = r.edge
+            GROUP BY r.key;
+        """,
+            [keys, edge_ids],
+        )
+        return dict(cursor.fetchall())
+
+
+def isochrone_buffer_geojson(road_table: str, edge_ids: list, hull_buffer=None):
+    """
+    Buffer the reached edges into the isochrone GeoJSON polygon string.
+
+    Returns a (buffer, concave hull) row, the concave hull is only computed by
+    PostGIS when hull_buffer (meter) is given, None otherwise.
+    """
+    hull_sql = "NULL"
+    if hull_buffer is not None:
+        hull_sql = concave_hull_sql("isochrone_polygon", hull_buffer)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT ST_AsGeoJSON(isochrone_polygon) AS geojson, {hull_sql} AS concave
+            FROM (
+                SELECT ST_Buffer(ST_Union(mline), 0.0002) AS isochrone_polygon
+                FROM {road_table}
+                WHERE id = ANY(%s)
+            ) AS buffered;
+        """,
+            [[int(edge_id) for edge_id in edge_ids]],
+        )
+        return cursor.fetchone()
+
+
+def driving_distance_edges(
+    metadata: JalanMetadata,
+    lon,
+    lat,
+    max_time: float,
+    engine="pgrouting",
+    profile: str = DEFAULT_PROFILE,
+):
+    """
+    Run a single driving distance search from a coordinate.
+
+    Returns the reached edge ids with the aggregate cost of the node they reach,
+    every band up to max_time can be derived by filtering on the aggregate cost.
+    """
+    road_table = metadata.road_table
+    vertex_ids, vertex_coords = get_snap_index(metadata).nearest(
+        [float(lon)], [float(lat)]
+    )
+    start_vid = int(vertex_ids[0])
+
+    # The contraction hierarchy only answers point to point queries
+    if engine in ("graph", "ch"):
+        graph = get_road_graph(metadata, profile)
+        _, edges, agg_cost = graph.driving_distance(start_vid, max_time)
+        reached = edges >= 0
+        return edges[reached], agg_cost[reached]
+
+    bounds = reach_window(*vertex_coords[0], max_time, profile)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT edge, agg_cost
+            FROM pgr_drivingDistance(
+                '{edges_sql(road_table, profile, bounds)}',
+                %s::bigint,
+                %s
+            )
+            WHERE edge >= 0;
+        """,
+            [start_vid, float(max_time)],
+        )
+        rows = cursor.fetchall()
+    record_window(road_table, "pgr_drivingDistance", bounds, 1, bool(rows))
+
+    result = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    return result[:, 0].astype(np.int64), result[:, 1]
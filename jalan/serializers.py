@@ -14,6 +14,9 @@ class JalanMetadataSerializer(serializers.ModelSerializer):
             "data_status",
             "geoserver_status",
             "topology_status",
+            "data_count",
+            "ingest_rate",
+            "profiles",
             "created_at",
             "updated_at",
         )
@@ -0,0 +1,201 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from scipy.sparse.csgraph import dijkstra
+from .contraction import ContractionHierarchy
+from .routing import RoadGraph
+
+
+def random_road_graph(seed: int, n_vertices: int = 60, n_edges: int = 150):
+    """
+    Random road graph with sparse vertex ids, one way edges, parallel edges and
+    self loops, returned with its edges for the reference computations
+    """
+    rng = np.random.default_rng(seed)
+    vertex_ids = rng.choice(10 * n_vertices, size=n_vertices, replace=False) + 1
+    edges = {
+        "edge_ids": np.arange(n_edges) + 100,
+        "sources": rng.choice(vertex_ids, n_edges),
+        "targets": rng.choice(vertex_ids, n_edges),
+        "costs": rng.uniform(0.1, 5, n_edges),
+        "reverse_costs": np.where(
+            rng.random(n_edges) < 0.3, -1, rng.uniform(0.1, 5, n_edges)
+        ),
+        "lengths": rng.uniform(10, 500, n_edges),
+    }
+    return RoadGraph(**edges), edges
+
+
+def reference_arcs(edges, directed=True):
+    """
+    Cheapest (cost, length) of every arc (source vertex, target vertex)
+    """
+    arcs = {}
+
+    def add(source, target, cost, length):
+        if cost >= 0 and (cost, length) < arcs.get((source, target), (np.inf, 0)):
+            arcs[(source, target)] = (cost, length)
+
+    for source, target, cost, reverse_cost, length in zip(
+        edges["sources"],
+        edges["targets"],
+        edges["costs"],
+        edges["reverse_costs"],
+        edges["lengths"],
+    ):
+        add(source, target, cost, length)
+        add(target, source, reverse_cost, length)
+        if not directed:
+            add(target, source, cost, length)
+            add(source, target, reverse_cost, length)
+    return arcs
+
+
+def reference_length(graph, arcs, predecessors, node):
+    """
+    Length of the path from the root of a predecessor tree to a node, one arc at a time
+    """
+    length = 0.0
+    while predecessors[node] >= 0:
+        parent = predecessors[node]
+        length += arcs[(graph.node_ids[parent], graph.node_ids[node])][1]
+        node = parent
+    return length
+
+
+class RoadGraphTests(SimpleTestCase):
+    def test_cheapest_parallel_arc_is_kept(self):
+        graph = RoadGraph(
+            edge_ids=np.array([1, 2, 3]),
+            sources=np.array([10, 10, 20]),
+            targets=np.array([20, 20, 30]),
+            costs=np.array([5.0, 2.0, 1.0]),
+            reverse_costs=np.array([-1.0, -1.0, 1.0]),
+            lengths=np.array([50.0, 20.0, 10.0]),
+        )
+        self.assertEqual(graph.shortest_path(10, 30, directed=True), ([2, 3], 3.0))
+        self.assertIsNone(graph.shortest_path(30, 10, directed=True))
+        self.assertEqual(graph.shortest_path(30, 10, directed=False), ([3, 2], 3.0))
+
+    def test_tree_lengths_match_reference(self):
+        for seed in range(10):
+            graph, edges = random_road_graph(seed)
+            for directed in (True, False):
+                arcs = reference_arcs(edges, directed)
+                _, predecessors = dijkstra(
+                    graph.matrix,
+                    directed=directed,
+                    indices=0,
+                    return_predecessors=True,
+                )
+                lengths = graph.tree_lengths(predecessors, directed=directed)
+                expected = [
+                    reference_length(graph, arcs, predecessors, node)
+                    for node in range(len(graph.node_ids))
+                ]
+                np.testing.assert_allclose(lengths, expected)
+
+    def test_travel_matrix_matches_reference(self):
+        for seed in range(10):
+            graph, edges = random_road_graph(seed)
+            sources = graph.node_ids[:8]
+            # An unknown vertex only gives an unreachable row or column
+            targets = np.append(graph.node_ids[-12:], -1)
+
+            for directed in (True, False):
+                arcs = reference_arcs(edges, directed)
+                costs, lengths = graph.travel_matrix(
+                    sources, targets, directed=directed
+                )
+                self.assertEqual(costs.shape, (len(sources), len(targets)))
+                self.assertTrue(np.all(np.isinf(costs[:, -1])))
+
+                for row, source in enumerate(sources):
+                    dist, predecessors = dijkstra(
+                        graph.matrix,
+                        directed=directed,
+                        indices=graph.node_index(source),
+                        return_predecessors=True,
+                    )
+                    for col, target in enumerate(targets[:-1]):
+                        node = graph.node_index(target)
+                        self.assertAlmostEqual(costs[row, col], dist[node])
+                        if np.isfinite(dist[node]):
+                            self.assertAlmostEqual(
+                                lengths[row, col],
+                                reference_length(graph, arcs, predecessors, node),
+                            )
+                        else:
+                            self.assertEqual(lengths[row, col], np.inf)
+
+    def test_travel_matrix_max_cost(self):
+        graph, _ = random_road_graph(0)
+        costs, lengths = graph.travel_matrix(
+            graph.node_ids[:5], graph.node_ids, max_cost=3
+        )
+        self.assertTrue(np.all((costs <= 3) | np.isinf(costs)))
+        self.assertTrue(np.array_equal(np.isinf(costs), np.isinf(lengths)))
+
+
+class ContractionHierarchyTests(SimpleTestCase):
+    def assert_same_routes(self, graph, hierarchy, pairs):
+        for start_vid, end_vid in pairs:
+            expected = graph.shortest_path(start_vid, end_vid, directed=True)
+            result = hierarchy.shortest_path(graph, start_vid, end_vid)
+            if expected is None:
+                self.assertIsNone(result)
+                continue
+
+            # Random costs have no ties, the unpacked path uses the same edges
+            self.assertEqual(result[0], expected[0])
+            self.assertAlmostEqual(result[1], expected[1])
+
+    def test_routes_match_dijkstra(self):
+        for seed in range(10):
+            graph, _ = random_road_graph(seed)
+            hierarchy = ContractionHierarchy.build(graph)
+            self.assertEqual(hierarchy.fingerprint, graph.fingerprint)
+
+            rng = np.random.default_rng(seed)
+            pairs = rng.choice(graph.node_ids, size=(100, 2)).tolist()
+            self.assert_same_routes(graph, hierarchy, pairs)
+
+    def test_all_pairs_costs_match_dijkstra(self):
+        graph, _ = random_road_graph(42, n_vertices=40, n_edges=90)
+        hierarchy = ContractionHierarchy.build(graph)
+        dist = dijkstra(graph.matrix, directed=True)
+
+        for start in range(len(graph.node_ids)):
+            for end in range(len(graph.node_ids)):
+                result = hierarchy.search(start, end)
+                if np.isinf(dist[start, end]):
+                    self.assertIsNone(result)
+                else:
+                    self.assertAlmostEqual(result[0], dist[start, end])
+
+    def test_shortest_paths_match_dijkstra(self):
+        graph, _ = random_road_graph(3)
+        hierarchy = ContractionHierarchy.build(graph)
+        start_vid = int(graph.node_ids[0])
+        end_vids = graph.node_ids.tolist() + [-1]
+
+        expected = graph.shortest_paths(start_vid, end_vids, directed=True)
+        result = hierarchy.shortest_paths(graph, start_vid, end_vids)
+        self.assertEqual(result.keys(), expected.keys())
+        for end_vid, (_, cost) in expected.items():
+            self.assertAlmostEqual(result[end_vid][1], cost)
+
+    def test_save_and_load(self):
+        graph, _ = random_road_graph(7)
+        hierarchy = ContractionHierarchy.build(graph)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "contraction.npz")
+            hierarchy.save(path)
+            loaded = ContractionHierarchy.load(path)
+
+        self.assertEqual(loaded.fingerprint, graph.fingerprint)
+        self.assertEqual(loaded.shortcut_count, hierarchy.shortcut_count)
+        pairs = np.random.default_rng(7).choice(graph.node_ids, size=(50, 2))
+        self.assert_same_routes(graph, loaded, pairs.tolist())
@@ -1,20 +1,40 @@
-import geopandas as gpd
 from rest_framework import generics, status
 from rest_framework.response import Response
-from django.contrib.gis.geos import Polygon
 from .models import JalanMetadata
-from threading import Thread
 from .serializers import JalanMetadataSerializer
 from geodjango.utils import (
     is_valid_geospatial_file,
-    find_shapefile_path,
-    extract_zip_to_temp,
-    create_geoserver_layer,
     delete_geoserver_layer,
     create_concave_hull,
-    geojson_line_length,
+    concave_hull_sql,
+    get_hull_engine,
+    geojson_line_lengths,
 )
-from shapely.wkb import dumps, loads
+from job.queue import enqueue_job
+from tiles.mvt import invalidate_tiles
+from project.models import ZonasiPrecompute
+from project.precompute import remove_zonasi_precomputes
+from .routing import (
+    get_routing_engine,
+    get_road_graph,
+    invalidate_road_graph,
+    get_snap_index,
+    route_geojson,
+    isochrone_buffer_geojson,
+    reach_window,
+    record_window,
+    search_route_windows,
+)
+from .contraction import get_contraction, remove_contractions
+from .profiles import (
+    SPEED_PROFILES,
+    get_speed_profile,
+    require_profile,
+    is_directed,
+    edges_sql,
+)
+from .cache import isochrone_cache_key, get_cached_isochrone, set_cached_isochrone
+from django.conf import settings
 from django.db import connection
 import json
 
@@ -45,6 +65,13 @@ class JalanMetadataDelete(generics.DestroyAPIView):
                     cursor.execute(f"DROP TABLE IF EXISTS {road_table_verticles};")
                 msg = f"Table {road_table} dropped successfully."
                 delete_geoserver_layer(road_table)
+                invalidate_road_graph(metadata.id)
+                invalidate_tiles("jalan", metadata.id)
+                remove_contractions(metadata.id)
+                # The precomputes are deleted with the metadata, their arrays are not
+                remove_zonasi_precomputes(
+                    ZonasiPrecompute.objects.filter(jalan_metadata=metadata)
+                )
             else:
                 msg = "No associated road_table to drop."
         except Exception as e:
@@ -99,31 +126,25 @@ class JalanUpload(generics.CreateAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Process the file based on its format
         try:
             # Save metadata (name, description) to the JalanMetadata model
             metadata = JalanMetadata.objects.create(
                 name=name, description=description, data_status="UPLOADED"
             )
 
-            if file_format == "zip":
-                # Handle shapefile in zip format
-                temp_dir = extract_zip_to_temp(file)
-                shapefile_path = find_shapefile_path(temp_dir)
-
-                # Process the shapefile (e.g., load into GeoDjango models)
-                self.process_file(shapefile_path, metadata)
-
-            elif file_format == "kml":
-                # Process KML file (e.g., parse and load into GeoDjango)
-                self.process_file(file, metadata)
-
-            elif file_format == "geojson":
-                # Process GeoJSON file (e.g., parse and load into GeoDjango)
-                self.process_file(file, metadata)
+            # The file is loaded into the road table by the job worker
+            job = enqueue_job(
+                "jalan_ingest",
+                {"metadata_id": str(metadata.id), "file_format": file_format},
+                file=file,
+            )
 
             return Response(
-                {"message": "File uploaded successfully", "metadata_id": metadata.id},
+                {
+                    "message": "File uploaded successfully",
+                    "metadata_id": metadata.id,
+                    "job_id": job.id,
+                },
                 status=status.HTTP_201_CREATED,
             )
 
@@ -132,179 +153,66 @@ class JalanUpload(generics.CreateAPIView):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def process_file(self, file_path, metadata: JalanMetadata):
-        """
-        Process the extracted file and load data into the Jalan model.
-        """
-        gdf = gpd.read_file(file_path)
-
-        if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
-            gdf = gdf.to_crs(epsg=4326)
-
-        total_bbox = gdf.total_bounds
-        metadata.bbox = Polygon.from_bbox(total_bbox)
-        metadata.save()
-
-        table_name = metadata.road_table
-        self.duplicate_tb_jalan_structure(table_name)
-
-        # Start the background thread
-        thread = Thread(target=self.iterate_and_save, args=(gdf, table_name, metadata))
-        thread.start()
-
-    def iterate_and_save(self, gdf, table_name, metadata: JalanMetadata):
-        """
-        Iterate and save road in new created table
-        """
-        metadata.data_status = "DEPLOYING"
-        metadata.save()
-
-        try:
-            for _, row in gdf.iterrows():
-
-                geo_row = row["geometry"]
-                # If the geometry is not a LineString or MultiLineString, skip
-                if geo_row.geom_type == "LineString":
-                    geometries = [geo_row]
-                elif geo_row.geom_type == "MultiLineString":
-                    # If it's a MultiLineString, break it into individual LineStrings
-                    geometries = [
-                        line for line in geo_row
-                    ]  # This will be a list of LineString objects
-                else:
-                    # Skip if it's not a valid geometry type
-                    continue
-
-                for geom in geometries:
-                    geom_2d = loads(dumps(geom, output_dimension=2))
-                    geom_wkt = geom_2d.wkt
-
-                    properties = row.drop("geometry").to_dict()
-
-                    # Insert data into the created table
-                    with connection.cursor() as cursor:
-                        cursor.execute(
-                            f"""
-                            INSERT INTO {table_name} (mline, properties, file_metadata_id)
-                            VALUES (ST_GeomFromText(%s, 4326), %s, %s)
-                        """,
-                            [
-                                geom_wkt,
-                                json.dumps(properties),
-                                metadata.id,
-                            ],
-                        )
-
-            metadata.data_status = "DEPLOYED"
-            metadata.save()
-
-            geo_layer = create_geoserver_layer(table_name, table_name)
-            if geo_layer["success"]:
-                metadata.geoserver_status = "DEPLOYED"
-            else:
-                metadata.geoserver_status = "FAILED"
-            metadata.save()
-
-        except Exception as e:
-            metadata.data_status = "FAILED"
-            metadata.save()
-            print(str(e))
-
-    def duplicate_tb_jalan_structure(self, table_name):
-        with connection.cursor() as cursor:
-            # Copy the structure of tb_jalan without data
-            cursor.execute(
-                f"""
-                CREATE TABLE {table_name} (LIKE tb_jalan INCLUDING ALL);
-            """
-            )
-            # Create indexes on the new table
-            cursor.execute(
-                f"""
-                CREATE INDEX idx_source_{table_name} ON {table_name}(source);
-                """
-            )
-            cursor.execute(
-                f"""
-                CREATE INDEX idx_target_{table_name} ON {table_name}(target);
-                """
-            )
-            cursor.execute(
-                f"""
-                CREATE INDEX idx_cost_{table_name} ON {table_name}(cost);
-                """
-            )
-            cursor.execute(
-                f"""
-                CREATE INDEX idx_reverse_cost_{table_name} ON {table_name}(reverse_cost);
-                """
-            )
-            cursor.execute(
-                f"""
-                CREATE INDEX idx_mline_{table_name} ON {table_name} USING GIST(mline);
-                """
-            )
-
 
 class JalanGenerateTopology(generics.RetrieveAPIView):
     """
-    API view to generate topology based on id
+    API view to generate topology based on id, the incremental mode only
+    processes the roads added or edited since the last topology.
+    With 'contract' (true or a list of profiles) the contraction hierarchy
+    used by the "ch" routing engine is built afterwards.
     """
 
     def put(self, request, *args, **kwargs):
         metadata_id = kwargs.get("pk")
+        mode = request.data.get("mode", "full")
+        contract = request.data.get("contract")
+
+        if mode not in ("full", "incremental"):
+            return Response(
+                {"error": "Mode invalid! Supported modes: full, incremental"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if contract in (True, "true", "1"):
+            contract = [settings.SPEED_PROFILE]
+        elif contract in (None, False, "", "false", "0"):
+            contract = None
+        elif not isinstance(contract, list) or any(
+            profile not in SPEED_PROFILES for profile in contract
+        ):
+            return Response(
+                {
+                    "error": f"'contract' must be true or a list of profiles: {', '.join(SPEED_PROFILES)}"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         try:
             metadata = JalanMetadata.objects.get(id=metadata_id)
+            if mode == "incremental" and metadata.topology_status != "CREATED":
+                return Response(
+                    {
+                        "error": "Incremental topology needs a created topology, run a full topology first."
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
             metadata.topology_status = "CREATING"
             metadata.save()
 
-            road_table = metadata.road_table
-            # Create topology 0.0001 deg = 11.1 m
-            create_topology_query = f"""
-                SELECT pgr_createTopology('{road_table}', 0.00005, 'mline', 'id');
-            """
-
-            pace = 15  # 15 minutes/km
-            speed = (1 * 1000) / (pace * 60)  # format it in m/s
-
-            # Update the cost column with the calculated values, Assuming 15 minutes per kilometer
-            update_cost_query = f"""
-                UPDATE {road_table}
-                SET cost = (ST_Length(ST_Transform(mline, 3857)) / {speed}) / 60,
-                    reverse_cost = (ST_Length(ST_Transform(mline, 3857)) / {speed}) / 60;
-            """
-
-            # Check if source, target, and cost columns are populated
-            check_query = f"""
-                SELECT id, source, target, cost, reverse_cost
-                FROM {road_table}
-                WHERE source IS NOT NULL AND target IS NOT NULL AND cost > 0
-                ORDER BY RANDOM()
-                LIMIT 10;
-            """
-
-            with connection.cursor() as cursor:
-                cursor.execute(create_topology_query)
-                cursor.execute(update_cost_query)
-
-                # Check random rows for validity
-                cursor.execute(check_query)
-                results = cursor.fetchall()
+            job = enqueue_job(
+                "jalan_topology",
+                {"metadata_id": str(metadata.id), "mode": mode, "contract": contract},
+            )
 
-            if len(results) == 10:
-                metadata.topology_status = "CREATED"
-                metadata.save()
-                return Response(
-                    {"message": "Topology created successfully", "layer": road_table},
-                    status=status.HTTP_201_CREATED,
-                )
-            else:
-                metadata.topology_status = "FAILED"
-                metadata.save()
-                raise ValueError(
-                    f"Failed to create topology, the results validity length only {len(results)}"
-                )
+            return Response(
+                {
+                    "message": "Topology creation queued",
+                    "layer": metadata.road_table,
+                    "job_id": job.id,
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
 
         except Exception as e:
             return Response(
@@ -345,51 +253,35 @@ class JalanFindRoute(generics.RetrieveAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        try:
+            engine = get_routing_engine(request)
+            profile = get_speed_profile(request)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             metadata = JalanMetadata.objects.get(id=metadata_id)
+            require_profile(metadata, profile)
             road_table = metadata.road_table
-            vertices_table = f"{road_table}_vertices_pgr"
-            # Find Routing
-            routing_query = f"""
-                WITH
-                    start_node AS (
-                        SELECT id
-                        FROM {vertices_table}
-                        ORDER BY the_geom <-> ST_SetSRID(ST_Point({start_lon}, {start_lat}), 4326)
-                        LIMIT 1
-                    ),
-                    end_node AS (
-                        SELECT id
-                        FROM {vertices_table}
-                        ORDER BY the_geom <-> ST_SetSRID(ST_Point({end_lon}, {end_lat}), 4326)
-                        LIMIT 1
-                    ),
-                    path AS (
-                        SELECT * 
-                        FROM pgr_dijkstra(
-                            'SELECT id, source, target, cost, reverse_cost FROM {road_table}',
-                            (SELECT id FROM start_node),
-                            (SELECT id FROM end_node),
-                            directed := false
-                        )
-                    ),
-                    list AS (
-                        SELECT p.*, e.mline
-                            FROM path p
-                            JOIN {road_table} e ON e.id = p.edge
-                            ORDER BY p.seq
-                    )
 
-                SELECT ST_AsGeoJSON(ST_LineMerge(ST_Union(mline))) AS geojson from list		
-            """
+            # Snap both coordinates to their nearest topology vertex
+            vertex_ids, vertex_coords = get_snap_index(metadata).nearest(
+                [start_lon, end_lon], [start_lat, end_lat]
+            )
+            start_vid, end_vid = int(vertex_ids[0]), int(vertex_ids[1])
 
-            with connection.cursor() as cursor:
-                cursor.execute(routing_query)
-                result = cursor.fetchone()
+            if engine == "graph":
+                result = self.find_route_graph(metadata, start_vid, end_vid, profile)
+            elif engine == "ch":
+                result = self.find_route_ch(metadata, start_vid, end_vid, profile)
+            else:
+                result = self.find_route_pgrouting(
+                    road_table, start_vid, end_vid, profile, vertex_coords
+                )
 
             if result and result[0]:
                 geometry = json.loads(result[0])
-                geo_length = geojson_line_length(geometry)
+                geo_length = float(geojson_line_lengths([geometry])[0])
                 res_features = {
                     "type": "Feature",
                     "properties": {
@@ -398,8 +290,9 @@ class JalanFindRoute(generics.RetrieveAPIView):
                         "end_lat": end_lat,
                         "end_lon": end_lon,
                         "name": "Route",
+                        "profile": profile,
                         "length": geo_length,
-                        "time": round(15 * geo_length, 1),
+                        "time": round(float(result[1]), 1),
                     },
                     "geometry": geometry,
                 }
@@ -420,6 +313,83 @@ class JalanFindRoute(generics.RetrieveAPIView):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def find_route_pgrouting(
+        self,
+        road_table: str,
+        start_vid: int,
+        end_vid: int,
+        profile: str,
+        vertex_coords,
+    ):
+        """
+        Find route (GeoJSON, travel time) with pgr_dijkstra, only loading the roads
+        of a window around the start and end vertices
+        """
+
+        def search(bounds):
+            routing_query = f"""
+                WITH
+                    path AS (
+                        SELECT * 
+                        FROM pgr_dijkstra(
+                            '{edges_sql(road_table, profile, bounds)}',
+                            %s::bigint,
+                            %s::bigint,
+                            directed := {str(is_directed(profile)).lower()}
+                        )
+                    ),
+                    list AS (
+                        SELECT p.*, e.mline
+                            FROM path p
+                            JOIN {road_table} e ON e.id = p.edge
+                            ORDER BY p.seq
+                    )
+
+                SELECT ST_AsGeoJSON(ST_LineMerge(ST_Union(mline))) AS geojson, SUM(cost) from list		
+            """
+
+            with connection.cursor() as cursor:
+                cursor.execute(routing_query, [start_vid, end_vid])
+                return cursor.fetchone()
+
+        return search_route_windows(
+            road_table,
+            "pgr_dijkstra",
+            vertex_coords[:, 0],
+            vertex_coords[:, 1],
+            search,
+            found=lambda result: bool(result and result[0]),
+        )
+
+    def find_route_graph(
+        self, metadata: JalanMetadata, start_vid: int, end_vid: int, profile: str
+    ):
+        """
+        Find route (GeoJSON, travel time) with the cached in-process road graph
+        """
+        graph = get_road_graph(metadata, profile)
+        path = graph.shortest_path(start_vid, end_vid, directed=is_directed(profile))
+        if path is None or not path[0]:
+            return None
+        edge_ids, cost = path
+        return route_geojson(metadata.road_table, edge_ids), cost
+
+    def find_route_ch(
+        self, metadata: JalanMetadata, start_vid: int, end_vid: int, profile: str
+    ):
+        """
+        Find route (GeoJSON, travel time) with the contraction hierarchy, the
+        hierarchy is directed and walking costs are the same both ways
+        """
+        graph = get_road_graph(metadata, profile)
+        path = get_contraction(metadata, profile).shortest_path(
+            graph, start_vid, end_vid
+        )
+        if path is None or not path[0]:
+            return None
+        edge_ids, cost = path
+        return route_geojson(metadata.road_table, edge_ids), cost
+
 
 class JalanFindIsochrone(generics.RetrieveAPIView):
     """
@@ -444,51 +414,42 @@ class JalanFindIsochrone(generics.RetrieveAPIView):
             )
 
         try:
-            metadata = JalanMetadata.objects.get(id=metadata_id)
-            road_table = metadata.road_table
-            vertices_table = f"{road_table}_vertices_pgr"
-            # Find nearest node
-            find_node = f"""
-                SELECT ST_AsGeoJSON(the_geom) AS geojson
-                        FROM {vertices_table}
-                        ORDER BY the_geom <-> ST_SetSRID(ST_Point({lon}, {lat}), 4326)
-                        LIMIT 5;
-            """
+            engine = get_routing_engine(request)
+            hull_engine = get_hull_engine(request)
+            profile = get_speed_profile(request)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create isochrone query
-            create_isochrone = f"""
-                WITH
-                    start_node AS (
-                        SELECT id
-                        FROM {vertices_table}
-                        ORDER BY the_geom <-> ST_SetSRID(ST_Point({lon}, {lat}), 4326)
-                        LIMIT 1
-                    )
-
-                SELECT ST_AsGeoJSON(isochrone_polygon) AS geojson
-                FROM (
-                    SELECT ST_Buffer(merged_lines, 0.0002) AS isochrone_polygon
-                        FROM (
-                            SELECT ST_Union(w.mline) AS merged_lines
-                            FROM pgr_drivingDistance(
-                                'SELECT id, source, target, cost, reverse_cost FROM {road_table}',
-                                (SELECT id FROM start_node),
-                               {time}
-                            ) AS r
-                            JOIN {road_table} AS w ON r.edge = w.id
-                        ) AS subquery
-                ) AS final_result;
-            """
+        try:
+            metadata = JalanMetadata.objects.get(id=metadata_id)
+            require_profile(metadata, profile)
+            # Find nearest nodes, the first one is the start node
+            node_ids, node_coords = get_snap_index(metadata).nearest(
+                [float(lon)], [float(lat)], k=5
+            )
+            start_vid = int(node_ids[0, 0])
 
-            with connection.cursor() as cursor:
-                cursor.execute(find_node)
-                out_point = cursor.fetchall()
-                cursor.execute(create_isochrone)
-                result = cursor.fetchone()
+            # Parents of the same neighbourhood snap to the same start node
+            cache_key = isochrone_cache_key(
+                f"jalan-{profile}", metadata, start_vid, time, hull_engine
+            )
+            isochrone = get_cached_isochrone(cache_key)
+            if isochrone is None:
+                isochrone = self.create_isochrone(
+                    metadata,
+                    engine,
+                    hull_engine,
+                    start_vid,
+                    node_coords[0, 0],
+                    float(time),
+                    profile,
+                )
+                if isochrone:
+                    set_cached_isochrone(cache_key, isochrone)
 
-            if result and result[0]:
-                geojson_buffer = json.loads(result[0])
-                concave_geojson = create_concave_hull(geojson_buffer, 0.003, 20)
+            if isochrone:
+                geojson_buffer = json.loads(isochrone["buffer"])
+                concave_geojson = isochrone["concave"]
 
                 res_concave = {
                     "type": "Feature",
@@ -514,9 +475,9 @@ class JalanFindIsochrone(generics.RetrieveAPIView):
                     {
                         "type": "Feature",
                         "properties": {"name": "PT", "idx": idx},
-                        "geometry": json.loads(row[0]),
+                        "geometry": {"type": "Point", "coordinates": coords.tolist()},
                     }
-                    for idx, row in enumerate(out_point)
+                    for idx, coords in enumerate(node_coords[0])
                 ]
                 res_features = []
                 if "isochrone" in filter:
@@ -542,3 +503,89 @@ class JalanFindIsochrone(generics.RetrieveAPIView):
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    def create_isochrone(
+        self,
+        metadata: JalanMetadata,
+        engine: str,
+        hull_engine: str,
+        start_vid: int,
+        start_coords,
+        time,
+        profile: str,
+    ):
+        """
+        Create the isochrone buffer and its concave hull GeoJSON strings
+        """
+        road_table = metadata.road_table
+        # Roads out of reach at the profile max speed are not loaded
+        bounds = reach_window(*start_coords, time, profile)
+        # Concave hull computed by PostGIS in the buffer query, 20 m buffer
+        hull_buffer = 20 if hull_engine == "postgis" else None
+
+        # Create isochrone query
+        hull_sql = "NULL"
+        if hull_buffer is not None:
+            hull_sql = concave_hull_sql("isochrone_polygon", hull_buffer)
+
+        create_isochrone = f"""
+            SELECT ST_AsGeoJSON(isochrone_polygon) AS geojson, {hull_sql} AS concave
+            FROM (
+                SELECT ST_Buffer(merged_lines, 0.0002) AS isochrone_polygon
+                    FROM (
+                        SELECT ST_Union(w.mline) AS merged_lines
+                        FROM pgr_drivingDistance(
+                            '{edges_sql(road_table, profile, bounds)}',
+                            %s::bigint,
+                           {time}
+                        ) AS r
+                        JOIN {road_table} AS w ON r.edge = w.id
+                    ) AS subquery
+            ) AS final_result;
+        """
+
+        # The contraction hierarchy only answers point to point queries
+        if engine in ("graph", "ch"):
+            result = self.create_isochrone_graph(
+                metadata, start_vid, float(time), profile, hull_buffer
+            )
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(create_isochrone, [start_vid])
+                result = cursor.fetchone()
+            record_window(
+                road_table,
+                "pgr_drivingDistance",
+                bounds,
+                1,
+                bool(result and result[0]),
+            )
+
+        if not result or not result[0]:
+            return None
+
+        concave_geojson = result[1]
+        if concave_geojson is None:
+            concave_geojson = create_concave_hull(
+                json.loads(result[0]), 0.003, 20, engine=hull_engine
+            )
+        return {"buffer": result[0], "concave": concave_geojson}
+
+    def create_isochrone_graph(
+        self,
+        metadata: JalanMetadata,
+        start_vid: int,
+        time: float,
+        profile: str,
+        hull_buffer=None,
+    ):
+        """
+        Create isochrone buffer with the cached in-process road graph
+        """
+        graph = get_road_graph(metadata, profile)
+
+        _, edges, _ = graph.driving_distance(start_vid, time)
+        edges = edges[edges >= 0]
+        if len(edges) == 0:
+            return None
+        return isochrone_buffer_geojson(metadata.road_table, edges, hull_buffer)
@@ -0,0 +1,118 @@
+import os
+import socket
+import time
+import django
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from job.models import Job
+from job.queue import (
+    claim_next_job,
+    requeue_running_jobs,
+    requeue_stale_jobs,
+    run_job,
+)
+
+
+class Command(BaseCommand):
+    help = "Run queued jobs (uploads, topology, zonasi batch) with a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOB_CONCURRENCY,
+            help="Maximum number of jobs running at the same time on this node",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2,
+            help="Seconds between two polls of the job table",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop when the queue is empty instead of waiting for new jobs",
+        )
+
+    def new_pool(self, concurrency: int):
+        return ProcessPoolExecutor(
+            max_workers=concurrency,
+            mp_context=get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Job worker {worker} started, concurrency {concurrency}")
+
+        # Every job runs in a fresh process, it must not share the parent connection
+        connections.close_all()
+        running = {}  # future -> job id
+        pool = self.new_pool(concurrency)
+
+        try:
+            while True:
+                requeued, failed = requeue_stale_jobs()
+                if requeued or failed:
+                    self.stdout.write(
+                        f"Interrupted jobs: {requeued} queued again, {failed} failed"
+                    )
+
+                # A child killed (out of memory, segfault) breaks the whole pool
+                broken = False
+                unsubmitted = []
+                for future in [future for future in running if future.done()]:
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        broken = True
+                        continue
+                    job_id = running.pop(future)
+                    if future.exception() is not None:
+                        self.stderr.write(f"Job {job_id} crashed: {future.exception()}")
+
+                # Long running jobs may not report progress, keep them alive
+                if running and not broken:
+                    Job.objects.filter(
+                        id__in=list(running.values()), status="RUNNING"
+                    ).update(heartbeat_at=timezone.now())
+
+                while len(running) < concurrency and not broken:
+                    job = claim_next_job(worker)
+                    if job is None:
+                        break
+                    self.stdout.write(f"Job {job.id} ({job.type}) started")
+                    try:
+                        running[pool.submit(run_job, str(job.id))] = job.id
+                    except BrokenProcessPool:
+                        broken = True
+                        unsubmitted.append(job.id)
+
+                if broken:
+                    # The job that killed the pool is unknown, every job it ran
+                    # and not finished goes back to the queue (up to JOB_MAX_ATTEMPTS)
+                    requeued, failed = requeue_running_jobs(
+                        Job.objects.filter(id__in=[*running.values(), *unsubmitted]),
+                        "Worker process died, job queued again",
+                        "Worker process died too many times",
+                    )
+                    self.stderr.write(
+                        f"Process pool broken: {requeued} jobs queued again, "
+                        f"{failed} failed, restarting the pool"
+                    )
+                    running.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.new_pool(concurrency)
+
+                elif options["once"] and not running:
+                    break
+
+                connections.close_all()
+                time.sleep(options["poll_interval"])
+        finally:
+            pool.shutdown()
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-17 11:20
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("type", models.CharField(max_length=50)),
+                ("status", models.CharField(max_length=50)),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                ("result", models.JSONField(blank=True, null=True)),
+                ("progress", models.FloatField(default=0)),
+                (
+                    "message",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                (
+                    "worker",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("heartbeat_at", models.DateTimeField(blank=True, null=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "tb_job",
+                "indexes": [
+                    models.Index(fields=["status", "created_at"], name="job_status_idx")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import models
+import uuid
+
+
+class Job(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    type = models.CharField(max_length=50)  # handler name, see job.queue.register_job
+    status = models.CharField(max_length=50)  # QUEUED | RUNNING | DONE | FAILED
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    progress = models.FloatField(default=0)  # percent
+    message = models.CharField(max_length=255, blank=True, default="")
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True, default="")  # host:pid
+
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.type} - {self.id}"
+
+    class Meta:
+        db_table = "tb_job"
+        indexes = [models.Index(fields=["status", "created_at"], name="job_status_idx")]
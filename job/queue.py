@@ -0,0 +1,182 @@
+import logging
+import os
+import shutil
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job type -> handler, filled by register_job from the jobs.py module of every app
+JOB_HANDLERS = {}
+
+
+def register_job(job_type: str):
+    """
+    Register a function as the handler of a job type.
+
+    The handler is called as handler(context, **payload) inside a worker process,
+    its return value is saved as the job result. A handler may run again from the
+    beginning when its worker was interrupted, so it has to be restart-safe.
+    """
+
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+
+    return decorator
+
+
+class JobContext:
+    """
+    Handle given to a job handler to report its progress
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.result = None
+
+    def progress(self, progress: float, message: str = None):
+        """
+        Save the progress (percent) of the job, also used as heartbeat
+        """
+        now = timezone.now()
+        fields = {
+            "progress": round(progress, 1),
+            "heartbeat_at": now,
+            "updated_at": now,
+        }
+        if message is not None:
+            fields["message"] = message[:255]
+        Job.objects.filter(id=self.job.id).update(**fields)
+
+
+def job_upload_dir(job_id):
+    return os.path.join(settings.JOB_UPLOAD_DIR, str(job_id))
+
+
+def save_job_file(job_id, file):
+    """
+    Save an uploaded file where the worker can read it, return its path
+    """
+    upload_dir = job_upload_dir(job_id)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    file_path = os.path.join(upload_dir, os.path.basename(file.name))
+    with open(file_path, "wb") as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    return file_path
+
+
+def enqueue_job(job_type: str, payload: dict = None, file=None):
+    """
+    Queue a job, the uploaded file (if any) is saved and its path is given
+    to the handler as the 'file_path' payload
+    """
+    job = Job(type=job_type, status="QUEUED", payload=payload or {})
+    if file is not None:
+        job.payload["file_path"] = save_job_file(job.id, file)
+    job.save()
+    return job
+
+
+def claim_next_job(worker: str):
+    """
+    Mark the oldest queued job as running for a worker, None when the queue is empty
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status="QUEUED")
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        now = timezone.now()
+        job.status = "RUNNING"
+        job.worker = worker
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.save()
+    return job
+
+
+def requeue_running_jobs(jobs, message: str, failed_message: str):
+    """
+    Queue again the running jobs of a queryset, fail them once they were
+    interrupted JOB_MAX_ATTEMPTS times
+    """
+    now = timezone.now()
+    running = jobs.filter(status="RUNNING")
+    requeued = running.filter(attempts__lt=settings.JOB_MAX_ATTEMPTS).update(
+        status="QUEUED",
+        worker="",
+        message=message,
+        updated_at=now,
+    )
+    failed = running.update(
+        status="FAILED",
+        message=failed_message,
+        finished_at=now,
+        updated_at=now,
+    )
+    return requeued, failed
+
+
+def requeue_stale_jobs():
+    """
+    Queue again the running jobs whose worker stopped sending heartbeat
+    """
+    stale = Job.objects.filter(
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    )
+    return requeue_running_jobs(
+        stale,
+        "Worker interrupted, job queued again",
+        "Worker interrupted too many times",
+    )
+
+
+def run_job(job_id):
+    """
+    Run a claimed job, called inside a worker process
+    """
+    job = Job.objects.get(id=job_id)
+    context = JobContext(job)
+
+    try:
+        handler = JOB_HANDLERS.get(job.type)
+        if handler is None:
+            raise ValueError(f"No handler registered for job type '{job.type}'")
+
+        result = handler(context, **job.payload)
+        now = timezone.now()
+        Job.objects.filter(id=job.id).update(
+            status="DONE",
+            progress=100,
+            result=result if result is not None else context.result,
+            finished_at=now,
+            updated_at=now,
+        )
+        shutil.rmtree(job_upload_dir(job.id), ignore_errors=True)
+
+    except Exception as e:
+        now = timezone.now()
+        Job.objects.filter(id=job.id).update(
+            status="FAILED",
+            message=str(e)[:255],
+            result=context.result,
+            finished_at=now,
+            updated_at=now,
+        )
+        shutil.rmtree(job_upload_dir(job.id), ignore_errors=True)
+        logger.exception("Job %s (%s) failed", job.id, job.type)
+
+    finally:
+        connections.close_all()
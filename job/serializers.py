@@ -0,0 +1,23 @@
+from rest_framework import serializers
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = (
+            "id",
+            "type",
+            "status",
+            "payload",
+            "result",
+            "progress",
+            "message",
+            "attempts",
+            "worker",
+            "heartbeat_at",
+            "started_at",
+            "finished_at",
+            "created_at",
+            "updated_at",
+        )
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import JobList, JobDetail
+
+urlpatterns = [
+    path("job/", JobList.as_view(), name="job-list"),
+    path("job/<str:pk>/", JobDetail.as_view(), name="job-detail"),
+]
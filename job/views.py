@@ -0,0 +1,23 @@
+from rest_framework import generics
+from .models import Job
+from .serializers import JobSerializer
+
+
+class JobList(generics.ListAPIView):
+    queryset = Job.objects.all().order_by("-created_at")
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        job_status = self.request.query_params.get("status")
+        job_type = self.request.query_params.get("type")
+        if job_status:
+            queryset = queryset.filter(status=job_status)
+        if job_type:
+            queryset = queryset.filter(type=job_type)
+        return queryset
+
+
+class JobDetail(generics.RetrieveAPIView):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.contrib.gis.geos import Point
+from geodjango.utils import (
+    iter_csv_rows,
+    bulk_create_csv_rows,
+    parse_date,
+    parse_lat_lon,
+)
+from job.queue import register_job
+from .models import PesertaDidik, PesertaDidikMetadata
+
+
+@register_job("peserta_didik_upload")
+def peserta_didik_upload(context, metadata_id, file_path):
+    """
+    Load the rows of an uploaded csv file into the PesertaDidik model
+    """
+    metadata = PesertaDidikMetadata.objects.get(id=metadata_id)
+
+    with open(file_path, "rb") as file, transaction.atomic():
+        # Rows saved by an interrupted run of this job are loaded again
+        PesertaDidik.objects.filter(file_metadata=metadata).delete()
+
+        result = bulk_create_csv_rows(
+            iter_csv_rows(file),
+            PesertaDidik,
+            lambda row: build_peserta_didik(row, metadata),
+        )
+        context.result = {
+            "count": result["count"],
+            "skipped": result["skipped"],
+            "errors": result["errors"],
+        }
+
+        if result["count"] > 0:
+            metadata.bbox = result["bbox"]
+            metadata.save()
+
+    # Deleted after the transaction, the error raised would roll the delete back
+    if result["count"] == 0:
+        metadata.delete()
+        raise ValueError("No valid row found in the file.")
+
+    return context.result
+
+
+def build_peserta_didik(row, metadata: PesertaDidikMetadata):
+    """
+    Build a PesertaDidik instance from a CSV row
+    """
+    lat, lon = parse_lat_lon(row)
+
+    return PesertaDidik(
+        nisn=row.get("nisn"),
+        nama=row.get("nama"),
+        jenis_kelamin=row.get("jenis_kelamin"),
+        tanggal_lahir=parse_date(row.get("tanggal_lahir")),
+        alamat=row.get("alamat"),
+        prioritas=int(row.get("prioritas") or 0),
+        keterangan=row.get("keterangan"),
+        lat=lat,
+        lon=lon,
+        point=Point(lon, lat),
+        file_metadata=metadata,
+    )
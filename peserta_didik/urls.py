@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     PesertaDidikDetail,
     PesertaDidikListByMetadataId,
+    PesertaDidikGeoJSON,
     PesertaDidikMetadataList,
     PesertaDidikMetadataDetail,
     PesertaDidikUpload,
@@ -35,6 +36,11 @@ urlpatterns = [
         PesertaDidikListByMetadataId.as_view(),
         name="peserta-didik-list-by-metadata-id",
     ),
+    path(
+        "peserta-didik/geojson/<str:pk>/",
+        PesertaDidikGeoJSON.as_view(),
+        name="peserta-didik-geojson",
+    ),
     path(
         "peserta-didik/detail/<int:pk>/",
         PesertaDidikDetail.as_view(),
@@ -1,5 +1,6 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
+from django.db.models.functions import JSONObject
 from django.contrib.gis.geos import Point
 from .models import PesertaDidik, PesertaDidikMetadata
 from .serializers import (
@@ -8,7 +9,14 @@ from .serializers import (
     PesertaDidikDetailSerializerWithMetadata,
     PesertaDidikMetadataWithDataSerializer,
 )
-from geodjango.utils import csv_to_dict, calculate_bbox_from_csv_points, parse_date
+from geodjango.utils import (
+    parse_date,
+    stream_feature_collection,
+    filter_by_area,
+    KeysetPagination,
+)
+from job.queue import enqueue_job
+from tiles.mvt import invalidate_tiles
 
 
 class PesertaDidikMetadataList(generics.ListAPIView):
@@ -20,6 +28,10 @@ class PesertaDidikMetadataDelete(generics.DestroyAPIView):
     queryset = PesertaDidikMetadata.objects.all()
     serializer_class = PesertaDidikMetadataSerializer
 
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_tiles("peserta_didik", instance.id)
+
 
 class PesertaDidikMetadataDetail(generics.RetrieveAPIView):
     queryset = PesertaDidikMetadata.objects.all()
@@ -39,6 +51,19 @@ class PesertaDidikListByMetadataId(generics.RetrieveAPIView):
             file_metadata=metadata_instance
         ).order_by("created_at")
 
+        try:
+            peserta_didik_queryset = filter_by_area(
+                peserta_didik_queryset, "point", request
+            )
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # A page ordered by id when the request asks for one
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(peserta_didik_queryset, request, view=self)
+        if page is not None:
+            peserta_didik_queryset = page
+
         # Serialize the PesertaDidik instances
         peserta_didik_serializer = PesertaDidikDetailSerializer(
             peserta_didik_queryset, many=True
@@ -52,10 +77,51 @@ class PesertaDidikListByMetadataId(generics.RetrieveAPIView):
         response_data["data"] = (
             peserta_didik_serializer.data
         )  # Add list of PesertaDidik under 'data'
+        if page is not None:
+            response_data["next"] = paginator.get_next_link()
+            response_data["previous"] = paginator.get_previous_link()
 
         return Response(response_data)
 
 
+class PesertaDidikGeoJSON(generics.RetrieveAPIView):
+    """
+    API view to stream the peserta didik of a metadata as a GeoJSON FeatureCollection
+    """
+
+    queryset = PesertaDidikMetadata.objects.all()
+    serializer_class = PesertaDidikMetadataSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        metadata_instance = self.get_object()
+
+        try:
+            peserta_didik_queryset = filter_by_area(
+                PesertaDidik.objects.filter(file_metadata=metadata_instance),
+                "point",
+                request,
+            )
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return stream_feature_collection(
+            self.get_serializer(metadata_instance).data,
+            peserta_didik_queryset.order_by("created_at"),
+            "point",
+            JSONObject(
+                nisn="nisn",
+                nama="nama",
+                jenis_kelamin="jenis_kelamin",
+                tanggal_lahir="tanggal_lahir",
+                alamat="alamat",
+                prioritas="prioritas",
+                keterangan="keterangan",
+                lat="lat",
+                lon="lon",
+            ),
+        )
+
+
 class PesertaDidikDetail(generics.RetrieveAPIView):
     queryset = PesertaDidik.objects.all()
     serializer_class = PesertaDidikDetailSerializerWithMetadata
@@ -90,36 +156,22 @@ class PesertaDidikUpload(generics.CreateAPIView):
 
         # Process the file
         try:
-            csv_data = csv_to_dict(file)
-            bbox = calculate_bbox_from_csv_points(csv_data)
             # Save metadata (name, description) to the PesertaDidikMetadata model
             metadata = PesertaDidikMetadata.objects.create(
-                name=name, level=level, description=description, bbox=bbox
+                name=name, level=level, description=description
             )
 
-            for row in csv_data:
-                lat = round(float(row["lat"]), 6)
-                lon = round(float(row["lon"]), 6)
-
-                # Create and save the Point to the database
-                point = Point(lon, lat)
-                peserta_didik = PesertaDidik(
-                    nisn=row.get("nisn"),
-                    nama=row.get("nama"),
-                    jenis_kelamin=row.get("jenis_kelamin"),
-                    tanggal_lahir=parse_date(row.get("tanggal_lahir")),
-                    alamat=row.get("alamat"),
-                    prioritas=int(row.get("prioritas", 0)),
-                    keterangan=row.get("keterangan"),
-                    lat=lat,
-                    lon=lon,
-                    point=point,
-                    file_metadata=metadata,
-                )
-                peserta_didik.save()
+            # The rows are loaded by the job worker
+            job = enqueue_job(
+                "peserta_didik_upload", {"metadata_id": str(metadata.id)}, file=file
+            )
 
             return Response(
-                {"message": "File uploaded successfully", "metadata_id": metadata.id},
+                {
+                    "message": "File uploaded successfully",
+                    "metadata_id": metadata.id,
+                    "job_id": job.id,
+                },
                 status=status.HTTP_201_CREATED,
             )
 
@@ -139,6 +191,11 @@ class PesertaDidikDatumDelete(generics.DestroyAPIView):
         # Filter the PesertaDidik objects by file_metadata_id and id
         return PesertaDidik.objects.filter(file_metadata_id=metadata_id, id=pk)
 
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        # A new updated_at invalidates the cached tiles of the layer
+        instance.file_metadata.save(update_fields=["updated_at"])
+
 
 class PesertaDidikDatumAdd(generics.CreateAPIView):
     """
@@ -196,6 +253,8 @@ class PesertaDidikDatumAdd(generics.CreateAPIView):
                 file_metadata=metadata,
             )
             peserta_didik.save()
+            # A new updated_at invalidates the cached tiles of the layer
+            metadata.save(update_fields=["updated_at"])
 
             return Response(
                 {
@@ -279,6 +338,8 @@ class PesertaDidikDatumEdit(generics.RetrieveAPIView):
             peserta_didik.lon = lon
             peserta_didik.point = Point(lon, lat)  # Update the Point field
             peserta_didik.save()
+            # A new updated_at invalidates the cached tiles of the layer
+            metadata.save(update_fields=["updated_at"])
 
             return Response(
                 {
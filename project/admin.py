@@ -1,4 +1,14 @@
 from django.contrib import admin
-from .models import ProjectMetadata
+from .models import (
+    ProjectMetadata,
+    ZonasiBatchMetadata,
+    ZonasiBatch,
+    SekolahVertex,
+    ZonasiPrecompute,
+)
 
 admin.site.register(ProjectMetadata, admin.ModelAdmin)
+admin.site.register(ZonasiBatchMetadata, admin.ModelAdmin)
+admin.site.register(ZonasiBatch, admin.ModelAdmin)
+admin.site.register(SekolahVertex, admin.ModelAdmin)
+admin.site.register(ZonasiPrecompute, admin.ModelAdmin)
@@ -0,0 +1,195 @@
+import os
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from jalan.routing import get_road_graph, get_snap_index
+from job.queue import register_job
+from peserta_didik.models import PesertaDidik
+from sekolah.models import Sekolah
+from .models import ZonasiBatchMetadata, ZonasiBatch, ZonasiPrecompute
+from .precompute import ZonasiTable, layer_versions
+from .views import get_project_layers, get_sekolah_vertices
+
+# Number of sekolah searched before the ranking is merged
+SEKOLAH_CHUNK = 16
+INSERT_BATCH_SIZE = 5000
+
+
+@register_job("zonasi_batch")
+def zonasi_batch(context, batch_id):
+    """
+    Compute the travel time of every peserta didik to every sekolah and save the ranking
+    """
+    batch = ZonasiBatchMetadata.objects.get(id=batch_id)
+    batch.status = "RUNNING"
+    batch.save()
+
+    try:
+        jalan_metadata, list_sekolah_metadata = get_project_layers(batch.project)
+        graph = get_road_graph(jalan_metadata)
+
+        sekolah_vertices = get_sekolah_vertices(
+            jalan_metadata,
+            Sekolah.objects.filter(file_metadata__in=list_sekolah_metadata),
+        )
+        sekolah_ids = np.fromiter(sekolah_vertices.keys(), dtype=np.int64)
+        sekolah_vids = np.fromiter(sekolah_vertices.values(), dtype=np.int64)
+
+        list_peserta = np.array(
+            PesertaDidik.objects.filter(
+                file_metadata_id=batch.peserta_didik_metadata_id,
+                lat__isnull=False,
+                lon__isnull=False,
+            )
+            .order_by("id")
+            .values_list("id", "lon", "lat"),
+            dtype=np.float64,
+        ).reshape(-1, 3)
+        peserta_ids = list_peserta[:, 0].astype(np.int64)
+        peserta_vids, _ = get_snap_index(jalan_metadata).nearest(
+            list_peserta[:, 1], list_peserta[:, 2]
+        )
+        if len(sekolah_ids) == 0 or len(peserta_ids) == 0:
+            raise ValueError("Sekolah or Peserta Didik data is empty!")
+
+        # Best ranked sekolah of every peserta didik, merged chunk by chunk
+        best_time = np.empty((len(peserta_ids), 0))
+        best_route = np.empty((len(peserta_ids), 0))
+        best_sekolah = np.empty((len(peserta_ids), 0), dtype=np.int64)
+
+        for start in range(0, len(sekolah_ids), SEKOLAH_CHUNK):
+            chunk = slice(start, start + SEKOLAH_CHUNK)
+            times, routes = graph.travel_matrix(
+                sekolah_vids[chunk], peserta_vids, max_cost=batch.max_time
+            )
+
+            all_time = np.hstack([best_time, times.T])
+            all_route = np.hstack([best_route, routes.T])
+            all_sekolah = np.hstack(
+                [
+                    best_sekolah,
+                    np.broadcast_to(
+                        sekolah_ids[chunk], (len(peserta_ids), times.shape[0])
+                    ),
+                ]
+            )
+            order = np.argsort(all_time, axis=1, kind="stable")[:, : batch.max_rank]
+            best_time = np.take_along_axis(all_time, order, axis=1)
+            best_route = np.take_along_axis(all_route, order, axis=1)
+            best_sekolah = np.take_along_axis(all_sekolah, order, axis=1)
+
+            # Routing takes most of the job, saving the result takes the rest
+            searched = min(start + SEKOLAH_CHUNK, len(sekolah_ids))
+            batch.progress = round(90 * searched / len(sekolah_ids), 1)
+            batch.save()
+            context.progress(batch.progress)
+
+        save_batch(batch, peserta_ids, best_sekolah, best_time, best_route)
+
+        batch.status = "DONE"
+        batch.progress = 100
+        batch.save()
+        return {"batch_id": str(batch.id), "peserta_didik": len(peserta_ids)}
+
+    except Exception as e:
+        batch.status = "FAILED"
+        batch.message = str(e)[:255]
+        batch.save()
+        raise
+
+
+def save_batch(batch, peserta_ids, best_sekolah, best_time, best_route):
+    """
+    Save the ranked sekolah of every peserta didik and compute the radius
+    """
+    # Rows saved by an interrupted run of this job are computed again
+    ZonasiBatch.objects.filter(file_metadata=batch).delete()
+
+    rows, ranks = np.nonzero(np.isfinite(best_time))
+    list_zonasi = [
+        ZonasiBatch(
+            file_metadata=batch,
+            peserta_didik_id=int(peserta_ids[row]),
+            sekolah_id=int(best_sekolah[row, rank]),
+            rank=int(rank) + 1,
+            time=round(float(best_time[row, rank]), 2),
+            route=round(float(best_route[row, rank]) / 1000, 3),
+        )
+        for row, rank in zip(rows, ranks)
+    ]
+    ZonasiBatch.objects.bulk_create(list_zonasi, batch_size=INSERT_BATCH_SIZE)
+
+    # Straight line distance between peserta didik and sekolah in meters
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE tb_zonasi_batch AS z
+            SET radius = ST_Distance(p.point::geography, s.point::geography)
+            FROM tb_peserta_didik AS p, tb_sekolah AS s
+            WHERE z.peserta_didik_id = p.id
+                AND z.sekolah_id = s.id
+                AND z.file_metadata_id = %s;
+        """,
+            [str(batch.id)],
+        )
+
+
+@register_job("zonasi_precompute")
+def zonasi_precompute(context, precompute_id):
+    """
+    Compute the travel time of every road vertex to every sekolah of a project
+    """
+    precompute = ZonasiPrecompute.objects.get(id=precompute_id)
+    precompute.status = "RUNNING"
+    precompute.message = ""
+    precompute.save()
+
+    try:
+        jalan_metadata, list_sekolah_metadata = get_project_layers(precompute.project)
+        # Versions read before the search, a layer saved meanwhile makes it outdated
+        jalan_version, sekolah_version = layer_versions(
+            jalan_metadata, list_sekolah_metadata
+        )
+        graph = get_road_graph(jalan_metadata)
+
+        sekolah_vertices = get_sekolah_vertices(
+            jalan_metadata,
+            Sekolah.objects.filter(file_metadata__in=list_sekolah_metadata),
+        )
+        sekolah_ids = np.fromiter(sekolah_vertices.keys(), dtype=np.int64)
+        sekolah_vids = np.fromiter(sekolah_vertices.values(), dtype=np.int64)
+        if len(sekolah_ids) == 0:
+            raise ValueError("Sekolah data is empty!")
+
+        table = ZonasiTable.build(
+            graph,
+            sekolah_ids,
+            sekolah_vids,
+            precompute.max_time,
+            progress=lambda searched: context.progress(
+                90 * searched / len(sekolah_ids), f"{searched} sekolah searched"
+            ),
+        )
+
+        path = os.path.join(settings.ZONASI_PRECOMPUTE_DIR, str(precompute.id))
+        table.save(path)
+
+        precompute.jalan_metadata = jalan_metadata
+        precompute.jalan_version = jalan_version
+        precompute.sekolah_version = sekolah_version
+        precompute.path = path
+        precompute.vertex_count = len(table.node_ids)
+        precompute.entry_count = table.entry_count
+        precompute.status = "DONE"
+        precompute.save()
+        return {
+            "precompute_id": str(precompute.id),
+            "vertex_count": precompute.vertex_count,
+            "entry_count": precompute.entry_count,
+        }
+
+    except Exception as e:
+        precompute.status = "FAILED"
+        precompute.message = str(e)[:255]
+        precompute.save()
+        raise
@@ -0,0 +1,97 @@
+# Generated by Django 5.1.3 on 2026-10-17 09:12
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("peserta_didik", "0001_initial"),
+        ("project", "0002_rename_layer_projectmetadata_layers"),
+        ("sekolah", "0003_sekolahmetadata_zonasi"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ZonasiBatchMetadata",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("max_time", models.FloatField(default=60)),
+                ("max_rank", models.IntegerField(default=5)),
+                ("status", models.CharField(max_length=50)),
+                ("progress", models.FloatField(default=0)),
+                (
+                    "message",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "peserta_didik_metadata",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zonasi_batch",
+                        to="peserta_didik.pesertadidikmetadata",
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zonasi_batch",
+                        to="project.projectmetadata",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "tb_zonasi_batch_metadata",
+            },
+        ),
+        migrations.CreateModel(
+            name="ZonasiBatch",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("rank", models.IntegerField()),
+                ("time", models.FloatField()),
+                ("route", models.FloatField()),
+                ("radius", models.FloatField(blank=True, null=True)),
+                (
+                    "file_metadata",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zonasi_batch",
+                        to="project.zonasibatchmetadata",
+                    ),
+                ),
+                (
+                    "peserta_didik",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zonasi_batch",
+                        to="peserta_didik.pesertadidik",
+                    ),
+                ),
+                (
+                    "sekolah",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zonasi_batch",
+                        to="sekolah.sekolah",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "tb_zonasi_batch",
+            },
+        ),
+    ]
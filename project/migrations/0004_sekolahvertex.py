@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-17 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jalan", "0010_jalanmetadata_data_count_jalanmetadata_ingest_rate"),
+        ("project", "0003_zonasibatchmetadata_zonasibatch"),
+        ("sekolah", "0003_sekolahmetadata_zonasi"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SekolahVertex",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("vertex_id", models.BigIntegerField()),
+                ("jalan_version", models.DateTimeField()),
+                ("sekolah_version", models.DateTimeField()),
+                (
+                    "jalan_metadata",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sekolah_vertex",
+                        to="jalan.jalanmetadata",
+                    ),
+                ),
+                (
+                    "sekolah",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="vertex",
+                        to="sekolah.sekolah",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "tb_sekolah_vertex",
+                "unique_together": {("sekolah", "jalan_metadata")},
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.3 on 2026-10-17 11:58
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jalan", "0010_jalanmetadata_data_count_jalanmetadata_ingest_rate"),
+        ("project", "0004_sekolahvertex"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ZonasiPrecompute",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("max_time", models.FloatField(default=60)),
+                ("status", models.CharField(max_length=50)),
+                (
+                    "message",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("path", models.CharField(blank=True, default="", max_length=255)),
+                ("vertex_count", models.IntegerField(blank=True, null=True)),
+                ("entry_count", models.BigIntegerField(blank=True, null=True)),
+                ("jalan_version", models.DateTimeField(blank=True, null=True)),
+                ("sekolah_version", models.JSONField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "jalan_metadata",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zonasi_precompute",
+                        to="jalan.jalanmetadata",
+                    ),
+                ),
+                (
+                    "project",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zonasi_precompute",
+                        to="project.projectmetadata",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "tb_zonasi_precompute",
+            },
+        ),
+    ]
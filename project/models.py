@@ -1,5 +1,8 @@
 from django.contrib.gis.db import models
 import uuid
+from jalan.models import JalanMetadata
+from peserta_didik.models import PesertaDidik, PesertaDidikMetadata
+from sekolah.models import Sekolah
 
 
 class ProjectMetadata(models.Model):
@@ -20,3 +23,101 @@ class ProjectMetadata(models.Model):
 
     class Meta:
         db_table = "tb_project_metadata"
+
+
+class ZonasiBatchMetadata(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(
+        ProjectMetadata, related_name="zonasi_batch", on_delete=models.CASCADE
+    )
+    peserta_didik_metadata = models.ForeignKey(
+        PesertaDidikMetadata, related_name="zonasi_batch", on_delete=models.CASCADE
+    )
+    max_time = models.FloatField(default=60)  # minutes
+    max_rank = models.IntegerField(default=5)
+    status = models.CharField(max_length=50)  # QUEUED | RUNNING | DONE | FAILED
+    progress = models.FloatField(default=0)  # percent
+    message = models.CharField(max_length=255, blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.project.name} - {self.peserta_didik_metadata.name}"
+
+    class Meta:
+        db_table = "tb_zonasi_batch_metadata"
+
+
+class ZonasiBatch(models.Model):
+    id = models.AutoField(primary_key=True)
+    file_metadata = models.ForeignKey(
+        ZonasiBatchMetadata, related_name="zonasi_batch", on_delete=models.CASCADE
+    )
+    peserta_didik = models.ForeignKey(
+        PesertaDidik, related_name="zonasi_batch", on_delete=models.CASCADE
+    )
+    sekolah = models.ForeignKey(
+        Sekolah, related_name="zonasi_batch", on_delete=models.CASCADE
+    )
+    rank = models.IntegerField()
+    time = models.FloatField()  # minutes
+    route = models.FloatField()  # km
+    radius = models.FloatField(null=True, blank=True)  # meters
+
+    def __str__(self):
+        return f"{self.file_metadata} - {self.peserta_didik_id} - {self.rank}"
+
+    class Meta:
+        db_table = "tb_zonasi_batch"
+
+
+class SekolahVertex(models.Model):
+    id = models.AutoField(primary_key=True)
+    sekolah = models.ForeignKey(
+        Sekolah, related_name="vertex", on_delete=models.CASCADE
+    )
+    jalan_metadata = models.ForeignKey(
+        JalanMetadata, related_name="sekolah_vertex", on_delete=models.CASCADE
+    )
+    # Nearest vertex id of {road_table}_vertices_pgr
+    vertex_id = models.BigIntegerField()
+    # updated_at of the jalan metadata and sekolah when the vertex was computed
+    jalan_version = models.DateTimeField()
+    sekolah_version = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.sekolah_id} - {self.jalan_metadata_id} - {self.vertex_id}"
+
+    class Meta:
+        db_table = "tb_sekolah_vertex"
+        unique_together = ("sekolah", "jalan_metadata")
+
+
+class ZonasiPrecompute(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.OneToOneField(
+        ProjectMetadata, related_name="zonasi_precompute", on_delete=models.CASCADE
+    )
+    jalan_metadata = models.ForeignKey(
+        JalanMetadata, related_name="zonasi_precompute", on_delete=models.CASCADE
+    )
+    max_time = models.FloatField(default=60)  # minutes
+    status = models.CharField(max_length=50)  # QUEUED | RUNNING | DONE | FAILED
+    message = models.CharField(max_length=255, blank=True, default="")
+    # Symlink to the current version directory of the travel time arrays
+    path = models.CharField(max_length=255, blank=True, default="")
+    vertex_count = models.IntegerField(null=True, blank=True)
+    entry_count = models.BigIntegerField(null=True, blank=True)
+    # updated_at of the jalan metadata and of every sekolah layer used for the arrays
+    jalan_version = models.DateTimeField(null=True, blank=True)
+    sekolah_version = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.project.name} - {self.status}"
+
+    class Meta:
+        db_table = "tb_zonasi_precompute"
@@ -0,0 +1,226 @@
+import contextlib
+import glob
+import os
+import shutil
+import uuid
+import numpy as np
+from jalan.models import JalanMetadata
+from jalan.routing import RoadGraph, get_cached
+from sekolah.models import SekolahMetadata
+from .models import ZonasiPrecompute
+
+# Number of sekolah searched by one reverse dijkstra call
+SEKOLAH_CHUNK = 16
+
+ZONASI_TABLE_ARRAYS = ("node_ids", "sekolah_ids", "indptr", "indices", "times")
+# Attempts to load a table whose version was replaced and removed while reading it
+ZONASI_TABLE_LOAD_ATTEMPTS = 3
+
+
+class ZonasiPrecomputeNotReady(Exception):
+    """
+    The project has no precomputed travel times matching its current layers
+    """
+
+
+def remove_path(path: str):
+    if os.path.islink(path) or os.path.isfile(path):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class ZonasiTable:
+    """
+    Travel time (minute) from every road vertex to the sekolah reachable within
+    the max time of the precompute, stored as compressed sparse row (CSR) arrays.
+
+    The entries of the vertex `node_ids[i]` are `indptr[i]:indptr[i + 1]`, every
+    entry keeps the position of the sekolah in `sekolah_ids` and its travel time.
+    """
+
+    def __init__(self, node_ids, sekolah_ids, indptr, indices, times):
+        self.node_ids = node_ids
+        self.sekolah_ids = sekolah_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.times = times
+        self.version = None
+
+    @classmethod
+    def build(
+        cls, graph: RoadGraph, sekolah_ids, sekolah_vids, max_time, progress=None
+    ):
+        """
+        Search backward from every sekolah vertex, SEKOLAH_CHUNK sekolah at a time,
+        and keep only the reached vertices
+        """
+        list_node = [np.empty(0, dtype=np.int64)]
+        list_sekolah = [np.empty(0, dtype=np.int64)]
+        list_time = [np.empty(0, dtype=np.float32)]
+
+        for start in range(0, len(sekolah_ids), SEKOLAH_CHUNK):
+            costs = graph.reverse_travel_times(
+                sekolah_vids[start : start + SEKOLAH_CHUNK], max_cost=max_time
+            )
+            sekolah_pos, node_pos = np.nonzero(np.isfinite(costs))
+            list_node.append(node_pos)
+            list_sekolah.append(sekolah_pos + start)
+            list_time.append(costs[sekolah_pos, node_pos].astype(np.float32))
+
+            if progress is not None:
+                progress(min(start + SEKOLAH_CHUNK, len(sekolah_ids)))
+
+        nodes = np.concatenate(list_node)
+        sekolah = np.concatenate(list_sekolah)
+        times = np.concatenate(list_time)
+
+        # Group the entries by vertex, the nearest sekolah first
+        order = np.lexsort((times, nodes))
+        counts = np.bincount(nodes, minlength=len(graph.node_ids))
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(
+            node_ids=np.asarray(graph.node_ids, dtype=np.int64),
+            sekolah_ids=np.asarray(sekolah_ids, dtype=np.int64),
+            indptr=indptr,
+            indices=sekolah[order].astype(np.int32),
+            times=times[order],
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Memory-map the arrays of the current version of a table, pages are shared
+        by every worker
+        """
+        for attempt in range(ZONASI_TABLE_LOAD_ATTEMPTS):
+            # Every array is read from the same version even if path is swapped
+            version_path = os.path.realpath(path)
+            try:
+                return cls(
+                    *(
+                        np.load(
+                            os.path.join(version_path, f"{name}.npy"), mmap_mode="r"
+                        )
+                        for name in ZONASI_TABLE_ARRAYS
+                    )
+                )
+            except FileNotFoundError:
+                if attempt == ZONASI_TABLE_LOAD_ATTEMPTS - 1:
+                    raise
+
+    def save(self, path: str):
+        """
+        Save the arrays in a new version directory and point the path symlink to it,
+        readers always find a complete version at path
+        """
+        version_path = f"{path}.{uuid.uuid4().hex}"
+        os.makedirs(version_path)
+        for name in ZONASI_TABLE_ARRAYS:
+            np.save(os.path.join(version_path, f"{name}.npy"), getattr(self, name))
+
+        # Directory saved before the tables were versioned, it can't be swapped
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+
+        link_path = f"{path}.link"
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        os.symlink(os.path.basename(version_path), link_path)
+        os.replace(link_path, path)
+
+        # Workers keep reading the old arrays they mapped until they reload
+        for old_path in glob.glob(f"{glob.escape(path)}.*"):
+            if old_path != version_path:
+                remove_path(old_path)
+
+    @classmethod
+    def remove(cls, path: str):
+        """
+        Remove every version of a table
+        """
+        for table_path in [path, *glob.glob(f"{glob.escape(path)}.*")]:
+            remove_path(table_path)
+
+    @property
+    def entry_count(self):
+        return len(self.times)
+
+    def sekolah_within(self, vertex_id: int, max_time: float):
+        """
+        Return the ids and travel times of the sekolah reachable from a vertex
+        within max_time, the nearest first
+        """
+        idx = int(np.searchsorted(self.node_ids, vertex_id))
+        if idx >= len(self.node_ids) or self.node_ids[idx] != vertex_id:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        entries = slice(self.indptr[idx], self.indptr[idx + 1])
+        times = np.asarray(self.times[entries])
+        within = times <= max_time
+        indices = np.asarray(self.indices[entries])[within]
+        return np.asarray(self.sekolah_ids)[indices], times[within]
+
+
+def remove_zonasi_precomputes(precomputes):
+    """
+    Remove the travel time arrays of ZonasiPrecompute rows, before they are deleted
+    """
+    for path in precomputes.exclude(path="").values_list("path", flat=True):
+        ZonasiTable.remove(path)
+
+
+def layer_versions(
+    jalan_metadata: JalanMetadata, list_sekolah_metadata: list[SekolahMetadata]
+):
+    """
+    Versions of the project layers, the precompute is outdated when they change
+    """
+    return jalan_metadata.updated_at, {
+        str(sekolah_metadata.id): sekolah_metadata.updated_at.isoformat()
+        for sekolah_metadata in list_sekolah_metadata
+    }
+
+
+def get_zonasi_table(
+    project,
+    jalan_metadata: JalanMetadata,
+    list_sekolah_metadata: list[SekolahMetadata],
+    max_time: float,
+):
+    """
+    Return the cached precomputed travel times of a project, raise
+    ZonasiPrecomputeNotReady when they are missing or outdated
+    """
+    try:
+        precompute = project.zonasi_precompute
+    except ZonasiPrecompute.DoesNotExist:
+        raise ZonasiPrecomputeNotReady(
+            "Zonasi is not precomputed, publish the project with 'precompute' first."
+        )
+
+    if precompute.status != "DONE":
+        raise ZonasiPrecomputeNotReady(
+            f"Zonasi precompute is {precompute.status.lower()}."
+        )
+
+    jalan_version, sekolah_version = layer_versions(
+        jalan_metadata, list_sekolah_metadata
+    )
+    if (
+        precompute.jalan_metadata_id != jalan_metadata.id
+        or precompute.jalan_version != jalan_version
+        or precompute.sekolah_version != sekolah_version
+    ):
+        raise ZonasiPrecomputeNotReady(
+            "Zonasi precompute is outdated, the project layers changed."
+        )
+
+    if precompute.max_time < max_time:
+        raise ZonasiPrecomputeNotReady(
+            f"Zonasi precompute only covers {precompute.max_time} minutes."
+        )
+
+    return get_cached(precompute, "zonasi", lambda: ZonasiTable.load(precompute.path))
@@ -1,5 +1,10 @@
 from rest_framework import serializers
-from .models import ProjectMetadata
+from .models import (
+    ProjectMetadata,
+    ZonasiBatchMetadata,
+    ZonasiBatch,
+    ZonasiPrecompute,
+)
 
 
 class ProjectMetadataSerializer(serializers.ModelSerializer):
@@ -17,3 +22,60 @@ class ProjectMetadataSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         )
+
+
+class ZonasiBatchMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ZonasiBatchMetadata
+        fields = (
+            "id",
+            "project",
+            "peserta_didik_metadata",
+            "max_time",
+            "max_rank",
+            "status",
+            "progress",
+            "message",
+            "created_at",
+            "updated_at",
+        )
+
+
+class ZonasiBatchSerializer(serializers.ModelSerializer):
+    nisn = serializers.CharField(source="peserta_didik.nisn")
+    nama = serializers.CharField(source="peserta_didik.nama")
+    npsn = serializers.CharField(source="sekolah.npsn")
+    nama_sekolah = serializers.CharField(source="sekolah.nama")
+
+    class Meta:
+        model = ZonasiBatch
+        fields = (
+            "id",
+            "peserta_didik",
+            "nisn",
+            "nama",
+            "sekolah",
+            "npsn",
+            "nama_sekolah",
+            "rank",
+            "time",
+            "route",
+            "radius",
+        )
+
+
+class ZonasiPrecomputeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ZonasiPrecompute
+        fields = (
+            "id",
+            "project",
+            "jalan_metadata",
+            "max_time",
+            "status",
+            "message",
+            "vertex_count",
+            "entry_count",
+            "created_at",
+            "updated_at",
+        )
@@ -0,0 +1,144 @@
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from scipy.sparse.csgraph import dijkstra
+from jalan.routing import RoadGraph
+from .precompute import ZonasiTable
+from .views import ProjectFindZonasi
+
+
+def random_road_graph(seed: int, n_vertices: int = 80, n_edges: int = 200):
+    """
+    Random road graph with sparse vertex ids and one way edges
+    """
+    rng = np.random.default_rng(seed)
+    vertex_ids = rng.choice(10 * n_vertices, size=n_vertices, replace=False) + 1
+    costs = rng.uniform(0.5, 10, n_edges)
+    return RoadGraph(
+        edge_ids=np.arange(n_edges) + 1,
+        sources=rng.choice(vertex_ids, n_edges),
+        targets=rng.choice(vertex_ids, n_edges),
+        costs=costs,
+        reverse_costs=np.where(rng.random(n_edges) < 0.3, -1, costs),
+    )
+
+
+class ZonasiTableTests(SimpleTestCase):
+    max_time = 15
+
+    def build_table(self, seed: int):
+        graph = random_road_graph(seed)
+        rng = np.random.default_rng(seed)
+        # More sekolah than SEKOLAH_CHUNK, two sekolah may share a vertex
+        sekolah_vids = rng.choice(graph.node_ids, 40)
+        sekolah_ids = np.arange(len(sekolah_vids)) + 1000
+        table = ZonasiTable.build(graph, sekolah_ids, sekolah_vids, self.max_time)
+        return graph, table, sekolah_ids, sekolah_vids
+
+    def assert_table_matches_dijkstra(self, graph, table, sekolah_ids, sekolah_vids):
+        # Travel time from every vertex (rows) to every sekolah (columns)
+        dist = dijkstra(graph.matrix, directed=True)[
+            :, graph.node_indices(sekolah_vids)
+        ]
+
+        for node, vertex_id in enumerate(graph.node_ids):
+            for max_time in (self.max_time / 3, self.max_time):
+                ids, times = table.sekolah_within(int(vertex_id), max_time)
+                within = dist[node] <= max_time
+                self.assertEqual(set(ids.tolist()), set(sekolah_ids[within].tolist()))
+                self.assertTrue(np.all(np.diff(times) >= 0))
+
+                expected = dict(zip(sekolah_ids[within], dist[node][within]))
+                np.testing.assert_allclose(
+                    times, [expected[sekolah_id] for sekolah_id in ids], rtol=1e-6
+                )
+
+    def test_sekolah_within_matches_dijkstra(self):
+        for seed in range(5):
+            self.assert_table_matches_dijkstra(*self.build_table(seed))
+
+    def test_unknown_vertex_has_no_sekolah(self):
+        _, table, _, _ = self.build_table(0)
+        ids, times = table.sekolah_within(-1, self.max_time)
+        self.assertEqual(len(ids), 0)
+        self.assertEqual(len(times), 0)
+
+    def test_save_replaces_the_table(self):
+        graph, table, sekolah_ids, sekolah_vids = self.build_table(1)
+        _, other_table, _, _ = self.build_table(2)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "precompute")
+            other_table.save(path)
+            loaded_before = ZonasiTable.load(path)
+
+            table.save(path)
+            self.assertTrue(os.path.islink(path))
+            self.assertEqual(len(os.listdir(temp_dir)), 2)
+            self.assert_table_matches_dijkstra(
+                graph, ZonasiTable.load(path), sekolah_ids, sekolah_vids
+            )
+            # A table mapped before the swap stays readable
+            self.assertEqual(len(loaded_before.times), other_table.entry_count)
+            np.testing.assert_array_equal(loaded_before.times, other_table.times)
+
+            ZonasiTable.remove(path)
+            self.assertEqual(os.listdir(temp_dir), [])
+
+
+class ProjectFindZonasiPrecomputedTests(SimpleTestCase):
+    @override_settings(ROUTING_ENGINE="pgrouting")
+    def test_precomputed_mode_runs_no_pgrouting_query(self):
+        sekolah = {"id": 1, "nama": "SDN 1", "lon": 106.81, "lat": -6.21}
+        jalan_metadata = mock.Mock(road_table="tb_jalan_test")
+        graph = mock.Mock()
+        graph.shortest_paths.return_value = {20: ([5, 6], 3.5)}
+        route = (
+            '{"type": "LineString", "coordinates": [[106.8, -6.2], [106.81, -6.21]]}'
+        )
+
+        with (
+            mock.patch("project.views.ProjectMetadata"),
+            mock.patch(
+                "project.views.get_project_layers", return_value=(jalan_metadata, [])
+            ),
+            mock.patch("project.views.require_profile"),
+            mock.patch("project.views.get_snap_index") as get_snap_index,
+            mock.patch("project.views.get_zonasi_table"),
+            mock.patch.object(
+                ProjectFindZonasi,
+                "precomputed_isochrones",
+                return_value=mock.MagicMock(),
+            ),
+            mock.patch.object(
+                ProjectFindZonasi,
+                "isochrone_response",
+                return_value={
+                    "isochrone": None,
+                    "sekolah": {"zonasi": [sekolah], "non_zonasi": []},
+                },
+            ),
+            mock.patch("project.views.Sekolah"),
+            mock.patch("project.views.get_sekolah_vertices", return_value={1: 20}),
+            mock.patch("project.views.get_road_graph", return_value=graph),
+            mock.patch("project.views.routes_geojson", return_value={20: route}),
+            mock.patch("project.views.search_route_windows") as search_route_windows,
+            mock.patch("project.views.connection") as connection,
+        ):
+            get_snap_index.return_value.nearest.return_value = (
+                [10],
+                [(106.8, -6.2)],
+            )
+            request = APIRequestFactory().get(
+                "/", {"lon": "106.8", "lat": "-6.2", "mode": "precomputed"}
+            )
+            response = ProjectFindZonasi.as_view()(request, pk="project")
+
+        search_route_windows.assert_not_called()
+        connection.cursor.assert_not_called()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(response.data["route"]["features"]), 1)
+        graph.shortest_paths.assert_called_once()
@@ -8,6 +8,11 @@ from .views import (
     ProjectUpdateStatus,
     ProjectListZonasi,
     ProjectFindZonasi,
+    ProjectZonasiBatch,
+    ZonasiBatchMetadataList,
+    ZonasiBatchMetadataDetail,
+    ZonasiBatchListByMetadataId,
+    ZonasiPrecomputeDetail,
 )
 
 urlpatterns = [
@@ -47,4 +52,29 @@ urlpatterns = [
         ProjectUpdateStatus.as_view(),
         name="project-change-status",
     ),
+    path(
+        "project/zonasi-precompute/<str:pk>/",
+        ZonasiPrecomputeDetail.as_view(),
+        name="project-zonasi-precompute",
+    ),
+    path(
+        "project/zonasi-batch/detail/<str:pk>/",
+        ZonasiBatchMetadataDetail.as_view(),
+        name="project-zonasi-batch-detail",
+    ),
+    path(
+        "project/zonasi-batch/result/<str:pk>/",
+        ZonasiBatchListByMetadataId.as_view(),
+        name="project-zonasi-batch-result",
+    ),
+    path(
+        "project/zonasi-batch/<str:pk>/<str:peserta_didik_id>/",
+        ProjectZonasiBatch.as_view(),
+        name="project-zonasi-batch",
+    ),
+    path(
+        "project/zonasi-batch/<str:pk>/",
+        ZonasiBatchMetadataList.as_view(),
+        name="project-zonasi-batch-list",
+    ),
 ]
@@ -1,22 +1,155 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from .models import ProjectMetadata
+from .models import (
+    ProjectMetadata,
+    ZonasiBatchMetadata,
+    ZonasiBatch,
+    SekolahVertex,
+    ZonasiPrecompute,
+)
 from .serializers import (
     ProjectMetadataSerializer,
+    ZonasiBatchMetadataSerializer,
+    ZonasiBatchSerializer,
+    ZonasiPrecomputeSerializer,
 )
 from jalan.models import JalanMetadata
+from jalan.cache import (
+    isochrone_cache_key,
+    get_cached_isochrone,
+    set_cached_isochrone,
+)
+from jalan.profiles import (
+    DEFAULT_PROFILE,
+    get_speed_profile,
+    require_profile,
+    is_directed,
+    edges_sql,
+)
+from jalan.routing import (
+    get_routing_engine,
+    driving_distance_edges,
+    isochrone_buffer_geojson,
+    routes_geojson,
+    get_road_graph,
+    get_snap_index,
+    reach_window,
+    record_window,
+    search_route_windows,
+)
+from jalan.contraction import get_contraction
+from job.queue import enqueue_job
+from .precompute import (
+    ZonasiTable,
+    ZonasiPrecomputeNotReady,
+    get_zonasi_table,
+    remove_zonasi_precomputes,
+)
 from sekolah.models import SekolahMetadata, Sekolah
+from peserta_didik.models import PesertaDidikMetadata
 from geodjango.utils import (
     create_concave_hull,
-    geojson_line_length,
+    concave_hull_sql,
+    get_hull_engine,
+    geojson_line_lengths,
     add_unique_items,
-    calculate_distance,
+    geodesic_distance,
 )
 from django.db import connection
 import json
 from django.contrib.gis.geos import GEOSGeometry
 
 
+def get_project_layers(metadata: ProjectMetadata):
+    """
+    Return the first jalan layer and every sekolah layer metadata of a project
+    """
+    layers = metadata.layers or []
+    jalan = None
+    sekolah = []
+
+    # Loop through layers
+    for layer in layers:
+        if layer["type"] == "jalan" and jalan is None:
+            jalan = layer  # Assign the first "jalan" layer
+        if layer["type"] == "sekolah":
+            sekolah.append(layer)  # Add "sekolah" layers to the list
+
+    if jalan is None:
+        raise ValueError(f"Jalan Layer is not found!")
+    jalan_metadata = JalanMetadata.objects.get(id=jalan["id"])
+
+    if not sekolah:
+        raise ValueError("Sekolah Layers are not found!")
+    sekolah_metadata = []
+    for sekolah_layer in sekolah:
+        sekolah_metadata.append(SekolahMetadata.objects.get(id=sekolah_layer["id"]))
+
+    return jalan_metadata, sekolah_metadata
+
+
+def get_sekolah_vertices(jalan_metadata: JalanMetadata, sekolah_queryset):
+    """
+    Return the nearest topology vertex of every sekolah of a queryset as a
+    dictionary sekolah id -> vertex id.
+
+    The vertices are stored in SekolahVertex, a vertex is only computed again
+    when the sekolah was edited or the jalan layer was saved (new topology).
+    """
+    list_sekolah = list(
+        sekolah_queryset.filter(lat__isnull=False, lon__isnull=False).values_list(
+            "id", "lon", "lat", "updated_at"
+        )
+    )
+    saved = {
+        sekolah_id: (vertex_id, jalan_version, sekolah_version)
+        for sekolah_id, vertex_id, jalan_version, sekolah_version in (
+            SekolahVertex.objects.filter(
+                jalan_metadata=jalan_metadata,
+                sekolah_id__in=[sekolah[0] for sekolah in list_sekolah],
+            ).values_list("sekolah_id", "vertex_id", "jalan_version", "sekolah_version")
+        )
+    }
+
+    vertices = {}
+    stale = []
+    for sekolah_id, lon, lat, updated_at in list_sekolah:
+        vertex = saved.get(sekolah_id)
+        if (
+            vertex
+            and vertex[1] == jalan_metadata.updated_at
+            and vertex[2] == updated_at
+        ):
+            vertices[sekolah_id] = vertex[0]
+        else:
+            stale.append((sekolah_id, lon, lat, updated_at))
+
+    if stale:
+        vertex_ids, _ = get_snap_index(jalan_metadata).nearest(
+            [sekolah[1] for sekolah in stale], [sekolah[2] for sekolah in stale]
+        )
+        list_vertex = [
+            SekolahVertex(
+                sekolah_id=sekolah_id,
+                jalan_metadata=jalan_metadata,
+                vertex_id=int(vertex_id),
+                jalan_version=jalan_metadata.updated_at,
+                sekolah_version=updated_at,
+            )
+            for (sekolah_id, _, _, updated_at), vertex_id in zip(stale, vertex_ids)
+        ]
+        SekolahVertex.objects.bulk_create(
+            list_vertex,
+            batch_size=5000,
+            update_conflicts=True,
+            unique_fields=["sekolah", "jalan_metadata"],
+            update_fields=["vertex_id", "jalan_version", "sekolah_version"],
+        )
+        vertices.update((vertex.sekolah_id, vertex.vertex_id) for vertex in list_vertex)
+
+    return vertices
+
+
 class ProjectMetadataList(generics.ListAPIView):
     queryset = ProjectMetadata.objects.all().order_by("-created_at")
     serializer_class = ProjectMetadataSerializer
@@ -33,6 +166,10 @@ class ProjectMetadataDelete(generics.DestroyAPIView):
     queryset = ProjectMetadata.objects.all()
     serializer_class = ProjectMetadataSerializer
 
+    def perform_destroy(self, instance):
+        remove_zonasi_precomputes(ZonasiPrecompute.objects.filter(project=instance))
+        super().perform_destroy(instance)
+
 
 class ProjectMetadataDetail(generics.RetrieveAPIView):
     queryset = ProjectMetadata.objects.all()
@@ -127,23 +264,68 @@ class ProjectSaveLayer(generics.RetrieveAPIView):
 
 class ProjectUpdateStatus(generics.RetrieveAPIView):
     """
-    API view to update status
+    API view to update status, a published project may also precompute its zonasi
     """
 
     def put(self, request, *args, **kwargs):
         metadata_id = kwargs.get("pk")
         in_status = kwargs.get("status")
+        precompute = str(request.data.get("precompute", "")).lower() in (
+            "1",
+            "true",
+            "yes",
+        )
 
         if in_status != "DRAFT" and in_status != "PUBLISHED":
             return Response(
                 {"error": "Status invalid!."}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            max_time = float(request.data.get("max_time", 60))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "'max_time' must be a valid numeric value."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if precompute and (in_status != "PUBLISHED" or max_time <= 0):
+            return Response(
+                {
+                    "error": "Zonasi can only be precomputed for a PUBLISHED project with 'max_time' greater than 0."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         try:
             metadata = ProjectMetadata.objects.get(id=metadata_id)
             metadata.status = in_status
             metadata.save()
 
+            if precompute:
+                jalan_metadata, _ = get_project_layers(metadata)
+                zonasi_precompute, _ = ZonasiPrecompute.objects.update_or_create(
+                    project=metadata,
+                    defaults={
+                        "jalan_metadata": jalan_metadata,
+                        "max_time": max_time,
+                        "status": "QUEUED",
+                        "message": "",
+                    },
+                )
+                job = enqueue_job(
+                    "zonasi_precompute", {"precompute_id": str(zonasi_precompute.id)}
+                )
+
+                return Response(
+                    {
+                        "message": "Status updated successfully, zonasi precompute queued.",
+                        "precompute_id": zonasi_precompute.id,
+                        "job_id": job.id,
+                    },
+                    status=status.HTTP_202_ACCEPTED,
+                )
+
             return Response(
                 {"message": "Status updated successfully."},
                 status=status.HTTP_200_OK,
@@ -180,6 +362,11 @@ class ProjectFindZonasi(generics.RetrieveAPIView):
         # Get query parameters from the request
         lat = request.query_params.get("lat")
         lon = request.query_params.get("lon")
+        # single-pass: one driving distance search for every time band
+        # iterative: one driving distance search per time band
+        # precomputed: one lookup in the travel times computed on publish, no isochrone,
+        # routes from the road graph (or the contraction hierarchy) instead of pgRouting
+        mode = request.query_params.get("mode", "single-pass")
         min_time = 5
         max_time = 60
 
@@ -190,44 +377,106 @@ class ProjectFindZonasi(generics.RetrieveAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        if mode not in ("single-pass", "iterative", "precomputed"):
+            return Response(
+                {
+                    "error": "Mode invalid! Supported modes: single-pass, iterative, precomputed"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            engine = get_routing_engine(request)
+            hull_engine = get_hull_engine(request)
+            profile = get_speed_profile(request)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if mode == "precomputed" and profile != DEFAULT_PROFILE:
+            return Response(
+                {
+                    "error": f"Precomputed zonasi only supports the {DEFAULT_PROFILE} profile."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if mode == "precomputed" and engine == "pgrouting":
+            # No pgRouting query at request time, routes come from the road graph
+            # the travel times were precomputed on
+            engine = "graph"
+
         try:
             metadata = ProjectMetadata.objects.get(id=metadata_id)
-            layers = metadata.layers
-            jalan = None
-            sekolah = []
-
-            # Loop through layers
-            for layer in layers:
-                if layer["type"] == "jalan" and jalan is None:
-                    jalan = layer  # Assign the first "jalan" layer
-                if layer["type"] == "sekolah":
-                    sekolah.append(layer)  # Add "sekolah" layers to the list
-
-            if jalan is None:
-                raise ValueError(f"Jalan Layer is not found!")
-            jalan_metadata = JalanMetadata.objects.get(id=jalan["id"])
-
-            if not sekolah:
-                raise ValueError("Sekolah Layers are not found!")
-            sekolah_metadata = []
-            for sekolah_layer in sekolah:
-                metadata = SekolahMetadata.objects.get(id=sekolah_layer["id"])
-                sekolah_metadata.append(metadata)
+            jalan_metadata, sekolah_metadata = get_project_layers(metadata)
+            require_profile(jalan_metadata, profile)
 
             road_table = jalan_metadata.road_table
-            vertices_table = f"{road_table}_vertices_pgr"
+            vertex_ids, vertex_coords = get_snap_index(jalan_metadata).nearest(
+                [float(lon)], [float(lat)]
+            )
+            start_vid = int(vertex_ids[0])
             res_isochrone = []
             res_sekolah = {"zonasi": [], "non_zonasi": []}
-            for time in range(min_time, max_time + 1, 5):
-                res = self.generate_isochrone(
-                    road_table=road_table,
-                    vertices_table=vertices_table,
-                    lon=lon,
-                    lat=lat,
-                    time=time,
-                    list_sekolah_metadata=sekolah_metadata,
+
+            edges = None
+            precomputed = None
+            if mode == "precomputed":
+                table = get_zonasi_table(
+                    metadata, jalan_metadata, sekolah_metadata, max_time
                 )
-                res_isochrone.append(res["isochrone"])
+                precomputed = self.precomputed_isochrones(
+                    table, start_vid, sekolah_metadata, min_time, max_time
+                )
+
+            for time in range(min_time, max_time + 1, 5):
+                if precomputed is not None:
+                    isochrone = precomputed[time]
+                else:
+                    # Parents of the same neighbourhood snap to the same start node
+                    cache_key = isochrone_cache_key(
+                        f"zonasi-{mode}-{profile}",
+                        jalan_metadata,
+                        start_vid,
+                        time,
+                        hull_engine,
+                        sekolah_metadata,
+                    )
+                    isochrone = get_cached_isochrone(cache_key)
+
+                if isochrone is None:
+                    if mode == "single-pass":
+                        if edges is None:
+                            # Every band is a subset of the max_time search
+                            edges, agg_cost = driving_distance_edges(
+                                jalan_metadata, lon, lat, max_time, engine, profile
+                            )
+                        result = self.generate_isochrone_band(
+                            road_table=road_table,
+                            edge_ids=edges[agg_cost <= time],
+                            lon=lon,
+                            lat=lat,
+                            time=time,
+                            hull_engine=hull_engine,
+                        )
+                    else:
+                        result = self.generate_isochrone(
+                            road_table=road_table,
+                            start_vid=start_vid,
+                            start_coords=vertex_coords[0],
+                            lon=lon,
+                            lat=lat,
+                            time=time,
+                            hull_engine=hull_engine,
+                            profile=profile,
+                        )
+                    isochrone = self.process_isochrone(
+                        result, sekolah_metadata, hull_engine
+                    )
+                    set_cached_isochrone(cache_key, isochrone)
+
+                res = self.isochrone_response(isochrone, lon, lat, time)
+                if res["isochrone"] is not None:
+                    res_isochrone.append(res["isochrone"])
                 add_unique_items(res_sekolah["zonasi"], res["sekolah"]["zonasi"])
                 add_unique_items(
                     res_sekolah["non_zonasi"], res["sekolah"]["non_zonasi"]
@@ -235,13 +484,23 @@ class ProjectFindZonasi(generics.RetrieveAPIView):
                 if len(res_sekolah["zonasi"]) > 3:
                     break
 
-            res_route = []
-            for sekolah in res_sekolah["zonasi"]:
-                route = self.zonasi_sekolah_route(
-                    road_table, vertices_table, lon, lat, sekolah
-                )
-                if route:
-                    res_route.append(route)
+            sekolah_vertices = get_sekolah_vertices(
+                jalan_metadata,
+                Sekolah.objects.filter(
+                    id__in=[sekolah["id"] for sekolah in res_sekolah["zonasi"]]
+                ),
+            )
+
+            res_route = self.zonasi_sekolah_route(
+                jalan_metadata,
+                engine,
+                profile,
+                start_vid,
+                sekolah_vertices,
+                lon,
+                lat,
+                res_sekolah["zonasi"],
+            )
 
             return Response(
                 {
@@ -258,6 +517,9 @@ class ProjectFindZonasi(generics.RetrieveAPIView):
                 status=status.HTTP_200_OK,
             )
 
+        except ZonasiPrecomputeNotReady as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -266,33 +528,34 @@ class ProjectFindZonasi(generics.RetrieveAPIView):
     def generate_isochrone(
         self,
         road_table: str,
-        vertices_table: str,
+        start_vid: int,
+        start_coords,
         lon,
         lat,
         time: int,
-        list_sekolah_metadata: list[SekolahMetadata],
+        hull_engine: str = "alphashape",
+        profile: str = DEFAULT_PROFILE,
     ):
         """
-        Process the isochrone
+        Create the isochrone (buffer, concave hull) row with pgr_drivingDistance,
+        roads out of reach at the profile max speed are not loaded
         """
+        bounds = reach_window(*start_coords, time, profile)
+        # Concave hull computed by PostGIS in the buffer query
+        hull_sql = "NULL"
+        if hull_engine == "postgis":
+            hull_sql = concave_hull_sql("isochrone_polygon", 20)
+
         # Create isochrone query
         create_isochrone = f"""
-            WITH
-                start_node AS (
-                    SELECT id
-                    FROM {vertices_table}
-                    ORDER BY the_geom <-> ST_SetSRID(ST_Point({lon}, {lat}), 4326)
-                    LIMIT 1
-                )
-
-            SELECT ST_AsGeoJSON(isochrone_polygon) AS geojson
+            SELECT ST_AsGeoJSON(isochrone_polygon) AS geojson, {hull_sql} AS concave
             FROM (
                 SELECT ST_Buffer(merged_lines, 0.0002) AS isochrone_polygon
                     FROM (
                         SELECT ST_Union(w.mline) AS merged_lines
                         FROM pgr_drivingDistance(
-                            'SELECT id, source, target, cost, reverse_cost FROM {road_table}',
-                            (SELECT id FROM start_node),
+                            '{edges_sql(road_table, profile, bounds)}',
+                            %s::bigint,
                         {time}
                         ) AS r
                         JOIN {road_table} AS w ON r.edge = w.id
@@ -301,142 +564,386 @@ class ProjectFindZonasi(generics.RetrieveAPIView):
         """
 
         with connection.cursor() as cursor:
-            cursor.execute(create_isochrone)
+            cursor.execute(create_isochrone, [start_vid])
             result = cursor.fetchone()
+        record_window(
+            road_table, "pgr_drivingDistance", bounds, 1, bool(result and result[0])
+        )
 
         if result and result[0]:
-            geojson_buffer = json.loads(result[0])
-            concave_geojson = create_concave_hull(geojson_buffer, 0.003, 20)
-
-            res_concave = {
-                "type": "Feature",
-                "properties": {
-                    "lat": lat,
-                    "lon": lon,
-                    "time": time,
-                    "name": f"±{time} Menit",
-                },
-                "geometry": json.loads(concave_geojson),
-            }
-
-            str_geom = str(res_concave["geometry"])
-
-            res_sekolah = {"zonasi": [], "non_zonasi": []}
-
-            for sekolah_metadata in list_sekolah_metadata:
-                list_sekolah = self.find_sekolah(str_geom, sekolah_metadata, time)
+            return result
+        else:
+            raise ValueError(
+                f"Failed to create isochrone from the given coordinate {lat}, {lon} and time {time}"
+            )
 
-                if sekolah_metadata.zonasi:
-                    res_sekolah["zonasi"].extend(list_sekolah)
-                else:
-                    res_sekolah["non_zonasi"].extend(list_sekolah)
+    def generate_isochrone_band(
+        self,
+        road_table: str,
+        edge_ids,
+        lon,
+        lat,
+        time: int,
+        hull_engine: str = "alphashape",
+    ):
+        """
+        Create the isochrone (buffer, concave hull) row of a time band from the edges
+        of a single driving distance search
+        """
+        result = None
+        if len(edge_ids) > 0:
+            result = isochrone_buffer_geojson(
+                road_table, edge_ids, 20 if hull_engine == "postgis" else None
+            )
 
-            return {"isochrone": res_concave, "sekolah": res_sekolah}
+        if result and result[0]:
+            return result
         else:
             raise ValueError(
                 f"Failed to create isochrone from the given coordinate {lat}, {lon} and time {time}"
             )
 
-    def find_sekolah(
-        self, str_geometry: str, sekolah_metadata: SekolahMetadata, time: int
+    def process_isochrone(
+        self,
+        result: tuple,
+        list_sekolah_metadata: list[SekolahMetadata],
+        hull_engine: str = "alphashape",
     ):
         """
-        Find sekolah inside isochrone
+        Create the concave isochrone from the (buffer, concave hull) row and find the id
+        of the sekolah inside it, the result is cached
         """
+        concave_geojson = result[1]
+        if concave_geojson is None:
+            concave_geojson = create_concave_hull(
+                json.loads(result[0]), 0.003, 20, engine=hull_engine
+            )
 
         # Convert GeoJSON to GEOSGeometry
-        polygon_geom = GEOSGeometry(str_geometry, srid=4326)
+        polygon_geom = GEOSGeometry(concave_geojson, srid=4326)
 
-        # Filter sekolah points within the polygon
-        sekolah_inside_polygon = Sekolah.objects.filter(
-            point__within=polygon_geom, file_metadata_id=sekolah_metadata.id
+        res_sekolah = {"zonasi": [], "non_zonasi": []}
+
+        for sekolah_metadata in list_sekolah_metadata:
+            list_sekolah_id = self.find_sekolah(polygon_geom, sekolah_metadata)
+
+            if sekolah_metadata.zonasi:
+                res_sekolah["zonasi"].extend(list_sekolah_id)
+            else:
+                res_sekolah["non_zonasi"].extend(list_sekolah_id)
+
+        return {"concave": concave_geojson, **res_sekolah}
+
+    def precomputed_isochrones(
+        self,
+        table: ZonasiTable,
+        start_vid: int,
+        list_sekolah_metadata: list[SekolahMetadata],
+        min_time: int,
+        max_time: int,
+    ):
+        """
+        Build the isochrone result of every time band from the precomputed travel
+        times of the start vertex, a sekolah is in the band of its travel time
+        """
+        list_sekolah_id, list_time = table.sekolah_within(start_vid, max_time)
+        sekolah_time = dict(zip(list_sekolah_id.tolist(), list_time.tolist()))
+
+        # Same order as find_sekolah: layer by layer, then by id
+        layer_order = {
+            sekolah_metadata.id: index
+            for index, sekolah_metadata in enumerate(list_sekolah_metadata)
+        }
+        layer_zonasi = {
+            sekolah_metadata.id: sekolah_metadata.zonasi
+            for sekolah_metadata in list_sekolah_metadata
+        }
+        list_sekolah = sorted(
+            Sekolah.objects.filter(
+                id__in=list(sekolah_time), file_metadata_id__in=list(layer_order)
+            ).values_list("id", "file_metadata_id"),
+            key=lambda sekolah: (layer_order[sekolah[1]], sekolah[0]),
         )
 
+        isochrones = {}
+        for time in range(min_time, max_time + 1, 5):
+            isochrone = {"concave": None, "zonasi": [], "non_zonasi": []}
+            for sekolah_id, file_metadata_id in list_sekolah:
+                if sekolah_time[sekolah_id] <= time:
+                    key = "zonasi" if layer_zonasi[file_metadata_id] else "non_zonasi"
+                    isochrone[key].append(sekolah_id)
+            isochrones[time] = isochrone
+        return isochrones
+
+    def isochrone_response(self, isochrone: dict, lon, lat, time: int):
+        """
+        Build the isochrone feature and the sekolah list of a (cached) isochrone result,
+        the feature is None when the result has no polygon (precomputed)
+        """
+        res_concave = None
+        if isochrone["concave"] is not None:
+            res_concave = {
+                "type": "Feature",
+                "properties": {
+                    "lat": lat,
+                    "lon": lon,
+                    "time": time,
+                    "name": f"±{time} Menit",
+                },
+                "geometry": json.loads(isochrone["concave"]),
+            }
+
         # Dynamically get field names of the Sekolah model
         exclude_fields = {"created_at", "updated_at", "file_metadata", "point"}
         include_fields = [
             field.name
             for field in Sekolah._meta.get_fields()
-            if field.name not in exclude_fields
+            if field.concrete and field.name not in exclude_fields
         ]
 
-        sekolah_with_time = [
-            {**item, "time": time}
-            for item in sekolah_inside_polygon.values(*include_fields)
-        ]
+        list_sekolah = {
+            item["id"]: {**item, "time": time}
+            for item in Sekolah.objects.filter(
+                id__in=isochrone["zonasi"] + isochrone["non_zonasi"]
+            ).values(*include_fields)
+        }
+
+        res_sekolah = {
+            key: [
+                list_sekolah[sekolah_id]
+                for sekolah_id in isochrone[key]
+                if sekolah_id in list_sekolah
+            ]
+            for key in ("zonasi", "non_zonasi")
+        }
+        return {"isochrone": res_concave, "sekolah": res_sekolah}
+
+    def find_sekolah(
+        self, polygon_geom: GEOSGeometry, sekolah_metadata: SekolahMetadata
+    ):
+        """
+        Find the id of the sekolah inside isochrone
+        """
 
-        return sekolah_with_time
+        # Filter sekolah points within the polygon
+        sekolah_inside_polygon = Sekolah.objects.filter(
+            point__within=polygon_geom, file_metadata_id=sekolah_metadata.id
+        ).order_by("id")
+
+        return list(sekolah_inside_polygon.values_list("id", flat=True))
 
     def zonasi_sekolah_route(
         self,
-        road_table: str,
-        vertices_table: str,
+        jalan_metadata: JalanMetadata,
+        engine: str,
+        profile: str,
+        start_vid: int,
+        sekolah_vertices: dict,
         lon,
         lat,
-        sekolah: Sekolah,
+        list_sekolah: list,
     ):
         """
-        Find sekolah inside isochrone
+        Find the route to every sekolah inside isochrone with a single one-to-many search
         """
+        road_table = jalan_metadata.road_table
+        end_vids = sorted(set(sekolah_vertices.values()))
+
+        directed = is_directed(profile)
+
+        # End vertex id -> (GeoJSON, travel time)
+        if engine in ("graph", "ch"):
+            graph = get_road_graph(jalan_metadata, profile)
+            if engine == "ch":
+                # Directed hierarchy, walking costs are the same both ways
+                paths = get_contraction(jalan_metadata, profile).shortest_paths(
+                    graph, start_vid, end_vids
+                )
+            else:
+                paths = graph.shortest_paths(start_vid, end_vids, directed=directed)
+            geometries = routes_geojson(
+                road_table,
+                {end_vid: edge_ids for end_vid, (edge_ids, _) in paths.items()},
+            )
+            routes = {
+                end_vid: (geometry, paths[end_vid][1])
+                for end_vid, geometry in geometries.items()
+            }
+        else:
 
-        # Find Routing
-        routing_query = f"""
-            WITH
-                start_node AS (
-                    SELECT id
-                    FROM {vertices_table}
-                    ORDER BY the_geom <-> ST_SetSRID(ST_Point({lon}, {lat}), 4326)
-                    LIMIT 1
-                ),
-                end_node AS (
-                    SELECT id
-                    FROM {vertices_table}
-                    ORDER BY the_geom <-> ST_SetSRID(ST_Point({sekolah["lon"]}, {sekolah["lat"]}), 4326)
-                    LIMIT 1
-                ),
-                path AS (
-                    SELECT * 
+            def search(bounds):
+                routing_query = f"""
+                    SELECT p.end_vid, ST_AsGeoJSON(ST_LineMerge(ST_Union(e.mline))) AS geojson,
+                        SUM(p.cost) AS time
                     FROM pgr_dijkstra(
-                        'SELECT id, source, target, cost, reverse_cost FROM {road_table}',
-                        (SELECT id FROM start_node),
-                        (SELECT id FROM end_node),
-                        directed := false
-                    )
+                        '{edges_sql(road_table, profile, bounds)}',
+                        %s::bigint,
+                        %s::bigint[],
+                        directed := {str(directed).lower()}
+                    ) AS p
+                    JOIN {road_table} AS e ON e.id = p.edge
+                    GROUP BY p.end_vid;
+                """
+                with connection.cursor() as cursor:
+                    cursor.execute(routing_query, [start_vid, end_vids])
+                    return {
+                        end_vid: (geometry, time)
+                        for end_vid, geometry, time in cursor.fetchall()
+                    }
+
+            # Window around the start and every sekolah, searched again larger
+            # until every sekolah other than the start vertex is routed
+            routes = search_route_windows(
+                road_table,
+                "pgr_dijkstra",
+                [float(lon)] + [sekolah["lon"] for sekolah in list_sekolah],
+                [float(lat)] + [sekolah["lat"] for sekolah in list_sekolah],
+                search,
+                found=lambda routes: all(
+                    end_vid in routes for end_vid in end_vids if end_vid != start_vid
                 ),
-                list AS (
-                    SELECT p.*, e.mline
-                        FROM path p
-                        JOIN {road_table} e ON e.id = p.edge
-                        ORDER BY p.seq
-                )
+            )
 
-            SELECT ST_AsGeoJSON(ST_LineMerge(ST_Union(mline))) AS geojson from list		
-        """
+        # Sekolah reached by a route, in the order of the zonasi list
+        list_routed = [
+            sekolah
+            for sekolah in list_sekolah
+            if routes.get(sekolah_vertices.get(sekolah["id"]), (None,))[0]
+        ]
+        if not list_routed:
+            return []
 
-        with connection.cursor() as cursor:
-            cursor.execute(routing_query)
-            result = cursor.fetchone()
+        list_geometry = [
+            json.loads(routes[sekolah_vertices[sekolah["id"]]][0])
+            for sekolah in list_routed
+        ]
+        list_length = geojson_line_lengths(list_geometry)
+        list_radius = geodesic_distance(
+            lat,
+            lon,
+            [sekolah["lat"] for sekolah in list_routed],
+            [sekolah["lon"] for sekolah in list_routed],
+        )
 
-        if result and result[0]:
-            geometry = json.loads(result[0])
-            geo_length = geojson_line_length(geometry)
-            radius = calculate_distance(lat, lon, sekolah["lat"], sekolah["lon"])
-            sekolah["radius"] = radius
-            sekolah["route"] = geo_length
+        res_features = []
+        for sekolah, geometry, geo_length, radius in zip(
+            list_routed, list_geometry, list_length, list_radius
+        ):
+            sekolah["radius"] = float(radius)
+            sekolah["route"] = float(geo_length)
 
-            res_features = {
-                "type": "Feature",
-                "properties": {
-                    "start_lat": lat,
-                    "start_lon": lon,
-                    "end_lat": sekolah["lat"],
-                    "end_lon": sekolah["lon"],
-                    "name": sekolah["nama"],
-                    "length": geo_length,
-                    "time": round(15 * geo_length, 1),
+            res_features.append(
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "start_lat": lat,
+                        "start_lon": lon,
+                        "end_lat": sekolah["lat"],
+                        "end_lon": sekolah["lon"],
+                        "name": sekolah["nama"],
+                        "length": float(geo_length),
+                        "time": round(
+                            float(routes[sekolah_vertices[sekolah["id"]]][1]), 1
+                        ),
+                    },
+                    "geometry": geometry,
+                }
+            )
+        return res_features
+
+
+class ProjectZonasiBatch(generics.RetrieveAPIView):
+    """
+    API view to assign zonasi sekolah to every peserta didik of a dataset
+    """
+
+    def put(self, request, *args, **kwargs):
+        metadata_id = kwargs.get("pk")
+        peserta_didik_id = kwargs.get("peserta_didik_id")
+
+        try:
+            max_time = float(request.data.get("max_time", 60))
+            max_rank = int(request.data.get("max_rank", 5))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "'max_time' and 'max_rank' must be valid numeric values."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if max_time <= 0 or max_rank <= 0:
+            return Response(
+                {"error": "'max_time' and 'max_rank' must be greater than 0."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            metadata = ProjectMetadata.objects.get(id=metadata_id)
+            peserta_didik_metadata = PesertaDidikMetadata.objects.get(
+                id=peserta_didik_id
+            )
+            # Fail early when the project has no jalan or sekolah layer
+            get_project_layers(metadata)
+
+            batch = ZonasiBatchMetadata.objects.create(
+                project=metadata,
+                peserta_didik_metadata=peserta_didik_metadata,
+                max_time=max_time,
+                max_rank=max_rank,
+                status="QUEUED",
+            )
+
+            job = enqueue_job("zonasi_batch", {"batch_id": str(batch.id)})
+
+            return Response(
+                {
+                    "message": "Zonasi batch queued",
+                    "metadata_id": batch.id,
+                    "job_id": job.id,
                 },
-                "geometry": geometry,
-            }
-            return res_features
-        else:
-            return None
+                status=status.HTTP_202_ACCEPTED,
+            )
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ZonasiBatchMetadataList(generics.ListAPIView):
+    serializer_class = ZonasiBatchMetadataSerializer
+
+    def get_queryset(self):
+        # Filter ZonasiBatchMetadata by project id from the URL
+        metadata_id = self.kwargs.get("pk")
+        return ZonasiBatchMetadata.objects.filter(project__id=metadata_id).order_by(
+            "-created_at"
+        )
+
+
+class ZonasiBatchMetadataDetail(generics.RetrieveAPIView):
+    queryset = ZonasiBatchMetadata.objects.all()
+    serializer_class = ZonasiBatchMetadataSerializer
+
+
+class ZonasiBatchListByMetadataId(generics.ListAPIView):
+    serializer_class = ZonasiBatchSerializer
+
+    def get_queryset(self):
+        # Filter ZonasiBatch by file_metadata id from the URL
+        metadata_id = self.kwargs.get("pk")
+        return (
+            ZonasiBatch.objects.filter(file_metadata__id=metadata_id)
+            .select_related("peserta_didik", "sekolah")
+            .order_by("peserta_didik_id", "rank")
+        )
+
+
+class ZonasiPrecomputeDetail(generics.RetrieveAPIView):
+    """
+    API view to get the zonasi precompute status of a project
+    """
+
+    queryset = ZonasiPrecompute.objects.all()
+    serializer_class = ZonasiPrecomputeSerializer
+    lookup_field = "project"
+    lookup_url_kwarg = "pk"
@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.contrib.gis.geos import Point
+from geodjango.utils import iter_csv_rows, bulk_create_csv_rows, parse_lat_lon
+from job.queue import register_job
+from .models import Sekolah, SekolahMetadata
+
+
+@register_job("sekolah_upload")
+def sekolah_upload(context, metadata_id, file_path):
+    """
+    Load the rows of an uploaded csv file into the Sekolah model
+    """
+    metadata = SekolahMetadata.objects.get(id=metadata_id)
+
+    with open(file_path, "rb") as file, transaction.atomic():
+        # Rows saved by an interrupted run of this job are loaded again
+        Sekolah.objects.filter(file_metadata=metadata).delete()
+
+        result = bulk_create_csv_rows(
+            iter_csv_rows(file),
+            Sekolah,
+            lambda row: build_sekolah(row, metadata),
+        )
+        context.result = {
+            "count": result["count"],
+            "skipped": result["skipped"],
+            "errors": result["errors"],
+        }
+
+        if result["count"] > 0:
+            metadata.bbox = result["bbox"]
+            metadata.save()
+
+    # Deleted after the transaction, the error raised would roll the delete back
+    if result["count"] == 0:
+        metadata.delete()
+        raise ValueError("No valid row found in the file.")
+
+    return context.result
+
+
+def build_sekolah(row, metadata: SekolahMetadata):
+    """
+    Build a Sekolah instance from a CSV row
+    """
+    lat, lon = parse_lat_lon(row)
+
+    return Sekolah(
+        tipe=row.get("tipe"),
+        npsn=row.get("npsn"),
+        nama=row.get("nama"),
+        alamat=row.get("alamat"),
+        kuota=int(row.get("kuota") or 0),
+        keterangan=row.get("keterangan"),
+        lat=lat,
+        lon=lon,
+        point=Point(lon, lat),
+        file_metadata=metadata,
+    )
@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     SekolahDetail,
     SekolahListByMetadataId,
+    SekolahGeoJSON,
     SekolahMetadataList,
     SekolahMetadataDetail,
     SekolahUpload,
@@ -33,6 +34,11 @@ urlpatterns = [
         SekolahListByMetadataId.as_view(),
         name="sekolah-list-by-metadata-id",
     ),
+    path(
+        "sekolah/geojson/<str:pk>/",
+        SekolahGeoJSON.as_view(),
+        name="sekolah-geojson",
+    ),
     path(
         "sekolah/detail/<int:pk>/",
         SekolahDetail.as_view(),
@@ -1,5 +1,6 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
+from django.db.models.functions import JSONObject
 from django.contrib.gis.geos import Point
 from .models import Sekolah, SekolahMetadata
 from .serializers import (
@@ -8,7 +9,13 @@ from .serializers import (
     SekolahDetailSerializerWithMetadata,
     SekolahMetadataWithDataSerializer,
 )
-from geodjango.utils import csv_to_dict, calculate_bbox_from_csv_points
+from geodjango.utils import (
+    stream_feature_collection,
+    filter_by_area,
+    KeysetPagination,
+)
+from job.queue import enqueue_job
+from tiles.mvt import invalidate_tiles
 
 
 class SekolahMetadataList(generics.ListAPIView):
@@ -20,6 +27,10 @@ class SekolahMetadataDelete(generics.DestroyAPIView):
     queryset = SekolahMetadata.objects.all()
     serializer_class = SekolahMetadataSerializer
 
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_tiles("sekolah", instance.id)
+
 
 class SekolahMetadataDetail(generics.RetrieveAPIView):
     queryset = SekolahMetadata.objects.all()
@@ -39,6 +50,17 @@ class SekolahListByMetadataId(generics.RetrieveAPIView):
             file_metadata=metadata_instance
         ).order_by("created_at")
 
+        try:
+            sekolah_queryset = filter_by_area(sekolah_queryset, "point", request)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # A page ordered by id when the request asks for one
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(sekolah_queryset, request, view=self)
+        if page is not None:
+            sekolah_queryset = page
+
         # Serialize the Sekolah instances
         sekolah_serializer = SekolahDetailSerializer(sekolah_queryset, many=True)
 
@@ -50,10 +72,50 @@ class SekolahListByMetadataId(generics.RetrieveAPIView):
         response_data["data"] = (
             sekolah_serializer.data
         )  # Add list of Sekolah under 'data'
+        if page is not None:
+            response_data["next"] = paginator.get_next_link()
+            response_data["previous"] = paginator.get_previous_link()
 
         return Response(response_data)
 
 
+class SekolahGeoJSON(generics.RetrieveAPIView):
+    """
+    API view to stream the sekolah of a metadata as a GeoJSON FeatureCollection
+    """
+
+    queryset = SekolahMetadata.objects.all()
+    serializer_class = SekolahMetadataSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        metadata_instance = self.get_object()
+
+        try:
+            sekolah_queryset = filter_by_area(
+                Sekolah.objects.filter(file_metadata=metadata_instance),
+                "point",
+                request,
+            )
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return stream_feature_collection(
+            self.get_serializer(metadata_instance).data,
+            sekolah_queryset.order_by("created_at"),
+            "point",
+            JSONObject(
+                tipe="tipe",
+                npsn="npsn",
+                nama="nama",
+                alamat="alamat",
+                kuota="kuota",
+                keterangan="keterangan",
+                lat="lat",
+                lon="lon",
+            ),
+        )
+
+
 class SekolahDetail(generics.RetrieveAPIView):
     queryset = Sekolah.objects.all()
     serializer_class = SekolahDetailSerializerWithMetadata
@@ -97,40 +159,26 @@ class SekolahUpload(generics.CreateAPIView):
 
         # Process the file
         try:
-            csv_data = csv_to_dict(file)
-            bbox = calculate_bbox_from_csv_points(csv_data)
             # Save metadata (name, description) to the SekolahMetadata model
             metadata = SekolahMetadata.objects.create(
                 name=name,
                 level=level,
                 type=type,
                 description=description,
-                bbox=bbox,
                 zonasi=zonasi,
             )
 
-            for row in csv_data:
-                lat = round(float(row["lat"]), 6)
-                lon = round(float(row["lon"]), 6)
-
-                # Create and save the Point to the database
-                point = Point(lon, lat)
-                sekolah = Sekolah(
-                    tipe=row.get("tipe"),
-                    npsn=row.get("npsn"),
-                    nama=row.get("nama"),
-                    alamat=row.get("alamat"),
-                    kuota=int(row.get("kuota", 0)),
-                    keterangan=row.get("keterangan"),
-                    lat=lat,
-                    lon=lon,
-                    point=point,
-                    file_metadata=metadata,
-                )
-                sekolah.save()
+            # The rows are loaded by the job worker
+            job = enqueue_job(
+                "sekolah_upload", {"metadata_id": str(metadata.id)}, file=file
+            )
 
             return Response(
-                {"message": "File uploaded successfully", "metadata_id": metadata.id},
+                {
+                    "message": "File uploaded successfully",
+                    "metadata_id": metadata.id,
+                    "job_id": job.id,
+                },
                 status=status.HTTP_201_CREATED,
             )
 
@@ -150,6 +198,11 @@ class SekolahDatumDelete(generics.DestroyAPIView):
         # Filter the Sekolah objects by file_metadata_id and id
         return Sekolah.objects.filter(file_metadata_id=metadata_id, id=pk)
 
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        # A new updated_at invalidates the cached isochrones of the layer
+        instance.file_metadata.save(update_fields=["updated_at"])
+
 
 class SekolahDatumAdd(generics.CreateAPIView):
     """
@@ -199,6 +252,8 @@ class SekolahDatumAdd(generics.CreateAPIView):
                 file_metadata=metadata,
             )
             sekolah.save()
+            # A new updated_at invalidates the cached isochrones of the layer
+            metadata.save(update_fields=["updated_at"])
 
             return Response(
                 {
@@ -272,6 +327,8 @@ class SekolahDatumEdit(generics.RetrieveAPIView):
             sekolah.lon = lon
             sekolah.point = Point(lon, lat)  # Update the Point field
             sekolah.save()
+            # A new updated_at invalidates the cached isochrones of the layer
+            metadata.save(update_fields=["updated_at"])
 
             return Response(
                 {
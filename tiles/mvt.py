@@ -0,0 +1,169 @@
+import hashlib
+import os
+import shutil
+from django.conf import settings
+from django.db import connection
+from batas_wilayah.models import BatasWilayahMetadata
+from jalan.models import JalanMetadata
+from peserta_didik.models import PesertaDidikMetadata
+from sekolah.models import SekolahMetadata
+
+# Size of a tile and of the buffer around it, in MVT coordinates
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+# Circumference of the earth in EPSG:3857 (meter)
+WEB_MERCATOR_SIZE = 40075016.685578488
+
+# Layer name -> metadata model, table (None for the per-upload road table),
+# geometry column and the columns kept as MVT attributes
+TILE_LAYERS = {
+    "jalan": {
+        "metadata": JalanMetadata,
+        "table": None,
+        "geometry": "mline",
+        "columns": ("id", "source", "target"),
+        "simplify": True,
+    },
+    "sekolah": {
+        "metadata": SekolahMetadata,
+        "table": "tb_sekolah",
+        "geometry": "point",
+        "columns": ("id", "tipe", "npsn", "nama", "kuota"),
+        "simplify": False,
+    },
+    "peserta_didik": {
+        "metadata": PesertaDidikMetadata,
+        "table": "tb_peserta_didik",
+        "geometry": "point",
+        "columns": ("id", "nisn", "nama", "prioritas"),
+        "simplify": False,
+    },
+    "batas_wilayah": {
+        "metadata": BatasWilayahMetadata,
+        "table": "tb_batas_wilayah",
+        "geometry": "mpoly",
+        "columns": ("id", "properties"),
+        "simplify": True,
+    },
+}
+
+
+def is_valid_tile(z: int, x: int, y: int):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def build_tile(layer: str, metadata, z: int, x: int, y: int):
+    """
+    Build a Mapbox Vector Tile of a layer with ST_AsMVT.
+
+    Lines and polygons are simplified with a tolerance of one tile pixel at
+    the zoom level, details smaller than a pixel are lost in the tile anyway.
+    """
+    config = TILE_LAYERS[layer]
+    geometry_column = config["geometry"]
+
+    if config["table"] is None:
+        table = metadata.road_table
+        layer_filter = ""
+    else:
+        table = config["table"]
+        layer_filter = "AND t.file_metadata_id = %(metadata_id)s"
+
+    geometry = f"ST_Transform(t.{geometry_column}, 3857)"
+    if config["simplify"]:
+        geometry = f"ST_SimplifyPreserveTopology({geometry}, %(tolerance)s)"
+    columns = ", ".join(f"t.{column}" for column in config["columns"])
+
+    tile_query = f"""
+        WITH bounds AS (
+            SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS tile,
+                ST_Transform(
+                    ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => %(margin)s), 4326
+                ) AS search
+        ),
+        mvt_geom AS (
+            SELECT ST_AsMVTGeom(
+                    {geometry}, bounds.tile, {TILE_EXTENT}, {TILE_BUFFER}, true
+                ) AS geom,
+                {columns}
+            FROM {table} AS t, bounds
+            WHERE t.{geometry_column} && bounds.search {layer_filter}
+        )
+        SELECT ST_AsMVT(mvt_geom, %(layer)s, {TILE_EXTENT}, 'geom')
+        FROM mvt_geom
+        WHERE geom IS NOT NULL;
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            tile_query,
+            {
+                "z": z,
+                "x": x,
+                "y": y,
+                "margin": TILE_BUFFER / TILE_EXTENT,
+                "tolerance": WEB_MERCATOR_SIZE / 2**z / TILE_EXTENT,
+                "metadata_id": str(metadata.id),
+                "layer": layer,
+            },
+        )
+        result = cursor.fetchone()
+    return bytes(result[0]) if result and result[0] else b""
+
+
+def tile_version(metadata):
+    """
+    Version of the tiles of a layer, the metadata is saved again when its data changes
+    """
+    return metadata.updated_at.strftime("%Y%m%d%H%M%S%f")
+
+
+def tile_etag(layer: str, metadata, z: int, x: int, y: int):
+    raw_etag = f"{layer}|{metadata.id}|{tile_version(metadata)}|{z}/{x}/{y}"
+    return f'"{hashlib.sha1(raw_etag.encode()).hexdigest()}"'
+
+
+def layer_cache_dir(layer: str, metadata_id):
+    return os.path.join(settings.TILE_CACHE_DIR, layer, str(metadata_id))
+
+
+def get_tile(layer: str, metadata, z: int, x: int, y: int):
+    """
+    Return a tile from the disk cache, build and save it on the first request.
+
+    Tiles are saved in a directory per layer version, the directories of the
+    previous versions are removed when the first tile of a new version is saved.
+    """
+    layer_dir = layer_cache_dir(layer, metadata.id)
+    version = tile_version(metadata)
+    version_dir = os.path.join(layer_dir, version)
+    tile_path = os.path.join(version_dir, str(z), str(x), f"{y}.mvt")
+
+    try:
+        with open(tile_path, "rb") as tile_file:
+            return tile_file.read()
+    except FileNotFoundError:
+        pass
+
+    tile = build_tile(layer, metadata, z, x, y)
+
+    if not os.path.isdir(version_dir) and os.path.isdir(layer_dir):
+        for old_version in os.listdir(layer_dir):
+            if old_version != version:
+                shutil.rmtree(os.path.join(layer_dir, old_version), ignore_errors=True)
+
+    # Written aside then renamed, a concurrent request never reads a partial tile
+    os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+    temp_path = f"{tile_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as tile_file:
+        tile_file.write(tile)
+    os.replace(temp_path, tile_path)
+    return tile
+
+
+def invalidate_tiles(layer: str, metadata_id):
+    """
+    Remove every cached tile of a layer
+    """
+    shutil.rmtree(layer_cache_dir(layer, metadata_id), ignore_errors=True)
@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import TileDetail
+
+urlpatterns = [
+    path(
+        "tiles/<str:layer>/<str:pk>/<int:z>/<int:x>/<int:y>.mvt",
+        TileDetail.as_view(),
+        name="tile-detail",
+    ),
+]
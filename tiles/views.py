@@ -0,0 +1,59 @@
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from rest_framework import generics, status
+from rest_framework.response import Response
+from .mvt import TILE_LAYERS, is_valid_tile, tile_etag, get_tile
+
+
+class TileDetail(generics.RetrieveAPIView):
+    """
+    API view to get a Mapbox Vector Tile of a jalan, sekolah, peserta didik
+    or batas wilayah layer
+    """
+
+    def get(self, request, *args, **kwargs):
+        layer = kwargs.get("layer")
+        metadata_id = kwargs.get("pk")
+        z, x, y = kwargs.get("z"), kwargs.get("x"), kwargs.get("y")
+
+        if layer not in TILE_LAYERS:
+            return Response(
+                {"error": f"Layer invalid! Supported layers: {', '.join(TILE_LAYERS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not is_valid_tile(z, x, y):
+            return Response(
+                {"error": "Tile coordinate invalid!"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        metadata_model = TILE_LAYERS[layer]["metadata"]
+        try:
+            metadata = metadata_model.objects.get(id=metadata_id)
+        except metadata_model.DoesNotExist:
+            return Response(
+                {"error": "Metadata not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            # The ETag is known without the tile, a valid client copy costs no query
+            etag = tile_etag(layer, metadata, z, x, y)
+            if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+            if etag in if_none_match or "*" in if_none_match:
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = HttpResponse(
+                    get_tile(layer, metadata, z, x, y),
+                    content_type="application/vnd.mapbox-vector-tile",
+                )
+
+            response["ETag"] = etag
+            # Clients keep the tile but check its ETag before using it again
+            response["Cache-Control"] = "no-cache"
+            return response
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
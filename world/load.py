@@ -1,5 +1,10 @@
 from pathlib import Path
+import numpy as np
+import pyogrio
+import shapely
 from django.contrib.gis.utils import LayerMapping
+from django.db import connection, transaction
+from geodjango.utils import copy_rows
 from .models import WorldBorder
 
 world_mapping = {
@@ -19,7 +24,66 @@ world_mapping = {
 
 world_shp = Path(__file__).resolve().parent / "data" / "TM_WORLD_BORDERS-0.3.shp"
 
+# Number of countries sent per COPY
+COPY_CHUNK_SIZE = 5000
+
 
 def run(verbose=True):
     lm = LayerMapping(WorldBorder, world_shp, world_mapping, transform=False)
-    lm.save(strict=True, verbose=verbose)
\ No newline at end of file
+    lm.save(strict=True, verbose=verbose)
+
+
+def bulk_load(path=world_shp, replace=False, centroids=True):
+    """
+    Load a world borders shapefile (any GDAL source with the world_mapping
+    attributes) with pyogrio and COPY, every step is vectorized.
+
+    lon and lat are the centroids of the geometries, or the LON and LAT attributes
+    when centroids is False. With replace the existing countries are deleted in
+    the same transaction.
+    """
+    gdf = pyogrio.read_dataframe(path)
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+
+    # Promote Polygons to MultiPolygons and force 2D for the whole file at once
+    geoms = gdf.geometry.values.to_numpy()
+    polygons = shapely.get_type_id(geoms) == 3  # shapely type id of Polygon
+    geoms[polygons] = shapely.multipolygons(geoms[polygons][:, np.newaxis])
+    geoms = shapely.set_srid(shapely.force_2d(geoms), 4326)
+
+    if centroids:
+        centroid = shapely.centroid(geoms)
+        lons, lats = shapely.get_x(centroid), shapely.get_y(centroid)
+    else:
+        lons, lats = gdf["LON"].to_numpy(), gdf["LAT"].to_numpy()
+
+    columns = [field for field in world_mapping if field not in ("lon", "lat", "mpoly")]
+    attributes = gdf[[world_mapping[field] for field in columns]].astype(object)
+    attributes = attributes.where(attributes.notna(), None)
+    list_wkb = shapely.to_wkb(geoms, hex=True, include_srid=True)
+
+    rows = [
+        (*values, lon, lat, wkb)
+        for values, lon, lat, wkb in zip(
+            attributes.itertuples(index=False, name=None),
+            lons.tolist(),
+            lats.tolist(),
+            list_wkb,
+        )
+    ]
+    copy_sql = f"""
+        COPY {WorldBorder._meta.db_table} ({", ".join(columns)}, lon, lat, mpoly)
+        FROM STDIN WITH (FORMAT csv)
+    """
+
+    with transaction.atomic():
+        deleted = 0
+        if replace:
+            deleted, _ = WorldBorder.objects.all().delete()
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), COPY_CHUNK_SIZE):
+                copy_rows(cursor, copy_sql, rows[start : start + COPY_CHUNK_SIZE])
+
+    return {"count": len(rows), "deleted": deleted}
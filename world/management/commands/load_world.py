@@ -0,0 +1,37 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from world.load import bulk_load, world_shp
+
+
+class Command(BaseCommand):
+    help = "Load a world borders shapefile into WorldBorder with pyogrio and COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=str(world_shp),
+            help="Shapefile or any GDAL source, default to TM_WORLD_BORDERS-0.3",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete the existing countries in the same transaction",
+        )
+        parser.add_argument(
+            "--file-lonlat",
+            action="store_true",
+            help="Use the LON and LAT attributes instead of the centroids",
+        )
+
+    def handle(self, *args, **options):
+        started_at = perf_counter()
+        result = bulk_load(
+            options["path"],
+            replace=options["replace"],
+            centroids=not options["file_lonlat"],
+        )
+        self.stdout.write(
+            f"{result['count']} countries loaded ({result['deleted']} deleted) "
+            f"in {perf_counter() - started_at:.2f} s"
+        )
@@ -1,12 +1,9 @@
 import os
 import zipfile
 import tempfile
-import geopandas as gpd
 from rest_framework import generics, status
 from rest_framework.response import Response
-from django.contrib.gis.geos import MultiPolygon
-from django.contrib.gis.geos import GEOSGeometry
-from shapely.geometry import MultiPolygon
+from .load import bulk_load
 from .models import WorldBorder
 from .serializers import WorldBorderSerializer
 
@@ -22,6 +19,11 @@ class WorldBorderDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 class WorldBorderUpload(generics.CreateAPIView):
+    """
+    API view to load a zipped world borders shapefile with pyogrio and COPY,
+    mode "append" (default) adds the countries, "replace" deletes the existing ones
+    """
+
     queryset = WorldBorder.objects.all()
     serializer_class = WorldBorderSerializer
 
@@ -31,6 +33,13 @@ class WorldBorderUpload(generics.CreateAPIView):
                 {"error": "No file provided."}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        mode = request.data.get("mode", "append")
+        if mode not in ("append", "replace"):
+            return Response(
+                {"error": "Mode invalid! Supported modes: append, replace"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         file = request.FILES["file"]
 
         # Create a temporary directory to extract the zip file
@@ -44,61 +53,26 @@ class WorldBorderUpload(generics.CreateAPIView):
             with zipfile.ZipFile(zip_path, "r") as zip_ref:
                 zip_ref.extractall(temp_dir)
 
-            # Read the shapefile with GeoPandas
-            shapefile_path = os.path.join(
-                temp_dir,
-                [name for name in os.listdir(temp_dir) if name.endswith(".shp")][0],
-            )
-            gdf = gpd.read_file(shapefile_path)
-
-            if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
-                gdf = gdf.to_crs(epsg=4326)
-
-            # Filter columns
-            gdf_filtered = gdf[
-                [
-                    "FIPS",
-                    "ISO2",
-                    "ISO3",
-                    "UN",
-                    "NAME",
-                    "AREA",
-                    "POP2005",
-                    "REGION",
-                    "SUBREGION",
-                    "LON",
-                    "LAT",
-                    "geometry",
-                ]
+            shapefiles = [
+                name for name in os.listdir(temp_dir) if name.endswith(".shp")
             ]
+            if not shapefiles:
+                return Response(
+                    {"error": "No shapefile found in the zip file."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            # Save to the database
-            for _, row in gdf_filtered.iterrows():
-
-                geom = row["geometry"]
-                if geom.geom_type == "Polygon":
-                    geom = MultiPolygon([geom])
-
-                # Convert Shapely MultiPolygon to GEOSGeometry
-                geos_geom = GEOSGeometry(geom.wkt)
-
-                instance = WorldBorder(
-                    name=row["NAME"],
-                    area=row["AREA"],
-                    pop2005=row["POP2005"],
-                    fips=row["FIPS"],
-                    iso2=row["ISO2"],
-                    iso3=row["ISO3"],
-                    un=row["UN"],
-                    region=row["REGION"],
-                    subregion=row["SUBREGION"],
-                    lon=geom.centroid.x,
-                    lat=geom.centroid.y,
-                    mpoly=geos_geom,
+            try:
+                # Read with pyogrio and saved with COPY, centroids computed at once
+                result = bulk_load(
+                    os.path.join(temp_dir, shapefiles[0]), replace=mode == "replace"
+                )
+            except Exception as e:
+                return Response(
+                    {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
-                instance.save()
 
         return Response(
-            {"message": "Shapefile uploaded and processed."},
+            {"message": "Shapefile uploaded and processed.", **result},
             status=status.HTTP_201_CREATED,
         )